@@ -1,3 +1,9 @@
+import os
+import sys
+
+# agent_core/ (shared with food_analyst_agent_adk) sits at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
 from . import agent
 
 __all__ = ['agent']
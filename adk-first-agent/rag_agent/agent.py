@@ -6,12 +6,14 @@ from google.adk.agents.llm_agent import LlmAgent
 # Load environment variables
 load_dotenv()
 
+from agent_core.metrics import after_model_callback, before_model_callback
+from agent_core.stub_llm import resolve_model
 from .tools.query_rag import query_rag
 
 
 # Create the agent
 root_agent = LlmAgent(
-    model="gemini-2.5-flash-lite",
+    model=resolve_model("gemini-2.5-flash-lite"),
     name="rag_agent",
     instruction="""You are a helpful RAG (Retrieval-Augmented Generation) assistant that helps users find information from a document database.
 
@@ -22,6 +24,7 @@ When users ask questions:
 3. Provide a helpful answer based on the retrieved context
 4. If no relevant documents are found (low similarity scores or empty results), let the user know
 5. Always be conversational and cite which documents you used in your answer
+6. If query_rag returns stale=True, the database is temporarily unavailable: answer from those documents but mention they may be out of date
 
 Example queries:
 - "What are the main causes of climate change?"
@@ -29,5 +32,8 @@ Example queries:
 - "What is machine learning?"
 
 Your goal is to provide accurate, context-aware answers based on the retrieved documents.""",
-    tools=[query_rag]
+    tools=[query_rag],
+    # LLM latency as the `llm` stage of agent_pipeline_stage_seconds
+    before_model_callback=before_model_callback,
+    after_model_callback=after_model_callback
 )
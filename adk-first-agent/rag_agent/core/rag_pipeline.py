@@ -1,54 +1,301 @@
 """RAG Pipeline core logic"""
 from sentence_transformers import SentenceTransformer
+import numpy as np
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import json
+import logging
 import os
+import time
+
+from agent_core.embedding_versions import DEFAULT_COLUMN, get_embedding_versions, get_shadow_reader
+from agent_core.encode_scheduler import get_encode_scheduler
+from agent_core.metrics import DB_CONNECTIONS, PIPELINE_ERRORS, PIPELINE_RESULTS, record_timings
+from agent_core.replicas import PRIMARY, get_replica_router, is_connection_failure
+from agent_core.slow_queries import get_slow_query_log
+from agent_core.snapshot import get_snapshot_store
+
+from .reranker import get_reranker
+from .sharded_search import get_sharded_searcher
+
+logger = logging.getLogger(__name__)
+
+
+# Compact-index expressions for the quantized columns added by
+# scripts/4_quantize_documents.py. Each phase-1 search over-fetches candidates
+# from the compact index, phase 2 rescores them against the full vector.
+QUANTIZED_ORDER_BY = {
+    "halfvec": "embedding_half <=> %(embedding)s::halfvec",
+    "bit": "embedding_bit <~> binary_quantize(%(embedding)s::vector)",
+}
+
+
+def build_search_query(quantization: str = "none", column: str = DEFAULT_COLUMN) -> str:
+    """Return the similarity SQL for a storage mode ("none", "halfvec" or "bit")
+
+    `column` is the full-precision embedding column searched (or rescored);
+    see agent_core/embedding_versions.py.
+    """
+    if quantization == "none":
+        return f"""
+            SELECT id, title, content,
+                   1 - ({column} <=> %(embedding)s::vector) as similarity
+            FROM documents
+            ORDER BY {column} <=> %(embedding)s::vector
+            LIMIT %(top_k)s
+        """
+    if quantization not in QUANTIZED_ORDER_BY:
+        raise ValueError(f"Unknown quantization mode: {quantization}")
+
+    return f"""
+        SELECT id, title, content,
+               1 - ({column} <=> %(embedding)s::vector) as similarity
+        FROM (
+            SELECT id, title, content, {column}
+            FROM documents
+            ORDER BY {QUANTIZED_ORDER_BY[quantization]}
+            LIMIT %(candidates)s
+        ) candidates
+        ORDER BY {column} <=> %(embedding)s::vector
+        LIMIT %(top_k)s
+    """
+
+
+# Recall helpers for the evaluation scripts (4_quantize_documents.py,
+# 13_partition_documents.py); they take a RealDictCursor on the primary
+
+def sample_queries(cur, num_queries: int, noise: float) -> List[str]:
+    """Perturbed copies of stored embeddings, so queries resemble real traffic"""
+    cur.execute("SELECT embedding::text AS embedding FROM documents ORDER BY random() LIMIT %s", (num_queries,))
+    rng = np.random.default_rng(42)
+    queries = []
+    for row in cur.fetchall():
+        vector = np.array(json.loads(row["embedding"]), dtype=np.float32)
+        vector += rng.normal(0, noise, size=vector.shape).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        queries.append("[" + ",".join(str(x) for x in vector) + "]")
+    return queries
+
+
+def exact_search_ids(cur, embedding_str: str, top_k: int) -> set:
+    """Ground truth by sequential scan (index scans disabled for this query)"""
+    cur.execute("BEGIN")
+    cur.execute("SET LOCAL enable_indexscan = off")
+    cur.execute("SET LOCAL enable_bitmapscan = off")
+    cur.execute(build_search_query("none"), {"embedding": embedding_str, "top_k": top_k})
+    ids = {row["id"] for row in cur.fetchall()}
+    cur.execute("COMMIT")
+    return ids
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
 
 
 class RAGPipeline:
     """Minimal RAG pipeline for retrieval and generation"""
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        """Initialize RAG pipeline with embedding model and database connection"""
-        # Initialize embedding model (force CPU usage)
-        self.embedding_model = SentenceTransformer(model_name, device='cpu')
-
-        # Database connection
-        self.conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-            port=int(os.getenv("DB_PORT", 5432))
-        )
-        self.conn.autocommit = True
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        quantization: Optional[str] = None,
+        rescore_factor: Optional[int] = None,
+        snapshot_dir: Optional[str] = None,
+        reranker_path: Optional[str] = None,
+        primary_dsn: Optional[str] = None,
+        replica_dsns: Optional[List[str]] = None
+    ):
+        """Initialize RAG pipeline with embedding model and database connection
+
+        Args:
+            model_name: SentenceTransformer model used for query embeddings.
+                Defaults to the model of the active embedding version
+                (agent_core/embedding_versions.py), all-MiniLM-L6-v2 before any migration.
+            quantization: "none" (full vectors), "halfvec" or "bit" two-phase search.
+                Defaults to RAG_QUANTIZATION or "none".
+            rescore_factor: Candidates over-fetched per result before exact rescoring.
+                Defaults to RAG_RESCORE_FACTOR or 4.
+            snapshot_dir: Directory of memory-mapped embedding snapshots for in-process
+                search (see agent_core/snapshot.py). Defaults to RAG_SNAPSHOT_DIR; unset
+                means pgvector does the search.
+            reranker_path: Local cross-encoder directory for second-stage re-ranking.
+                Defaults to RAG_RERANKER_PATH; unset disables re-ranking. The stage
+                scores RAG_RERANK_TOP_N candidates (10) in batches of
+                RAG_RERANK_BATCH_SIZE (8) within RAG_RERANK_BUDGET_MS (150).
+            primary_dsn: Primary server; defaults to the DB_* variables.
+            replica_dsns: Streaming replicas that serve the searches (see
+                agent_core/replicas.py). Defaults to DB_REPLICA_DSNS; empty means the
+                primary serves them too.
+        """
+        # Database connection; the pipeline only reads, so a healthy replica
+        # serves it when one is configured, and the primary otherwise
+        self.router = get_replica_router(primary_dsn, replica_dsns)
+        self.conn, self.db_target = self.router.connect_for_reads()
+        DB_CONNECTIONS.inc()
+
+        try:
+            # Embedding version searched: its model encodes queries, its column is searched
+            self.embedding_version = get_embedding_versions().active("documents", self.conn)
+
+            # Initialize embedding model (force CPU usage)
+            self.model_name = model_name or self.embedding_version.model_name
+            self.embedding_model = SentenceTransformer(self.model_name, device='cpu')
+        except Exception:
+            self.close()
+            raise
+
+        # Vector storage mode
+        self.quantization = quantization or os.getenv("RAG_QUANTIZATION", "none")
+        if self.quantization != "none" and self.embedding_version.column != DEFAULT_COLUMN:
+            # The compact columns hold the original model's vectors
+            logger.warning("RAG_QUANTIZATION=%s ignored for %s", self.quantization, self.embedding_version)
+            self.quantization = "none"
+        self.rescore_factor = rescore_factor or int(os.getenv("RAG_RESCORE_FACTOR", 4))
+        self.search_query = build_search_query(self.quantization, self.embedding_version.column)
+
+        # Shared in-process snapshot (mapped once per worker, not per pipeline)
+        snapshot_dir = snapshot_dir or os.getenv("RAG_SNAPSHOT_DIR")
+        self.snapshot_store = get_snapshot_store(snapshot_dir, "documents") if snapshot_dir else None
+
+        # Scatter-gather over partitions / shards (RAG_SHARDS, core/sharded_search.py);
+        # searches full vectors, RAG_QUANTIZATION only applies to the single-table path
+        self.sharded_searcher = get_sharded_searcher()
+        if self.sharded_searcher is not None and self.embedding_version.column != DEFAULT_COLUMN:
+            # The partition/shard copies only carry the original `embedding` column
+            logger.warning("RAG_SHARDS ignored for %s; searching documents directly", self.embedding_version)
+            self.sharded_searcher = None
+        self.last_shard_info: Dict[str, Any] = {}
+
+        # Optional cross-encoder re-ranking stage
+        reranker_path = reranker_path or os.getenv("RAG_RERANKER_PATH")
+        self.reranker = get_reranker(
+            reranker_path, batch_size=int(os.getenv("RAG_RERANK_BATCH_SIZE", 8))
+        ) if reranker_path else None
+        self.rerank_top_n = int(os.getenv("RAG_RERANK_TOP_N", 10))
+        self.rerank_budget_ms = float(os.getenv("RAG_RERANK_BUDGET_MS", 150))
+
+        # Per-stage latency (ms) and query embedding of the last retrieval
+        self.last_timings: Dict[str, float] = {}
+        self.last_query_embedding = None
 
     def retrieve_similar_documents(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Find most similar documents to the query"""
+        fetch_k = max(top_k, self.rerank_top_n) if self.reranker else top_k
+        timings = {}
+
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(query)
+        start = time.perf_counter()
+        try:
+            query_embedding = get_encode_scheduler().encode(self.embedding_model, query)
+        except Exception:
+            PIPELINE_ERRORS.inc(stage="encode")
+            raise
+        timings["encode_ms"] = (time.perf_counter() - start) * 1000
+        self.last_query_embedding = query_embedding
+
+        start = time.perf_counter()
+        snapshot = self.snapshot_store.current() if self.snapshot_store else None
+        if snapshot is not None and snapshot.header.get("column", DEFAULT_COLUMN) != self.embedding_version.column:
+            # Exported before the last model flip; re-export with scripts/5_export_snapshot.py
+            snapshot = None
+        try:
+            if snapshot is not None:
+                results = self._read(self._retrieve_from_snapshot, snapshot, query_embedding, fetch_k)
+            elif self.sharded_searcher is not None:
+                embedding_str = "[" + ",".join([str(x) for x in query_embedding]) + "]"
+                results, self.last_shard_info = self.sharded_searcher.search(
+                    embedding_str, fetch_k, column=self.embedding_version.column
+                )
+            else:
+                results = self._read(self._retrieve_from_db, query_embedding, fetch_k)
+        except Exception:
+            PIPELINE_ERRORS.inc(stage="search")
+            raise
+        timings["search_ms"] = (time.perf_counter() - start) * 1000
+
+        if self.reranker:
+            start = time.perf_counter()
+            try:
+                results = self.reranker.rerank(query, results, self.rerank_budget_ms)[:top_k]
+            except Exception:
+                PIPELINE_ERRORS.inc(stage="rerank")
+                raise
+            timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+
+        self.last_timings = timings
+        record_timings(timings)
+        if snapshot is not None:
+            source = "snapshot"
+        else:
+            source = "shards" if self.sharded_searcher is not None else "db"
+        PIPELINE_RESULTS.inc(len(results), source=source)
+
+        # Dual read during a model migration: sampled, in the background
+        candidate = get_embedding_versions().candidate("documents", self.conn)
+        if candidate is not None:
+            get_shadow_reader().submit(candidate, query, [row["id"] for row in results], top_k)
+        logger.debug("retrieve_similar_documents timings: %s", timings)
+        return results
 
+    def _read(self, retrieve, *args, **kwargs):
+        """Run a retrieval on self.conn; if its replica drops, retry once on the primary"""
+        try:
+            return retrieve(*args, **kwargs)
+        except psycopg2.Error as e:
+            if self.db_target == PRIMARY or not is_connection_failure(e):
+                raise
+            logger.warning("Replica %s failed, retrying on the primary: %s", self.db_target, e)
+            self.conn, self.db_target = self.router.fail_over(self.conn, self.db_target, e)
+            return retrieve(*args, **kwargs)
+
+    def _retrieve_from_db(self, query_embedding, top_k: int) -> List[Dict[str, Any]]:
+        """pgvector similarity search"""
         # Convert to string format for pgvector
         embedding_str = "[" + ",".join([str(x) for x in query_embedding]) + "]"
 
         # Similarity search in PostgreSQL
         cur = self.conn.cursor(cursor_factory=RealDictCursor)
-        search_query = f"""
-            SELECT id, title, content,
-                   1 - (embedding <=> '{embedding_str}'::vector) as similarity
-            FROM documents
-            ORDER BY embedding <=> '{embedding_str}'::vector
-            LIMIT {top_k}
-        """
+        candidates = top_k * self.rescore_factor
+        if self.quantization != "none" and candidates > 40:
+            # HNSW returns at most ef_search rows, so widen it for the over-fetch
+            cur.execute("SET hnsw.ef_search = %s", (candidates,))
 
-        cur.execute(search_query)
+        params = {"embedding": embedding_str, "top_k": top_k, "candidates": candidates}
+        start = time.perf_counter()
+        cur.execute(self.search_query, params)
         results = cur.fetchall()
         cur.close()
+        get_slow_query_log().observe(
+            self.conn, "documents_search", self.search_query, params, (time.perf_counter() - start) * 1000,
+            router=self.router, target=self.db_target
+        )
 
         return results
 
+    def _retrieve_from_snapshot(self, snapshot, query_embedding, top_k: int) -> List[Dict[str, Any]]:
+        """Rank in-process against the mapped snapshot, then fetch only the winning rows"""
+        hits = snapshot.search(query_embedding, top_k)
+        if not hits:
+            return []
+
+        cur = self.conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            "SELECT id, title, content FROM documents WHERE id = ANY(%s)",
+            ([doc_id for doc_id, _ in hits],)
+        )
+        rows = {row["id"]: row for row in cur.fetchall()}
+        cur.close()
+
+        # Keep snapshot order; rows deleted since the export are skipped
+        return [
+            {**rows[doc_id], "similarity": similarity}
+            for doc_id, similarity in hits if doc_id in rows
+        ]
+
     def close(self):
         """Close database connection"""
-        if hasattr(self, 'conn'):
+        if hasattr(self, 'conn') and not self.conn.closed:
             self.conn.close()
+            DB_CONNECTIONS.dec()
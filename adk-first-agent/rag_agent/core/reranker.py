@@ -0,0 +1,120 @@
+"""Time-budgeted cross-encoder re-ranking for retrieved documents"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_core.encode_scheduler import get_encode_scheduler
+from agent_core.metrics import CACHE_REQUESTS
+
+
+class CrossEncoderReranker:
+    """Re-score vector-search candidates with a cross-encoder under a time budget
+
+    Candidates are scored in vector order, one batch at a time. Before each batch
+    the reranker checks whether the remaining budget covers the slowest batch seen
+    so far; if not it stops, and the unscored candidates keep their vector order
+    after the scored ones. Scores are cached per (query hash, doc id), so repeated
+    questions only pay for documents they haven't seen.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        batch_size: int = 8,
+        cache_size: int = 10000,
+        model: Optional[Any] = None
+    ):
+        """
+        Args:
+            model_path: Local directory of a sentence-transformers CrossEncoder
+            batch_size: Pairs scored per forward pass
+            cache_size: Max (query, doc) scores kept in the LRU cache
+            model: Pre-built object with `predict(pairs, batch_size=...)`; skips loading
+                `model_path` (used to plug in tiny stand-in models)
+        """
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_path, device='cpu', local_files_only=True)
+        self.model = model
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, Any], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._batch_seconds = 0.0
+
+    @staticmethod
+    def _query_hash(query: str) -> str:
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]
+
+    def _cached(self, key) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+        CACHE_REQUESTS.inc(cache="rerank_scores", result="miss" if score is None else "hit")
+        return score
+
+    def _store(self, key, score: float):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        budget_ms: float
+    ) -> List[Dict[str, Any]]:
+        """Return `documents` re-ordered by cross-encoder score
+
+        Each scored document gets a `rerank_score` key. Documents the budget
+        didn't reach keep their incoming (vector) order at the end.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        query_hash = self._query_hash(query)
+
+        scores: Dict[int, float] = {}
+        pending = []
+        for i, doc in enumerate(documents):
+            score = self._cached((query_hash, doc["id"]))
+            if score is None:
+                pending.append(i)
+            else:
+                scores[i] = score
+
+        for start in range(0, len(pending), self.batch_size):
+            if time.perf_counter() + self._batch_seconds > deadline:
+                break
+            batch = pending[start:start + self.batch_size]
+            batch_start = time.perf_counter()
+            # Interactive lease: scored on the query's thread share, not batch ingestion's
+            batch_scores = get_encode_scheduler().predict(
+                self.model,
+                [(query, documents[i]["content"]) for i in batch],
+                batch_size=self.batch_size
+            )
+            self._batch_seconds = max(self._batch_seconds * 0.9, time.perf_counter() - batch_start)
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self._store((query_hash, documents[i]["id"]), float(score))
+
+        scored = sorted(scores, key=lambda i: scores[i], reverse=True)
+        unscored = [i for i in range(len(documents)) if i not in scores]
+        return [
+            {**documents[i], "rerank_score": scores[i]} for i in scored
+        ] + [documents[i] for i in unscored]
+
+
+_rerankers: Dict[str, CrossEncoderReranker] = {}
+
+
+def get_reranker(model_path: str, batch_size: int = 8) -> CrossEncoderReranker:
+    """Process-wide reranker per model path, so the model and cache outlive pipelines"""
+    if model_path not in _rerankers:
+        _rerankers[model_path] = CrossEncoderReranker(model_path, batch_size=batch_size)
+    return _rerankers[model_path]
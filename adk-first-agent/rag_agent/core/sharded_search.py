@@ -0,0 +1,253 @@
+"""Scatter-gather vector search over partitions and shards
+
+The documents corpus can be split in two ways, and both can be combined:
+- partitions: one table partitioned by hash or collection, each partition with
+  its own HNSW index (scripts/13_partition_documents.py);
+- shards: several PostgreSQL nodes, or schemas, each holding a slice.
+
+RAG_SHARDS lists the targets, separated by ";". Each target is
+`<dsn>#<table>`:
+
+    RAG_SHARDS="host=pg1 dbname=rag#documents;host=pg2 dbname=rag#documents"
+    RAG_SHARDS="#documents_partitioned"
+
+An empty DSN uses the DB_* variables.
+
+A partitioned table is expanded to its leaf partitions. Each partition's HNSW
+index is then searched in parallel on its own connection, instead of one
+backend walking them in turn.
+
+How the search works:
+- Every target returns its own top-k, ordered by distance.
+- `heapq.merge` combines the sorted lists; the first k rows are the global
+  top-k.
+- A target that errors or hits statement_timeout is skipped and reported as
+  missing. The search raises only when every target fails.
+
+Each target holds up to RAG_SHARD_POOL_SIZE connections. N partitions
+therefore mean up to N * RAG_SHARD_POOL_SIZE connections to that node.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import parse_dsn
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from agent_core.metrics import DB_POOL_IN_USE, DB_POOL_SIZE, DB_POOL_WAIT_SECONDS
+from agent_core.resilience import db_timeouts
+
+logger = logging.getLogger(__name__)
+
+SHARD_QUERY = """
+    SELECT id, title, content,
+           1 - ({column} <=> %(embedding)s::vector) AS similarity
+    FROM {table}
+    ORDER BY {column} <=> %(embedding)s::vector
+    LIMIT %(top_k)s
+"""
+
+
+def _table_identifier(table: str) -> sql.Composable:
+    return sql.Identifier(*table.split("."))
+
+
+def _server_name(dsn: str) -> str:
+    """host:port/dbname of a DSN without its credentials, for logs and metric labels"""
+    if not dsn:
+        return "default"
+    params = parse_dsn(dsn)
+    return f"{params.get('host', 'localhost')}:{params.get('port', 5432)}/{params.get('dbname', '')}"
+
+
+class ShardTarget:
+    """One searchable table on one PostgreSQL node, with a small connection pool"""
+
+    def __init__(self, dsn: str, table: str, pool_size: int = 4):
+        self.dsn = dsn
+        self.table = table
+        self.name = f"{_server_name(dsn)}#{table}"
+        self.pool_size = pool_size
+        DB_POOL_SIZE.set(pool_size, pool=self.name)
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                if self.dsn:
+                    self._pool = ThreadedConnectionPool(0, self.pool_size, self.dsn, **db_timeouts(self.dsn))
+                else:
+                    self._pool = ThreadedConnectionPool(
+                        0, self.pool_size,
+                        host=os.getenv("DB_HOST"),
+                        user=os.getenv("DB_USER"),
+                        password=os.getenv("DB_PASSWORD"),
+                        database=os.getenv("DB_NAME"),
+                        port=int(os.getenv("DB_PORT", 5432)),
+                        **db_timeouts()
+                    )
+            return self._pool
+
+    def query(self, statement, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Run one read on a pooled connection; broken connections are discarded"""
+        with DB_POOL_WAIT_SECONDS.time(pool=self.name):
+            self._slots.acquire()
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            DB_POOL_IN_USE.inc(pool=self.name)
+            conn.autocommit = True
+            broken = False
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(statement, params)
+                    return cur.fetchall()
+            except psycopg2.Error as e:
+                broken = bool(conn.closed) or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                raise
+            finally:
+                pool.putconn(conn, close=broken)
+                DB_POOL_IN_USE.dec(pool=self.name)
+        finally:
+            self._slots.release()
+
+    def leaf_partitions(self) -> List[str]:
+        """The table itself, or its leaf partitions if it is partitioned"""
+        rows = self.query(
+            "SELECT relid::regclass::text AS name FROM pg_partition_tree(%s::regclass) WHERE isleaf ORDER BY 1",
+            (self.table,)
+        )
+        return [row["name"] for row in rows] or [self.table]
+
+    def search(
+        self, embedding_str: str, top_k: int, ef_search: int = 0, column: str = "embedding"
+    ) -> List[Dict[str, Any]]:
+        statement = sql.SQL(SHARD_QUERY).format(table=_table_identifier(self.table), column=sql.Identifier(column))
+        if ef_search:
+            # One round trip; a multi-statement query is one implicit transaction,
+            # so SET LOCAL doesn't outlive it
+            statement = sql.SQL("SET LOCAL hnsw.ef_search = {ef}; ").format(ef=sql.Literal(ef_search)) + statement
+        rows = self.query(statement, {"embedding": embedding_str, "top_k": top_k})
+        for row in rows:
+            row["shard"] = self.name
+        return rows
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+def parse_shards(spec: str, pool_size: int = 4) -> List[ShardTarget]:
+    """`<dsn>#<table>;...` into targets (a missing `#table` means `documents`)"""
+    targets = []
+    for entry in spec.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        dsn, table = entry.rsplit("#", 1) if "#" in entry else (entry, "")
+        targets.append(ShardTarget(dsn.strip(), table.strip() or "documents", pool_size))
+    return targets
+
+
+class ShardedSearcher:
+    """Fans a query out to every target in parallel and merges their top-k"""
+
+    def __init__(self, targets: List[ShardTarget], expand_partitions: bool = True, ef_search: int = 0):
+        """
+        Args:
+            targets: Tables to search; see `parse_shards`
+            expand_partitions: Replace partitioned tables by their leaf partitions
+            ef_search: hnsw.ef_search per target search (0: server default)
+        """
+        if expand_partitions:
+            expanded = []
+            for target in targets:
+                leaves = target.leaf_partitions()
+                if leaves == [target.table]:
+                    expanded.append(target)
+                else:
+                    target.close()
+                    expanded.extend(ShardTarget(target.dsn, leaf, target.pool_size) for leaf in leaves)
+            targets = expanded
+        if not targets:
+            raise ValueError("No shard targets configured")
+        self.targets = targets
+        self.ef_search = ef_search
+        self._executor = ThreadPoolExecutor(
+            max_workers=sum(t.pool_size for t in targets), thread_name_prefix="shard-search"
+        )
+
+    def _timed_search(self, target: ShardTarget, embedding_str: str, top_k: int, column: str):
+        start = time.perf_counter()
+        rows = target.search(embedding_str, top_k, self.ef_search, column)
+        return rows, (time.perf_counter() - start) * 1000
+
+    def search(
+        self, embedding_str: str, top_k: int, column: str = "embedding"
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Global top-k by similarity across all targets
+
+        `column` is the active embedding version's column
+        (agent_core/embedding_versions.py); every target must have it filled.
+
+        Returns:
+            (rows, info) where info has `shard_ms` (latency per answering
+            target) and `missing` (targets that failed)
+        """
+        futures = [
+            (target, self._executor.submit(self._timed_search, target, embedding_str, top_k, column))
+            for target in self.targets
+        ]
+        per_target, missing, shard_ms, first_error = [], [], {}, None
+        for target, future in futures:
+            try:
+                rows, elapsed_ms = future.result()
+            except Exception as e:
+                logger.warning("Shard %s failed: %s", target.name, e)
+                missing.append(target.name)
+                first_error = first_error or e
+                continue
+            per_target.append(rows)
+            shard_ms[target.name] = elapsed_ms
+
+        if not per_target and first_error is not None:
+            raise first_error
+        # Each list is already ordered by descending similarity
+        merged = heapq.merge(*per_target, key=lambda row: -row["similarity"])
+        return list(islice(merged, top_k)), {"shard_ms": shard_ms, "missing": missing}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for target in self.targets:
+            target.close()
+
+
+_searcher: Optional[ShardedSearcher] = None
+_searcher_lock = threading.Lock()
+
+
+def get_sharded_searcher() -> Optional[ShardedSearcher]:
+    """Process-wide searcher for RAG_SHARDS, or None when it is unset"""
+    global _searcher
+    spec = os.getenv("RAG_SHARDS", "").strip()
+    if not spec:
+        return None
+    with _searcher_lock:
+        if _searcher is None:
+            _searcher = ShardedSearcher(
+                parse_shards(spec, pool_size=int(os.getenv("RAG_SHARD_POOL_SIZE", 4))),
+                ef_search=int(os.getenv("RAG_SHARD_EF_SEARCH", 0))
+            )
+        return _searcher
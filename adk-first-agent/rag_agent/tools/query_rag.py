@@ -1,9 +1,12 @@
 """RAG Query Tool for ADK"""
 import os
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Optional
 
+from google.adk.tools.tool_context import ToolContext
 
-def query_rag(query: str, top_k: int = 3) -> Dict[str, Any]:
+
+def query_rag(query: str, top_k: int = 3, tool_context: Optional[ToolContext] = None) -> Dict[str, Any]:
     """
     Query the RAG system to retrieve relevant documents based on a question.
 
@@ -16,26 +19,71 @@ def query_rag(query: str, top_k: int = 3) -> Dict[str, Any]:
             - query: The original query
             - retrieved_documents: List of retrieved documents with titles and similarity scores
             - context: Formatted context string from retrieved documents
+            - context_tokens: Estimated tokens of the full vs. budgeted context
             - success: Boolean indicating if the query was successful
             - error: Error message if unsuccessful
+            - memoized: True when served from this session's earlier results
+            - stale: True when the database was unavailable and this is an earlier
+              result for the same question
     """
+    from agent_core.memo import memoized_call, normalize_query
+    from agent_core.metrics import instrument_tool
+    from agent_core.resilience import call_with_breaker
+
+    key_parts = {"query": normalize_query(query), "top_k": top_k}
+
+    # Repeated calls in a session are served from session state until documents change;
+    # database failures degrade to the last result for the question instead of blocking.
+    # Document text lives only in PostgreSQL, so there is no in-memory fallback.
+    return instrument_tool("query_rag", lambda: memoized_call(
+        tool_context,
+        state_key="query_rag_memo",
+        table="documents",
+        key_parts=key_parts,
+        compute=lambda: call_with_breaker(
+            "documents",
+            "query_rag",
+            key_parts,
+            compute=lambda: _query_rag(query, top_k),
+            unavailable={"query": query, "retrieved_documents": [], "context": ""}
+        ),
+        max_entries=int(os.getenv("RAG_MEMO_MAX_ENTRIES", 16))
+    ))
+
+
+def _query_rag(query: str, top_k: int) -> Dict[str, Any]:
+    """Uncached query_rag: retrieve, then build the budgeted context
+
+    Database failures are raised for call_with_breaker; other errors become an
+    unsuccessful result.
+    """
+    from agent_core.resilience import is_database_failure
+
     try:
         from ..core import RAGPipeline
+        from agent_core.context_builder import ContextBuilder
+        from agent_core.metrics import PIPELINE_STAGE_SECONDS
 
         # Initialize RAG pipeline
         rag = RAGPipeline()
 
         # Retrieve similar documents
-        retrieved_docs = rag.retrieve_similar_documents(query, top_k=top_k)
-
-        # Close the connection
-        rag.close()
+        try:
+            retrieved_docs = rag.retrieve_similar_documents(query, top_k=top_k)
+        finally:
+            # Close the connection
+            rag.close()
 
-        # Build context from retrieved documents
-        context = "\n\n".join([
-            f"Document: {doc['title']}\n{doc['content']}"
+        # Build context from retrieved documents, trimmed to the token budget
+        start = time.perf_counter()
+        builder = ContextBuilder(
+            rag.embedding_model, int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 1000)), model_name=rag.model_name
+        )
+        context, context_stats = builder.build(rag.last_query_embedding, [
+            (f"Document: {doc['title']}", doc['content'], doc['id'])
             for doc in retrieved_docs
         ])
+        PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - start, stage="format")
 
         return {
             "query": query,
@@ -43,16 +91,20 @@ def query_rag(query: str, top_k: int = 3) -> Dict[str, Any]:
                 {
                     "title": doc["title"],
                     "similarity": float(doc["similarity"]),
+                    **({"rerank_score": doc["rerank_score"]} if "rerank_score" in doc else {}),
                     "content": doc["content"][:200] + "..." if len(doc["content"]) > 200 else doc["content"]
                 }
                 for doc in retrieved_docs
             ],
             "context": context,
+            "context_tokens": context_stats,
             "success": True,
             "num_results": len(retrieved_docs)
         }
 
     except Exception as e:
+        if is_database_failure(e):
+            raise
         return {
             "query": query,
             "success": False,
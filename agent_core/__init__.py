@@ -0,0 +1,8 @@
+"""Modules shared by rag_agent and food_analyst_agent_adk
+
+Database routing and timeouts, metrics, memoization, the encode scheduler,
+context assembly, embedding snapshots and versions, and the stub LLM live here
+once. Both agents import them as `agent_core.<module>`, so a process serving
+both has one metrics registry, one replica router and one circuit breaker per
+name. rag_agent (under adk-first-agent/) puts the repository root on sys.path.
+"""
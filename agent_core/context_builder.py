@@ -0,0 +1,210 @@
+"""Token-budgeted context assembly for the LLM prompt
+
+Retrieved results are passed in as sections of (header, body). Body text is
+split into sentences, ranked by similarity to the query embedding the pipeline
+already computed, de-duplicated against sentences already picked, and added
+until the token budget runs out. Headers are only paid for once a section
+contributes at least one sentence. The output keeps section and sentence order
+so the context still reads naturally.
+
+Sentence embeddings are cached per (model, document id, content hash), in a
+process-wide LRU of CONTEXT_SENTENCE_CACHE_SIZE documents (default 1024, 0
+disables). Only documents missing from it are encoded, in one call, so a
+document that keeps being retrieved is embedded once per model.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from .encode_scheduler import get_encode_scheduler
+from .metrics import CACHE_REQUESTS
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for Gemini-style tokenizers)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_SPLIT.split(text or "") if s.strip()]
+
+
+class SentenceEmbeddingCache:
+    """LRU of one document's normalized sentence embeddings (a sentences x dim array)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            embeddings = self._entries.get(key)
+            if embeddings is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache="context_sentences", result="miss" if embeddings is None else "hit")
+        return embeddings
+
+    def put(self, key: Hashable, embeddings: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = embeddings
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_sentence_cache: Optional[SentenceEmbeddingCache] = None
+_sentence_cache_lock = threading.Lock()
+
+
+def get_sentence_cache() -> SentenceEmbeddingCache:
+    """Process-wide cache shared by every ContextBuilder"""
+    global _sentence_cache
+    with _sentence_cache_lock:
+        if _sentence_cache is None:
+            _sentence_cache = SentenceEmbeddingCache(int(os.getenv("CONTEXT_SENTENCE_CACHE_SIZE", 1024)))
+        return _sentence_cache
+
+
+class ContextBuilder:
+    """Builds a prompt context that fits a token budget"""
+
+    def __init__(
+        self,
+        embedding_model,
+        token_budget: int,
+        redundancy_threshold: float = 0.92,
+        model_name: Optional[str] = None,
+        cache: Optional[SentenceEmbeddingCache] = None
+    ):
+        """
+        Args:
+            embedding_model: SentenceTransformer used to embed candidate sentences
+            token_budget: Max estimated tokens in the returned context; 0 disables trimming
+            redundancy_threshold: Cosine similarity above which a sentence counts as
+                a repeat of one already selected
+            model_name: Name of `embedding_model` in cache keys, so pipelines that load
+                their own copy of a model share entries (default: this model object only)
+            cache: Sentence embedding cache (default: the process-wide one)
+        """
+        self.embedding_model = embedding_model
+        self.token_budget = token_budget
+        self.redundancy_threshold = redundancy_threshold
+        self.model_key = model_name or id(embedding_model)
+        self.cache = cache if cache is not None else get_sentence_cache()
+
+    def _embed_sections(self, parts: List[List[str]], doc_ids: List[Any]) -> np.ndarray:
+        """Normalized embeddings of every section's sentences, in order; encodes only cache misses"""
+        keys, per_section, misses = [], [], []
+        for index, (sentences, doc_id) in enumerate(zip(parts, doc_ids)):
+            digest = hashlib.sha256("\n".join(sentences).encode("utf-8")).hexdigest()[:16]
+            key = (self.model_key, doc_id, digest)
+            keys.append(key)
+            per_section.append(self.cache.get(key))
+            if per_section[-1] is None:
+                misses.append(index)
+
+        if misses:
+            encoded = np.asarray(
+                get_encode_scheduler().encode(
+                    self.embedding_model,
+                    [sentence for index in misses for sentence in parts[index]],
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                ),
+                dtype=np.float32
+            )
+            offset = 0
+            for index in misses:
+                count = len(parts[index])
+                per_section[index] = encoded[offset:offset + count]
+                offset += count
+                self.cache.put(keys[index], per_section[index])
+        return np.concatenate(per_section)
+
+    def build(self, query_embedding, sections: List[Tuple[Any, ...]]) -> Tuple[str, Dict[str, Any]]:
+        """Assemble the context for `sections` (in retrieval order)
+
+        Each section is (header, body) or (header, body, doc_id); the id keys the
+        sentence embedding cache together with a hash of the body.
+
+        Returns:
+            (context, stats) where stats has tokens_full, tokens_used, tokens_saved
+            and sentences_dropped
+        """
+        full_context = "\n\n".join(f"{section[0]}\n{section[1]}".strip() for section in sections)
+        tokens_full = estimate_tokens(full_context)
+        if self.token_budget <= 0 or tokens_full <= self.token_budget:
+            return full_context, {
+                "tokens_full": tokens_full,
+                "tokens_used": tokens_full,
+                "tokens_saved": 0,
+                "sentences_dropped": 0,
+            }
+
+        # Flatten to (section, sentence) candidates; header-only sections rank by header
+        owners, sentences, header_only, section_parts = [], [], set(), []
+        for index, (header, body, *_) in enumerate(sections):
+            parts = split_sentences(body)
+            if not parts:
+                parts = [header]
+                header_only.add(index)
+            owners.extend([index] * len(parts))
+            sentences.extend(parts)
+            section_parts.append(parts)
+
+        doc_ids = [section[2] if len(section) > 2 else None for section in sections]
+        embeddings = self._embed_sections(section_parts, doc_ids)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        relevance = embeddings @ query
+
+        used = 0
+        chosen: List[int] = []
+        opened = set()
+        for i in np.argsort(-relevance):
+            owner = owners[i]
+            cost = estimate_tokens(sentences[i]) + 1
+            if owner not in opened and owner not in header_only:
+                cost += estimate_tokens(sections[owner][0]) + 2
+            if used + cost > self.token_budget:
+                continue
+            if chosen and float(np.max(embeddings[chosen] @ embeddings[i])) > self.redundancy_threshold:
+                continue
+            chosen.append(int(i))
+            opened.add(owner)
+            used += cost
+
+        # Reassemble in retrieval order
+        picked: Dict[int, List[int]] = {}
+        for i in sorted(chosen):
+            picked.setdefault(owners[i], []).append(i)
+        blocks = []
+        for owner in sorted(picked):
+            if owner in header_only:
+                blocks.append(sections[owner][0])
+            else:
+                body = " ".join(sentences[i] for i in picked[owner])
+                blocks.append(f"{sections[owner][0]}\n{body}")
+        context = "\n\n".join(blocks)
+
+        tokens_used = estimate_tokens(context)
+        return context, {
+            "tokens_full": tokens_full,
+            "tokens_used": tokens_used,
+            "tokens_saved": tokens_full - tokens_used,
+            "sentences_dropped": len(sentences) - len(chosen),
+        }
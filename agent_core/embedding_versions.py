@@ -0,0 +1,257 @@
+"""Versioned embedding columns for zero-downtime model migrations
+
+A table can hold several embedding versions side by side. Each version is one
+vector column and the model that filled it, recorded in the
+`embedding_versions` registry (scripts/14_reembed.py):
+
+    table_name | version | model_name                            | column_name  | state
+    documents  | 1       | all-MiniLM-L6-v2                      | embedding    | retired
+    documents  | 2       | paraphrase-multilingual-MiniLM-L12-v2 | embedding_v2 | active
+
+States go building -> ready -> active -> retired. Exactly one version per
+table is active. Pipelines encode queries with the active version's model and
+search its column. Without the registry, the active version is the original
+`embedding` column with all-MiniLM-L6-v2.
+
+A migration never touches the active column:
+- the new column is added empty;
+- it is filled in the background;
+- its index is built CONCURRENTLY;
+- the flip to active happens in one transaction.
+
+Processes see the flip within EMBEDDING_VERSION_TTL_S. The flip also bumps
+table_versions, so results memoized under the old model are dropped.
+
+Dual read: while a version is building or ready, EMBEDDING_SHADOW_RATE of live
+searches are repeated in the background against it, using the candidate model
+and the rows filled so far. The overlap between its top-k and the served top-k
+is exported as a histogram and in `shadow_stats()`. The overlap shows how the
+new model would change results before anyone flips.
+"""
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from .encode_scheduler import BATCH, get_encode_scheduler
+from .metrics import EMBEDDING_ACTIVE_VERSION, EMBEDDING_SHADOW_OVERLAP
+from .replicas import get_replica_router
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_COLUMN = "embedding"
+BUILDING, READY, ACTIVE, RETIRED = "building", "ready", "active", "retired"
+
+# Columns each table's embeddings are computed from (joined with ". ")
+SOURCE_COLUMNS = {
+    "documents": ("content",),
+    "food_menu": ("nama_menu", "kategori", "asal", "deskripsi"),
+}
+
+REGISTRY_QUERY = """
+    SELECT table_name, version, model_name, dim, column_name, state
+    FROM embedding_versions
+    WHERE table_name = %s
+    ORDER BY version
+"""
+
+# Tables and version columns are interpolated into SQL, so only these names are accepted
+_TABLE_PATTERN = re.compile(r"^[a-z_][a-z0-9_]*$")
+_COLUMN_PATTERN = re.compile(r"^embedding(_v[0-9]+)?$")
+
+
+def source_text_sql(table: str) -> str:
+    """SQL expression of the text a table's rows are embedded from"""
+    columns = SOURCE_COLUMNS[table]
+    return columns[0] if len(columns) == 1 else f"concat_ws('. ', {', '.join(columns)})"
+
+
+class EmbeddingVersion:
+    """One embedding column of a table and the model that fills it"""
+
+    def __init__(self, table: str, version: int, model_name: str, dim: int, column: str, state: str):
+        if not _TABLE_PATTERN.match(table) or not _COLUMN_PATTERN.match(column):
+            raise ValueError(f"Invalid embedding table or column name: {table}.{column}")
+        self.table = table
+        self.version = version
+        self.model_name = model_name
+        self.dim = dim
+        self.column = column
+        self.state = state
+
+    def __repr__(self) -> str:
+        return f"<EmbeddingVersion {self.table} v{self.version} {self.model_name} ({self.column}, {self.state})>"
+
+
+def default_version(table: str) -> EmbeddingVersion:
+    """The original column, active when the registry doesn't exist yet"""
+    return EmbeddingVersion(table, 1, DEFAULT_MODEL, 384, DEFAULT_COLUMN, ACTIVE)
+
+
+def load_versions(conn, table: str) -> List[EmbeddingVersion]:
+    """Registry rows of a table, oldest first ([] before scripts/14_reembed.py ran)"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(REGISTRY_QUERY, (table,))
+            rows = cur.fetchall()
+    except psycopg2.errors.UndefinedTable:
+        if not conn.autocommit:
+            conn.rollback()
+        return []
+    return [EmbeddingVersion(*row) for row in rows]
+
+
+class VersionCache:
+    """Registry rows per table, re-read at most every `ttl` seconds"""
+
+    def __init__(self, ttl: float = 5.0):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, List[EmbeddingVersion]]] = {}
+        self._lock = threading.Lock()
+
+    def versions(self, table: str, conn) -> List[EmbeddingVersion]:
+        """Cached rows; `conn` is only used when they are due for a re-read"""
+        entry = self._entries.get(table)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        try:
+            versions = load_versions(conn, table)
+        except psycopg2.Error as e:
+            if entry is None:
+                raise
+            logger.warning("Embedding registry refresh for %s failed, keeping cached: %s", table, e)
+            return entry[1]
+        with self._lock:
+            self._entries[table] = (time.monotonic(), versions)
+        EMBEDDING_ACTIVE_VERSION.set(self._pick_active(table, versions).version, table=table)
+        return versions
+
+    @staticmethod
+    def _pick_active(table: str, versions: List[EmbeddingVersion]) -> EmbeddingVersion:
+        for version in versions:
+            if version.state == ACTIVE:
+                return version
+        return default_version(table)
+
+    def active(self, table: str, conn) -> EmbeddingVersion:
+        return self._pick_active(table, self.versions(table, conn))
+
+    def candidate(self, table: str, conn) -> Optional[EmbeddingVersion]:
+        """Newest version being built or awaiting the flip, if any"""
+        active = self.active(table, conn)
+        pending = [
+            v for v in self.versions(table, conn)
+            if v.state in (BUILDING, READY) and v.version > active.version
+        ]
+        return pending[-1] if pending else None
+
+
+class ShadowReader:
+    """Repeats sampled searches against a candidate version, off the request path"""
+
+    def __init__(self, rate: float = 0.0, queue_size: int = 8):
+        """
+        Args:
+            rate: Share of searches repeated against the candidate (0 disables)
+            queue_size: Pending comparisons; further ones are dropped, never waited for
+        """
+        self.rate = rate
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._models: Dict[str, Any] = {}
+        self._conn = None
+        self._totals: Dict[Tuple[str, int], List[float]] = {}
+
+    def submit(self, candidate: EmbeddingVersion, query: str, served_ids: List[int], top_k: int):
+        """Maybe queue a comparison of the served ids with the candidate's top-k"""
+        if self.rate <= 0 or not served_ids or random.random() >= self.rate:
+            return
+        try:
+            self._queue.put_nowait({"version": candidate, "query": query, "served": served_ids, "top_k": top_k})
+        except queue.Full:
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-shadow-read", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._compare(job)
+            except Exception as e:
+                logger.warning("Shadow read against %s failed: %s", job["version"], e)
+                if self._conn is not None and not self._conn.closed:
+                    self._conn.close()
+
+    def _model(self, model_name: str):
+        if model_name not in self._models:
+            from sentence_transformers import SentenceTransformer
+            self._models[model_name] = SentenceTransformer(model_name, device='cpu')
+        return self._models[model_name]
+
+    def _compare(self, job: Dict[str, Any]):
+        version: EmbeddingVersion = job["version"]
+        # Batch priority: the shadow never delays an interactive encode
+        embedding = get_encode_scheduler().encode(self._model(version.model_name), job["query"], priority=BATCH)
+        embedding_str = "[" + ",".join([str(x) for x in embedding]) + "]"
+
+        if self._conn is None or self._conn.closed:
+            self._conn, _ = get_replica_router().connect_for_reads()
+        with self._conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT id FROM {version.table}
+                WHERE {version.column} IS NOT NULL
+                ORDER BY {version.column} <=> %s::vector
+                LIMIT %s
+            """, (embedding_str, job["top_k"]))
+            found = {row[0] for row in cur.fetchall()}
+
+        served = job["served"]
+        overlap = len(found & set(served)) / len(served)
+        EMBEDDING_SHADOW_OVERLAP.observe(overlap, table=version.table, version=str(version.version))
+        with self._lock:
+            totals = self._totals.setdefault((version.table, version.version), [0, 0.0])
+            totals[0] += 1
+            totals[1] += overlap
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per candidate: shadow searches compared and their mean overlap"""
+        with self._lock:
+            return {
+                f"{table}/v{version}": {"searches": count, "mean_overlap": total / count}
+                for (table, version), (count, total) in self._totals.items()
+            }
+
+
+_versions: Optional[VersionCache] = None
+_shadow: Optional[ShadowReader] = None
+
+
+def get_embedding_versions() -> VersionCache:
+    """Process-wide registry cache configured from EMBEDDING_VERSION_TTL_S"""
+    global _versions
+    if _versions is None:
+        _versions = VersionCache(ttl=float(os.getenv("EMBEDDING_VERSION_TTL_S", 5)))
+    return _versions
+
+
+def get_shadow_reader() -> ShadowReader:
+    """Process-wide dual-read sampler configured from EMBEDDING_SHADOW_RATE"""
+    global _shadow
+    if _shadow is None:
+        _shadow = ShadowReader(rate=float(os.getenv("EMBEDDING_SHADOW_RATE", 0)))
+    return _shadow
+
+
+def shadow_stats() -> Dict[str, Dict[str, float]]:
+    return get_shadow_reader().stats()
@@ -0,0 +1,168 @@
+"""Priority scheduling of CPU-bound model calls
+
+Every `model.encode(...)` and cross-encoder `model.predict(...)` in the process
+goes through one `EncodeScheduler`. The scheduler splits the cores between two
+classes, so they can't oversubscribe the machine:
+- "interactive" (a user's query): ENCODE_INTERACTIVE_THREADS torch threads,
+  by default the cores not reserved for batch work;
+- "batch" (ingestion, re-embedding, shadow reads): ENCODE_BATCH_THREADS torch
+  threads, by default half the cores.
+
+Each class runs one call at a time on its own lease. The two classes run
+concurrently, so a query never waits behind ingestion; it only waits behind
+other queries. Batch inputs are encoded in chunks of ENCODE_BATCH_CHUNK texts,
+so several batch callers (a re-embed and the shadow reader) take turns.
+
+The thread count is applied in the calling thread just before each call. With
+torch's OpenMP backend (the default CPU build) `torch.set_num_threads` sets the
+calling thread's OpenMP thread count, so a batch chunk and a query running at
+the same time each keep their own share.
+
+`stats()` reports queue depth and wait time per class, as do the Prometheus
+metrics in metrics.py. first-agent/ imports this module from agent_core too,
+so a process serving both has one scheduler.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .metrics import ENCODE_QUEUE_DEPTH, ENCODE_WAIT_SECONDS
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+def _concatenate(parts: List[Any]) -> Any:
+    """Join chunked encode outputs the way one call would have returned them"""
+    first = parts[0]
+    if isinstance(first, list):
+        return [item for part in parts for item in part]
+    if type(first).__module__.startswith("torch"):
+        import torch
+        return torch.cat(parts)
+    import numpy as np
+    return np.concatenate(parts)
+
+
+class EncodeScheduler:
+    """One lease per priority class, each with its own torch thread count"""
+
+    def __init__(
+        self,
+        interactive_threads: int = 0,
+        batch_threads: int = 1,
+        batch_chunk: int = 64
+    ):
+        """
+        Args:
+            interactive_threads: torch intra-op threads for interactive calls
+                (0: the cores left over after `batch_threads`)
+            batch_threads: torch intra-op threads for batch calls
+            batch_chunk: Texts per batch lease; smaller means batch callers alternate sooner
+        """
+        cores = os.cpu_count() or 2
+        self.batch_threads = max(1, min(batch_threads, cores))
+        self.interactive_threads = interactive_threads or max(1, cores - self.batch_threads)
+        self.batch_chunk = max(1, batch_chunk)
+        self._cond = threading.Condition()
+        self._busy = {p: False for p in PRIORITIES}
+        self._queued = {p: 0 for p in PRIORITIES}
+        self._completed = {p: 0 for p in PRIORITIES}
+        self._wait_total = {p: 0.0 for p in PRIORITIES}
+        self._wait_max = {p: 0.0 for p in PRIORITIES}
+        self._thread_state = threading.local()
+
+    def encode(self, model, inputs, priority: str = INTERACTIVE, **kwargs) -> Any:
+        """`model.encode(inputs, **kwargs)` under the scheduler
+
+        Batch lists longer than `batch_chunk` are encoded chunk by chunk and
+        concatenated, releasing the batch lease in between.
+        """
+        return self._call(model.encode, inputs, priority, kwargs)
+
+    def predict(self, model, pairs, priority: str = INTERACTIVE, **kwargs) -> Any:
+        """`model.predict(pairs, **kwargs)` (a cross-encoder) under the scheduler"""
+        return self._call(model.predict, pairs, priority, kwargs)
+
+    def _call(self, method, inputs, priority: str, kwargs: Dict[str, Any]) -> Any:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+        if priority == INTERACTIVE or isinstance(inputs, str) or len(inputs) <= self.batch_chunk:
+            with self._lease(priority):
+                return method(inputs, **kwargs)
+
+        parts = []
+        for start in range(0, len(inputs), self.batch_chunk):
+            with self._lease(priority):
+                parts.append(method(inputs[start:start + self.batch_chunk], **kwargs))
+        return _concatenate(parts)
+
+    @contextmanager
+    def _lease(self, priority: str):
+        enqueued = time.perf_counter()
+        with self._cond:
+            self._queued[priority] += 1
+            ENCODE_QUEUE_DEPTH.set(self._queued[priority], priority=priority)
+            while self._busy[priority]:
+                self._cond.wait()
+            self._queued[priority] -= 1
+            ENCODE_QUEUE_DEPTH.set(self._queued[priority], priority=priority)
+            self._busy[priority] = True
+            waited = time.perf_counter() - enqueued
+            self._completed[priority] += 1
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+        ENCODE_WAIT_SECONDS.observe(waited, priority=priority)
+        try:
+            self._set_threads(self.interactive_threads if priority == INTERACTIVE else self.batch_threads)
+            yield
+        finally:
+            with self._cond:
+                self._busy[priority] = False
+                self._cond.notify_all()
+
+    def _set_threads(self, threads: int):
+        """Apply the class's thread count in the calling thread, once per change"""
+        if getattr(self._thread_state, "threads", None) == threads:
+            return
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(threads)
+        self._thread_state.threads = threads
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per priority: torch threads, queued now, leases granted, mean and max wait (ms)"""
+        with self._cond:
+            return {
+                p: {
+                    "threads": self.interactive_threads if p == INTERACTIVE else self.batch_threads,
+                    "queued": self._queued[p],
+                    "completed": self._completed[p],
+                    "mean_wait_ms": 1000 * self._wait_total[p] / self._completed[p] if self._completed[p] else 0.0,
+                    "max_wait_ms": 1000 * self._wait_max[p]
+                }
+                for p in PRIORITIES
+            }
+
+
+_scheduler: Optional[EncodeScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_encode_scheduler() -> EncodeScheduler:
+    """Process-wide scheduler configured from ENCODE_* environment variables"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = EncodeScheduler(
+                interactive_threads=int(os.getenv("ENCODE_INTERACTIVE_THREADS", 0)),
+                batch_threads=int(os.getenv("ENCODE_BATCH_THREADS", max(1, (os.cpu_count() or 2) // 2))),
+                batch_chunk=int(os.getenv("ENCODE_BATCH_CHUNK", 64))
+            )
+        return _scheduler
@@ -0,0 +1,139 @@
+"""Session-scoped memoization of tool results
+
+Results are kept in ADK session state, so a repeated question in the same
+conversation skips the embedding model and the vector search. Each memo is
+tagged with the table version (scripts/6_table_versions.py) it was computed
+against and is dropped once the table changes.
+
+Table versions are cached in-process for MEMO_VERSION_TTL_S seconds (default
+2), so tool calls don't each pay a database round trip; a memo can therefore
+outlive a table change by up to that long. 0 checks on every call.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import psycopg2
+
+from .metrics import CACHE_REQUESTS
+from .resilience import db_timeouts, get_breaker
+
+# How often to look for table_versions again after finding it missing
+VERSION_TABLE_RETRY_S = 60.0
+
+_conn = None
+_conn_lock = threading.Lock()
+_versions: Dict[str, Tuple[Optional[int], float]] = {}
+_version_table_retry_at = 0.0
+
+
+def _version_connection():
+    """One small autocommit connection per process, reopened if it drops"""
+    global _conn
+    if _conn is None or _conn.closed:
+        _conn = psycopg2.connect(
+            host=os.getenv("DB_HOST", "localhost"),
+            user=os.getenv("DB_USER", "boilerplate"),
+            password=os.getenv("DB_PASSWORD", "boilerplate"),
+            database=os.getenv("DB_NAME", "boilerplate_db"),
+            port=int(os.getenv("DB_PORT", 5432)),
+            **db_timeouts()
+        )
+        _conn.autocommit = True
+    return _conn
+
+
+def _fetch_table_version(table: str) -> Optional[int]:
+    """One lookup on the shared connection (caller holds _conn_lock)"""
+    global _version_table_retry_at
+    try:
+        with _version_connection().cursor() as cur:
+            if time.monotonic() >= _version_table_retry_at:
+                try:
+                    cur.execute("SELECT version FROM table_versions WHERE table_name = %s", (table,))
+                    row = cur.fetchone()
+                    if row is not None:
+                        return row[0]
+                except psycopg2.errors.UndefinedTable:
+                    # Not installed yet; check again later instead of on every call
+                    _version_table_retry_at = time.monotonic() + VERSION_TABLE_RETRY_S
+            # Fallback: cumulative write counters from the statistics collector
+            cur.execute("""
+                SELECT n_tup_ins + n_tup_upd + n_tup_del
+                FROM pg_stat_user_tables WHERE relname = %s
+            """, (table,))
+            row = cur.fetchone()
+            return row[0] if row else None
+    except psycopg2.Error:
+        return None
+
+
+def get_table_version(table: str) -> Optional[int]:
+    """Current version of `table` (at most MEMO_VERSION_TTL_S old), or None if it can't be determined"""
+    # Don't wait on a database the circuit breaker already knows is failing
+    if not get_breaker(table).is_closed():
+        return None
+    ttl = float(os.getenv("MEMO_VERSION_TTL_S", 2.0))
+    cached = _versions.get(table)
+    if cached is not None and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    with _conn_lock:
+        # Another thread may have refreshed it while we waited
+        cached = _versions.get(table)
+        if cached is not None and time.monotonic() - cached[1] < ttl:
+            return cached[0]
+        version = _fetch_table_version(table)
+        if version is not None:
+            _versions[table] = (version, time.monotonic())
+        return version
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def memoized_call(
+    tool_context,
+    state_key: str,
+    table: str,
+    key_parts: Dict[str, Any],
+    compute: Callable[[], Dict[str, Any]],
+    max_entries: int
+) -> Dict[str, Any]:
+    """Serve `compute()` from the session memo when the same call was already made
+
+    Args:
+        tool_context: ADK ToolContext (None outside an agent run: no memoization)
+        state_key: Session state key holding this tool's memo
+        table: Table whose version guards the memo
+        key_parts: Call arguments identifying the result (query, top_k, filters)
+        compute: Produces the result on a miss; unsuccessful and stale results aren't stored
+        max_entries: Per-session cap, least recently used entries are dropped
+    """
+    if tool_context is None or max_entries <= 0:
+        return compute()
+
+    version = get_table_version(table)
+    if version is None:
+        return compute()
+
+    memo = tool_context.state.get(state_key) or {}
+    entries = memo.get("entries", []) if memo.get("version") == version else []
+    key = json.dumps(key_parts, sort_keys=True, ensure_ascii=False)
+
+    for i, (entry_key, result) in enumerate(entries):
+        if entry_key == key:
+            # Move to the most recently used end
+            entries = entries[:i] + entries[i + 1:] + [[entry_key, result]]
+            tool_context.state[state_key] = {"version": version, "entries": entries}
+            CACHE_REQUESTS.inc(cache=state_key, result="hit")
+            return {**result, "memoized": True}
+
+    CACHE_REQUESTS.inc(cache=state_key, result="miss")
+    result = compute()
+    if result.get("success") and not result.get("stale"):
+        entries = (entries + [[key, result]])[-max_entries:]
+        tool_context.state[state_key] = {"version": version, "entries": entries}
+    return result
@@ -0,0 +1,287 @@
+"""Lightweight in-process metrics in the Prometheus text format
+
+No client library: counters, gauges and fixed-bucket histograms, each guarded
+by its own lock. Recording is a dict lookup, a bisect and a few additions
+(around a microsecond), so it stays on in production. custom_server.py serves
+`REGISTRY.render()` at GET /metrics.
+
+Both agents record into the one REGISTRY below. Tool and stage labels tell
+query_rag from query_food, and Prometheus adds `job`/`instance` per server.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+PREFIX = "agent"
+
+# Seconds; covers a cached memo hit up to a slow cold model load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], le: str = "") -> str:
+    pairs = ['%s="%s"' % (n, _escape(v)) for n, v in zip(names, values)]
+    if le:
+        pairs.append('le="%s"' % le)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], float]):
+        """Read the value at scrape time (unlabelled gauges only)"""
+        self._callback = callback
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            self.set(float(self._callback()))
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics in registration order and renders them together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(line + "\n" for metric in metrics for line in metric.render())
+
+
+REGISTRY = Registry()
+
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    f"{PREFIX}_pipeline_stage_seconds", "Latency per stage (encode, search, rerank, mmr, format, llm)", ["stage"]
+)
+PIPELINE_RESULTS = REGISTRY.counter(
+    f"{PREFIX}_pipeline_results_total", "Rows returned by retrieval", ["source"]
+)
+PIPELINE_ERRORS = REGISTRY.counter(
+    f"{PREFIX}_pipeline_errors_total", "Retrievals that raised, by stage", ["stage"]
+)
+TOOL_SECONDS = REGISTRY.histogram(
+    f"{PREFIX}_tool_seconds", "End-to-end tool call latency", ["tool"]
+)
+TOOL_CALLS = REGISTRY.counter(
+    f"{PREFIX}_tool_calls_total", "Tool calls by outcome (success, error, memoized, degraded)", ["tool", "outcome"]
+)
+TOOL_IN_FLIGHT = REGISTRY.gauge(
+    f"{PREFIX}_tool_in_flight", "Tool calls currently running", ["tool"]
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    f"{PREFIX}_cache_requests_total", "Cache lookups by result (hit, miss)", ["cache", "result"]
+)
+SLOW_QUERIES = REGISTRY.counter(
+    f"{PREFIX}_slow_queries_total", "Searches over SLOW_QUERY_THRESHOLD_MS (slow_queries.py)", ["query"]
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    f"{PREFIX}_circuit_state", "Database circuit breaker state (0 closed, 1 half-open, 2 open)", ["breaker"]
+)
+DEGRADED_RESPONSES = REGISTRY.counter(
+    f"{PREFIX}_degraded_responses_total", "Results served without the database, by source", ["tool", "source"]
+)
+ENCODE_QUEUE_DEPTH = REGISTRY.gauge(
+    f"{PREFIX}_encode_queue_depth", "Model calls waiting for their class's lease (encode_scheduler.py)", ["priority"]
+)
+ENCODE_WAIT_SECONDS = REGISTRY.histogram(
+    f"{PREFIX}_encode_wait_seconds", "Time model calls waited for their class's lease", ["priority"]
+)
+DB_CONNECTIONS = REGISTRY.gauge(
+    f"{PREFIX}_pipeline_connections_open", "Connections held by live pipelines (one each, opened per tool call, not pooled)"
+)
+DB_CONNECT_SECONDS = REGISTRY.histogram(
+    f"{PREFIX}_db_connect_seconds", "Time to open a connection, by server (replicas.py)", ["target"]
+)
+DB_POOL_SIZE = REGISTRY.gauge(
+    f"{PREFIX}_db_pool_size", "Maximum connections of each shard pool (RAG_SHARD_POOL_SIZE)", ["pool"]
+)
+DB_POOL_IN_USE = REGISTRY.gauge(
+    f"{PREFIX}_db_pool_in_use", "Shard pool connections checked out", ["pool"]
+)
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    f"{PREFIX}_db_pool_wait_seconds", "Time shard searches waited for a free pool connection", ["pool"]
+)
+DB_READ_ROUTES = REGISTRY.counter(
+    f"{PREFIX}_db_read_routes_total", "Read connections opened, by server (replicas.py)", ["target"]
+)
+REPLICA_LAG_SECONDS = REGISTRY.gauge(
+    f"{PREFIX}_replica_lag_seconds", "Replay lag of each replica at its last health check", ["replica"]
+)
+REPLICA_HEALTHY = REGISTRY.gauge(
+    f"{PREFIX}_replica_healthy", "1 if the replica answered its last health check within DB_REPLICA_MAX_LAG_S", ["replica"]
+)
+EMBEDDING_ACTIVE_VERSION = REGISTRY.gauge(
+    f"{PREFIX}_embedding_active_version", "Embedding version searches use (embedding_versions.py)", ["table"]
+)
+EMBEDDING_SHADOW_OVERLAP = REGISTRY.histogram(
+    f"{PREFIX}_embedding_shadow_overlap", "Share of served top-k also found by the candidate embedding version",
+    ["table", "version"], buckets=(0.0, 0.2, 0.4, 0.6, 0.8, 0.9, 1.0)
+)
+
+
+def record_timings(timings: Dict[str, float]):
+    """Observe a pipeline's `last_timings` ({"encode_ms": ..., ...})"""
+    for stage, ms in timings.items():
+        PIPELINE_STAGE_SECONDS.observe(ms / 1000, stage=stage.replace("_ms", ""))
+
+
+def before_model_callback(callback_context, llm_request):
+    """ADK before_model_callback: note when the LLM request went out"""
+    # temp: state lives for one invocation only and is never persisted
+    callback_context.state["temp:llm_started"] = time.perf_counter()
+    return None
+
+
+def after_model_callback(callback_context, llm_response):
+    """ADK after_model_callback: observe the LLM call as the `llm` stage
+
+    Streaming calls get one callback per partial chunk; only the final
+    response is timed.
+    """
+    if getattr(llm_response, "partial", False):
+        return None
+    started = callback_context.state.get("temp:llm_started")
+    if started is not None:
+        PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+        callback_context.state["temp:llm_started"] = None
+    return None
+
+
+def instrument_tool(tool: str, call: Callable[[], Dict]) -> Dict:
+    """Run a tool body, recording latency, in-flight count and outcome"""
+    TOOL_IN_FLIGHT.inc(tool=tool)
+    start = time.perf_counter()
+    try:
+        result = call()
+    except Exception:
+        TOOL_CALLS.inc(tool=tool, outcome="error")
+        raise
+    finally:
+        TOOL_IN_FLIGHT.dec(tool=tool)
+        TOOL_SECONDS.observe(time.perf_counter() - start, tool=tool)
+
+    if result.get("memoized"):
+        outcome = "memoized"
+    elif result.get("degraded"):
+        outcome = "degraded"
+    else:
+        outcome = "success" if result.get("success") else "error"
+    TOOL_CALLS.inc(tool=tool, outcome=outcome)
+    return result
@@ -0,0 +1,304 @@
+"""Read routing across the primary and streaming replicas
+
+The primary is the server in the DB_* variables, or a pipeline's `primary_dsn`.
+Everything that writes connects there: ingestion, the scripts, and the stats
+refresh. Replicas are listed in DB_REPLICA_DSNS, separated by ";":
+
+    DB_REPLICA_DSNS="host=pg-replica1 dbname=boilerplate_db user=...;host=pg-replica2 ..."
+
+Similarity searches and nutrition lookups open their connection with
+`connect_for_reads()`, which picks a replica by DB_REPLICA_STRATEGY:
+- round_robin (default) rotates over the usable replicas;
+- least_latency takes the replica with the fastest health checks.
+
+A daemon thread checks every replica each DB_REPLICA_CHECK_INTERVAL_S seconds.
+It measures round-trip time and replay lag. A replica is usable when it
+answers and lags at most DB_REPLICA_MAX_LAG_S seconds. With no usable replica,
+reads go to the primary. Without DB_REPLICA_DSNS, everything uses the primary
+as before and no thread is started.
+
+A reader that must see a given write can pass `min_lsn`, the primary's WAL
+position after that write. Only replicas that have replayed up to it qualify.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from .metrics import DB_CONNECT_SECONDS, DB_READ_ROUTES, REPLICA_HEALTHY, REPLICA_LAG_SECONDS
+from .resilience import db_timeouts
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+
+# Seconds behind the primary; zero when the replica has replayed everything it received
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def is_connection_failure(error: Exception) -> bool:
+    """Lost or refused connections, but not statement timeouts (the server is up, just slow)"""
+    return (
+        isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        and not isinstance(error, psycopg2.extensions.QueryCanceledError)
+    )
+
+
+class Replica:
+    """Health of one replica as of its last check"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        params = parse_dsn(dsn)
+        self.name = f"{params.get('host', 'localhost')}:{params.get('port', 5432)}"
+        self.healthy = False
+        self.lag_s: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.checked_at = 0.0
+        self.error = ""
+        self._conn = None
+
+    def check(self, max_lag_s: float):
+        """Refresh lag and round-trip time on a kept-open connection"""
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = psycopg2.connect(self.dsn, **db_timeouts(self.dsn))
+                self._conn.autocommit = True
+            start = time.perf_counter()
+            with self._conn.cursor() as cur:
+                cur.execute(LAG_QUERY)
+                lag = cur.fetchone()[0]
+            rtt_ms = (time.perf_counter() - start) * 1000
+        except psycopg2.Error as e:
+            self.mark_down(str(e).strip())
+            return
+        # Smoothed, so one slow check doesn't reorder least_latency routing
+        self.latency_ms = rtt_ms if self.latency_ms is None else 0.7 * self.latency_ms + 0.3 * rtt_ms
+        self.lag_s = float(lag) if lag is not None else None
+        self.healthy = self.lag_s is not None and self.lag_s <= max_lag_s
+        self.error = "" if self.healthy else f"replay lag {self.lag_s}s over {max_lag_s}s"
+        self.checked_at = time.time()
+        REPLICA_HEALTHY.set(1 if self.healthy else 0, replica=self.name)
+        if self.lag_s is not None:
+            REPLICA_LAG_SECONDS.set(self.lag_s, replica=self.name)
+
+    def mark_down(self, error: str):
+        if self.healthy:
+            logger.warning("Replica %s marked down: %s", self.name, error)
+        self.healthy = False
+        self.error = error
+        self.checked_at = time.time()
+        REPLICA_HEALTHY.set(0, replica=self.name)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "replica": self.name,
+            "healthy": self.healthy,
+            "lag_s": self.lag_s,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "error": self.error
+        }
+
+
+class ReplicaRouter:
+    """Chooses a server for each read connection; writes always go to the primary"""
+
+    def __init__(
+        self,
+        primary_dsn: Optional[str] = None,
+        replica_dsns: Optional[List[str]] = None,
+        strategy: str = "round_robin",
+        max_lag_s: float = 5.0,
+        check_interval: float = 5.0
+    ):
+        """
+        Args:
+            primary_dsn: Primary connection string (None: the DB_* variables)
+            replica_dsns: Streaming replicas to spread reads over
+            strategy: "round_robin" or "least_latency"
+            max_lag_s: Replay lag above which a replica stops receiving reads
+            check_interval: Seconds between health checks
+        """
+        if strategy not in ("round_robin", "least_latency"):
+            raise ValueError(f"Unknown replica strategy '{strategy}'")
+        self.primary_dsn = primary_dsn
+        self.replicas = [Replica(dsn) for dsn in replica_dsns or []]
+        self.strategy = strategy
+        self.max_lag_s = max_lag_s
+        self.check_interval = check_interval
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def connect_primary(self):
+        """Autocommit connection to the primary (writes, LISTEN, fallback reads)"""
+        start = time.perf_counter()
+        if self.primary_dsn:
+            conn = psycopg2.connect(self.primary_dsn, **db_timeouts(self.primary_dsn))
+        else:
+            conn = psycopg2.connect(
+                host=os.getenv("DB_HOST", "localhost"),
+                user=os.getenv("DB_USER", "boilerplate"),
+                password=os.getenv("DB_PASSWORD", "boilerplate"),
+                database=os.getenv("DB_NAME", "boilerplate_db"),
+                port=int(os.getenv("DB_PORT", 5432)),
+                **db_timeouts()
+            )
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start, target=PRIMARY)
+        conn.autocommit = True
+        return conn
+
+    def connect_to(self, target: str):
+        """Autocommit connection to a server named by `connect_for_reads()`, whatever its health
+
+        For diagnostics that must run where a read ran (slow_queries.py's EXPLAIN).
+        """
+        if target == PRIMARY:
+            return self.connect_primary()
+        for replica in self.replicas:
+            if replica.name == target:
+                conn = psycopg2.connect(replica.dsn, **db_timeouts(replica.dsn))
+                conn.autocommit = True
+                return conn
+        raise ValueError(f"Unknown read target '{target}'")
+
+    def candidates(self) -> List[Replica]:
+        """Usable replicas in the order they should be tried"""
+        self._ensure_checker()
+        usable = [r for r in self.replicas if r.healthy]
+        if not usable:
+            return []
+        if self.strategy == "least_latency":
+            return sorted(usable, key=lambda r: r.latency_ms if r.latency_ms is not None else float("inf"))
+        with self._lock:
+            turn = next(self._turn) % len(usable)
+        return usable[turn:] + usable[:turn]
+
+    def connect_for_reads(self, min_lsn: Optional[str] = None) -> Tuple[Any, str]:
+        """Autocommit connection for reads and the name of the server it went to
+
+        Args:
+            min_lsn: Primary WAL position (`pg_current_wal_lsn()`) the reader
+                must see; replicas that haven't replayed it are skipped
+        """
+        for replica in self.candidates():
+            try:
+                start = time.perf_counter()
+                conn = psycopg2.connect(replica.dsn, **db_timeouts(replica.dsn))
+                DB_CONNECT_SECONDS.observe(time.perf_counter() - start, target=replica.name)
+                conn.autocommit = True
+            except psycopg2.Error as e:
+                replica.mark_down(str(e).strip())
+                continue
+            if min_lsn and not self._has_replayed(conn, min_lsn):
+                conn.close()
+                continue
+            DB_READ_ROUTES.inc(target=replica.name)
+            return conn, replica.name
+
+        DB_READ_ROUTES.inc(target=PRIMARY)
+        return self.connect_primary(), PRIMARY
+
+    @staticmethod
+    def _has_replayed(conn, lsn: str) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= %s::pg_lsn", (lsn,)
+                )
+                return bool(cur.fetchone()[0])
+        except psycopg2.Error:
+            return False
+
+    def should_keep(self, target: str) -> bool:
+        """Whether a long-lived read connection to `target` should stay open
+
+        A replica connection is dropped once the replica falls behind or fails
+        its checks. A primary connection is dropped once a replica is usable
+        again, so reads move back off the primary.
+        """
+        if target == PRIMARY:
+            return not any(r.healthy for r in self.replicas)
+        return any(r.name == target and r.healthy for r in self.replicas)
+
+    def fail_over(self, conn, target: str, error: Exception) -> Tuple[Any, str]:
+        """Replace a read connection whose replica failed with one to the primary"""
+        for replica in self.replicas:
+            if replica.name == target:
+                replica.mark_down(str(error).strip())
+        if not conn.closed:
+            conn.close()
+        DB_READ_ROUTES.inc(target=PRIMARY)
+        return self.connect_primary(), PRIMARY
+
+    def check_all(self):
+        for replica in self.replicas:
+            replica.check(self.max_lag_s)
+
+    def _ensure_checker(self):
+        if not self.replicas:
+            return
+        with self._lock:
+            if self._checker is not None and self._checker.is_alive():
+                return
+            # First check inline, so the very first read can already use a replica
+            self.check_all()
+            self._checker = threading.Thread(target=self._run_checks, name="replica-health", daemon=True)
+            self._checker.start()
+
+    def _run_checks(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check_all()
+            except Exception as e:
+                logger.warning("Replica health check failed: %s", e)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "max_lag_s": self.max_lag_s,
+            "replicas": [r.status() for r in self.replicas]
+        }
+
+
+_routers: Dict[Tuple[Optional[str], Tuple[str, ...]], ReplicaRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_replica_router(
+    primary_dsn: Optional[str] = None,
+    replica_dsns: Optional[List[str]] = None
+) -> ReplicaRouter:
+    """Process-wide router per (primary, replicas), configured from DB_REPLICA_* variables
+
+    `replica_dsns=None` reads DB_REPLICA_DSNS; pass [] to keep reads on the primary.
+    """
+    if replica_dsns is None:
+        replica_dsns = [d.strip() for d in os.getenv("DB_REPLICA_DSNS", "").split(";") if d.strip()]
+    key = (primary_dsn, tuple(replica_dsns))
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = ReplicaRouter(
+                primary_dsn,
+                list(replica_dsns),
+                strategy=os.getenv("DB_REPLICA_STRATEGY", "round_robin"),
+                max_lag_s=float(os.getenv("DB_REPLICA_MAX_LAG_S", 5)),
+                check_interval=float(os.getenv("DB_REPLICA_CHECK_INTERVAL_S", 5))
+            )
+        return _routers[key]
@@ -0,0 +1,215 @@
+"""Deadlines, circuit breaking and degraded fallbacks for database-backed tools
+
+Every pipeline connection gets a connect timeout (DB_CONNECT_TIMEOUT_S) and a
+server-side statement_timeout (DB_STATEMENT_TIMEOUT_MS), so a slow or
+unreachable PostgreSQL fails a search within a bounded time.
+
+A `CircuitBreaker` per table counts consecutive database failures. After
+CIRCUIT_FAILURE_THRESHOLD of them it opens: calls skip the database entirely
+for CIRCUIT_RESET_TIMEOUT_S, then a single probe call is let through. If the
+probe succeeds the breaker closes; if not, it opens again. A call that fails
+for a reason other than the database (a bad argument, a model error) says
+nothing about it: it leaves the failure count alone, and a probe that ends that
+way lets the next call probe instead.
+
+While the breaker is open, or when a call fails, `call_with_breaker` serves a
+degraded result flagged `stale: True`. It tries, in order:
+- the last successful result for the same arguments (process-wide LRU);
+- the tool's in-memory fallback (e.g. the embedding snapshot).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from .metrics import CIRCUIT_STATE, DEGRADED_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+
+def db_timeouts(dsn: str = "") -> Dict[str, Any]:
+    """psycopg2.connect kwargs bounding connection and per-statement time
+
+    Keyword arguments replace the DSN's own parameters, so options already in
+    `dsn` (e.g. `-c search_path=...`) are carried over.
+    """
+    options = f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 2000))}"
+    if dsn and parse_dsn(dsn).get("options"):
+        options = f"{parse_dsn(dsn)['options']} {options}"
+    return {
+        "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT_S", 3)),
+        "options": options
+    }
+
+
+def is_database_failure(error: Exception) -> bool:
+    """Connection loss, refused connections and statement timeouts (QueryCanceledError)"""
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half_open (one probe) -> closed/open"""
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._changed_at = time.monotonic()
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, breaker=name)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        self._changed_at = time.monotonic()
+        CIRCUIT_STATE.set(self.STATE_VALUES[state], breaker=self.name)
+
+    def allow(self) -> bool:
+        """Whether this call may use the database"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Open long enough, or a probe that never reported back: let one call through
+            if time.monotonic() - self._changed_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+                return True
+            return False
+
+    def is_closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._transition(self.OPEN)
+
+    def release_probe(self):
+        """End a call that told us nothing about the database; a half-open breaker probes again"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._changed_at = time.monotonic() - self.reset_timeout
+
+
+class StaleResultCache:
+    """Last successful result per (tool, arguments), kept to answer during outages"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, tool: str, key: str, result: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(tool, key)] = (time.time(), result)
+            self._entries.move_to_end((tool, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, tool: str, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            return self._entries.get((tool, key))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_stale_results = StaleResultCache(int(os.getenv("DEGRADED_CACHE_SIZE", 256)))
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for a table, configured from CIRCUIT_* environment variables"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT_S", 30))
+            )
+        return _breakers[name]
+
+
+def call_with_breaker(
+    table: str,
+    tool: str,
+    key_parts: Dict[str, Any],
+    compute: Callable[[], Dict[str, Any]],
+    fallback: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+    unavailable: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Run `compute()` behind the table's breaker, degrading on database failures
+
+    Args:
+        table: Table (and breaker) the call depends on
+        tool: Tool name, for the stale cache and metrics
+        key_parts: Call arguments identifying the result
+        compute: Live call; database failures must propagate as exceptions
+        fallback: Builds a result without the database, or returns None
+        unavailable: Fields of the error result when nothing can be served
+    """
+    breaker = get_breaker(table)
+    key = json.dumps(key_parts, sort_keys=True, ensure_ascii=False)
+
+    if not breaker.allow():
+        return _degraded(tool, key, fallback, unavailable, f"circuit for {table} is open")
+    try:
+        result = compute()
+    except Exception as e:
+        if not is_database_failure(e):
+            breaker.release_probe()
+            raise
+        breaker.record_failure()
+        return _degraded(tool, key, fallback, unavailable, str(e).strip())
+
+    breaker.record_success()
+    if result.get("success"):
+        _stale_results.put(tool, key, result)
+    return result
+
+
+def _degraded(
+    tool: str,
+    key: str,
+    fallback: Optional[Callable[[], Optional[Dict[str, Any]]]],
+    unavailable: Optional[Dict[str, Any]],
+    reason: str
+) -> Dict[str, Any]:
+    flags = {"stale": True, "degraded": True, "degraded_reason": reason}
+
+    cached = _stale_results.get(tool, key)
+    if cached is not None:
+        stored_at, result = cached
+        DEGRADED_RESPONSES.inc(tool=tool, source="stale_cache")
+        return {**result, **flags, "degraded_source": "stale_cache", "stale_age_s": round(time.time() - stored_at, 1)}
+
+    if fallback is not None:
+        try:
+            result = fallback()
+        except Exception as e:
+            logger.warning("%s in-memory fallback failed: %s", tool, e)
+            result = None
+        if result is not None:
+            DEGRADED_RESPONSES.inc(tool=tool, source="in_memory_index")
+            return {**result, **flags, "degraded_source": "in_memory_index"}
+
+    DEGRADED_RESPONSES.inc(tool=tool, source="none")
+    return {**(unavailable or {}), "success": False, "degraded": True, "error": f"Database unavailable: {reason}"}
@@ -0,0 +1,236 @@
+"""Slow similarity-query capture with sampled EXPLAIN (ANALYZE, BUFFERS)
+
+Pipelines report each vector search's latency to `get_slow_query_log()`. A search
+slower than SLOW_QUERY_THRESHOLD_MS is, with probability SLOW_QUERY_SAMPLE_RATE,
+re-run under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). The re-run happens on a
+background thread with its own connection to the server that ran the search (the
+primary or a replica, through the pipeline's ReplicaRouter), so the slow request
+doesn't get slower and the plan is the one that server chose. The plan, parameters, planner settings and the indexes the plan used are
+kept in a bounded ring buffer, which custom_server.py serves at
+GET /debug/slow-queries.
+
+The usual culprit is a plan whose `indexes_used` doesn't include the vector
+index. That happens when the planner picks a sequential scan, either because the
+index is missing or because it expects a WHERE filter to be more selective.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from .metrics import SLOW_QUERIES
+from .replicas import PRIMARY, ReplicaRouter, get_replica_router
+
+logger = logging.getLogger(__name__)
+
+# Embedding literals ('[0.01,-0.2,...]') are replaced by their size in stored entries
+VECTOR_LITERAL = re.compile(r"\[-?[0-9][0-9eE.,+\- ]*\]")
+
+# Planner settings that change which vector index is used, and how
+SETTINGS_QUERY = """
+    SELECT current_setting('search_path'),
+           current_setting('hnsw.ef_search', true),
+           current_setting('ivfflat.probes', true)
+"""
+
+
+def _shorten(value: Any) -> Any:
+    if isinstance(value, str):
+        return VECTOR_LITERAL.sub(lambda m: f"[vector dim={m.group(0).count(',') + 1}]", value)
+    if isinstance(value, (list, tuple)):
+        return [_shorten(v) for v in value]
+    return value
+
+
+def _plan_summary(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Indexes and node types the plan used, plus its timing and buffer totals"""
+    indexes, nodes = [], []
+
+    def walk(node):
+        nodes.append(node.get("Node Type"))
+        if "Index Name" in node:
+            indexes.append(node["Index Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return {
+        "indexes_used": sorted(set(indexes)),
+        "node_types": nodes,
+        "explain_execution_ms": plan.get("Execution Time"),
+        "explain_planning_ms": plan.get("Planning Time"),
+        "shared_blocks_hit": plan["Plan"].get("Shared Hit Blocks"),
+        "shared_blocks_read": plan["Plan"].get("Shared Read Blocks")
+    }
+
+
+class SlowQueryLog:
+    """Ring buffer of sampled EXPLAIN ANALYZE captures for slow searches"""
+
+    def __init__(
+        self,
+        threshold_ms: float = 200.0,
+        sample_rate: float = 0.1,
+        capacity: int = 50,
+        explain_timeout_ms: int = 10000
+    ):
+        """
+        Args:
+            threshold_ms: Searches at or above this latency count as slow
+            sample_rate: Fraction of slow searches re-run under EXPLAIN ANALYZE
+                (0 only counts them in `*_slow_queries_total`)
+            capacity: Captures kept; the oldest is dropped first
+            explain_timeout_ms: statement_timeout for the EXPLAIN re-run
+        """
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.explain_timeout_ms = explain_timeout_ms
+        self._entries: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        # Captures waiting for the worker; more than a few queued means the
+        # database is already struggling, so further ones are dropped
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=4)
+        self._worker: Optional[threading.Thread] = None
+        # EXPLAIN connections per (router, server)
+        self._conns: Dict[Tuple[int, str], Any] = {}
+
+    def observe(
+        self,
+        conn,
+        label: str,
+        sql: str,
+        params: Optional[Dict[str, Any]],
+        elapsed_ms: float,
+        router: Optional[ReplicaRouter] = None,
+        target: str = PRIMARY
+    ):
+        """Record a finished search; slow ones may be queued for EXPLAIN
+
+        `router` and `target` name the server `conn` is on (as returned by
+        `connect_for_reads()`); the EXPLAIN runs there. Without a router, the
+        default one (DB_* primary) is used.
+        """
+        if elapsed_ms < self.threshold_ms:
+            return
+        SLOW_QUERIES.inc(query=label)
+        if random.random() >= self.sample_rate:
+            return
+
+        # Bind parameters and read the session's planner settings now, on the
+        # connection that ran the search (the pipeline closes it afterwards)
+        try:
+            with conn.cursor() as cur:
+                statement = cur.mogrify(sql, params).decode()
+                cur.execute(SETTINGS_QUERY)
+                search_path, ef_search, probes = cur.fetchone()
+        except psycopg2.Error as e:
+            logger.warning("slow query capture skipped: %s", e)
+            return
+
+        job = {
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "label": label,
+            "elapsed_ms": elapsed_ms,
+            "threshold_ms": self.threshold_ms,
+            "server": target,
+            "router": router or get_replica_router(),
+            "statement": statement,
+            "sql": _shorten(" ".join(sql.split())),
+            "params": {k: _shorten(v) for k, v in (params or {}).items()},
+            "settings": {"search_path": search_path, "hnsw.ef_search": ef_search, "ivfflat.probes": probes}
+        }
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            return
+        self._ensure_worker()
+
+    def entries(self, label: str = "", limit: int = 0, include_plan: bool = True) -> List[Dict[str, Any]]:
+        """Captures, newest first"""
+        with self._lock:
+            entries = list(reversed(self._entries))
+        if label:
+            entries = [e for e in entries if e["label"] == label]
+        if limit:
+            entries = entries[:limit]
+        if not include_plan:
+            entries = [{k: v for k, v in e.items() if k != "plan"} for e in entries]
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            entry = self._explain(self._queue.get())
+            with self._lock:
+                self._entries.append(entry)
+
+    def _connection(self, router: ReplicaRouter, target: str):
+        """Kept-open connection to the server the search ran on, in transaction mode"""
+        key = (id(router), target)
+        conn = self._conns.get(key)
+        if conn is None or conn.closed:
+            conn = router.connect_to(target)
+            # SET LOCAL and the rollback below need a transaction
+            conn.autocommit = False
+            self._conns[key] = conn
+        return conn
+
+    def _explain(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Re-run the bound statement under the original settings, in a rolled-back transaction"""
+        statement = job.pop("statement")
+        router = job.pop("router")
+        settings = {k: v for k, v in job["settings"].items() if v is not None}
+        try:
+            conn = self._connection(router, job["server"])
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET LOCAL statement_timeout = %s", (int(self.explain_timeout_ms),))
+                    for name, value in settings.items():
+                        cur.execute("SELECT set_config(%s, %s, true)", (name, value))
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement)
+                    plan = cur.fetchone()[0]
+            finally:
+                conn.rollback()
+        except (psycopg2.Error, ValueError) as e:
+            logger.warning("EXPLAIN ANALYZE for %s on %s failed: %s", job["label"], job["server"], e)
+            return {**job, "error": str(e).strip()}
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        plan = plan[0]
+        return {**job, **_plan_summary(plan), "plan": plan}
+
+
+_slow_query_log: Optional[SlowQueryLog] = None
+_slow_query_log_lock = threading.Lock()
+
+
+def get_slow_query_log() -> SlowQueryLog:
+    """Process-wide log configured from SLOW_QUERY_* environment variables"""
+    global _slow_query_log
+    with _slow_query_log_lock:
+        if _slow_query_log is None:
+            _slow_query_log = SlowQueryLog(
+                threshold_ms=float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200)),
+                sample_rate=float(os.getenv("SLOW_QUERY_SAMPLE_RATE", 0.1)),
+                capacity=int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 50)),
+                explain_timeout_ms=int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 10000))
+            )
+        return _slow_query_log
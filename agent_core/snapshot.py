@@ -0,0 +1,246 @@
+"""Memory-mapped embedding snapshots shared across worker processes
+
+A snapshot is one versioned file holding a table's ids, its embeddings as an
+aligned float32 matrix and (optionally) precomputed L2 norms:
+
+    [4 KiB header: magic + JSON metadata][int64 ids][float32 matrix][float32 norms]
+
+Sections start on page boundaries, so every worker that `np.memmap`s the same
+file read-only shares the pages through the OS page cache instead of holding
+a private copy. A small `<table>.current` pointer file names the live version;
+the exporter swaps it with `os.replace`, and readers pick up the new version on
+their next search without restarting.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"EMBSNAP1"
+PAGE_SIZE = 4096
+KEEP_VERSIONS = 2
+
+
+def _align(offset: int) -> int:
+    return (offset + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
+
+
+def _pointer_path(directory: str, table: str) -> str:
+    return os.path.join(directory, f"{table}.current")
+
+
+def _snapshot_versions(directory: str, table: str) -> List[Tuple[int, str]]:
+    """Existing (version, filename) pairs for a table, oldest first"""
+    versions = []
+    prefix = f"{table}-v"
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(".snap"):
+            try:
+                versions.append((int(name[len(prefix):-len(".snap")]), name))
+            except ValueError:
+                continue
+    return sorted(versions)
+
+
+def write_snapshot(
+    directory: str,
+    table: str,
+    ids: np.ndarray,
+    embeddings: np.ndarray,
+    with_norms: bool = True,
+    metadata: Optional[Dict[str, Any]] = None
+) -> str:
+    """Write a new snapshot version and atomically make it current
+
+    Args:
+        metadata: Extra header fields, e.g. the embedding column and model
+
+    Returns:
+        Path of the snapshot file that is now live
+    """
+    os.makedirs(directory, exist_ok=True)
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    count, dim = embeddings.shape if embeddings.size else (len(ids), 0)
+    if len(ids) != count:
+        raise ValueError(f"Row mismatch: {len(ids)} ids vs {count} embeddings")
+
+    existing = _snapshot_versions(directory, table)
+    version = existing[-1][0] + 1 if existing else 1
+
+    ids_offset = PAGE_SIZE
+    matrix_offset = _align(ids_offset + ids.nbytes)
+    norms_offset = _align(matrix_offset + embeddings.nbytes) if with_norms else None
+    header = {
+        "table": table,
+        "version": version,
+        "count": int(count),
+        "dim": int(dim),
+        "ids_offset": ids_offset,
+        "matrix_offset": matrix_offset,
+        "norms_offset": norms_offset,
+        "created_at": time.time(),
+        **(metadata or {}),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    if len(MAGIC) + 4 + len(header_bytes) > PAGE_SIZE:
+        raise ValueError("Snapshot header does not fit in one page")
+
+    filename = f"{table}-v{version:06d}.snap"
+    final_path = os.path.join(directory, filename)
+    tmp_path = final_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(4, "little") + header_bytes)
+        f.seek(ids_offset)
+        f.write(ids.tobytes())
+        f.seek(matrix_offset)
+        f.write(embeddings.tobytes())
+        if with_norms:
+            f.seek(norms_offset)
+            f.write(np.linalg.norm(embeddings, axis=1).astype(np.float32).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
+    # Swap the pointer; readers see either the old or the new name, never a partial one
+    pointer = _pointer_path(directory, table)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(filename)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)
+
+    # Old versions can be unlinked safely: workers still mapping them keep their pages
+    for _, old_name in existing[:-(KEEP_VERSIONS - 1) or None]:
+        try:
+            os.remove(os.path.join(directory, old_name))
+        except OSError:
+            pass
+
+    return final_path
+
+
+def export_table_snapshot(
+    conn,
+    table: str,
+    directory: str,
+    with_norms: bool = True,
+    column: str = "embedding",
+    model_name: str = "all-MiniLM-L6-v2"
+) -> str:
+    """Dump `id, <column>` of a table into a new snapshot version
+
+    The column and model are recorded in the header. Searches only use a
+    snapshot that matches their active embedding version
+    (embedding_versions.py).
+    """
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, {column}::text FROM {table} WHERE {column} IS NOT NULL ORDER BY id")
+    rows = cur.fetchall()
+    cur.close()
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    if rows:
+        embeddings = np.array([json.loads(row[1]) for row in rows], dtype=np.float32)
+    else:
+        embeddings = np.zeros((0, 0), dtype=np.float32)
+    return write_snapshot(
+        directory, table, ids, embeddings, with_norms, metadata={"column": column, "model": model_name}
+    )
+
+
+class EmbeddingSnapshot:
+    """A read-only memory-mapped snapshot version"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            prefix = f.read(len(MAGIC) + 4)
+            if prefix[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not an embedding snapshot: {path}")
+            header_len = int.from_bytes(prefix[len(MAGIC):], "little")
+            self.header: Dict[str, Any] = json.loads(f.read(header_len))
+
+        self.path = path
+        self.version = self.header["version"]
+        count, dim = self.header["count"], self.header["dim"]
+        if count == 0:
+            # np.memmap refuses zero-length maps
+            self.ids = np.empty(0, dtype=np.int64)
+            self.matrix = np.empty((0, dim), dtype=np.float32)
+            self.norms = np.empty(0, dtype=np.float32)
+            return
+        self.ids = np.memmap(path, dtype=np.int64, mode="r", offset=self.header["ids_offset"], shape=(count,))
+        self.matrix = np.memmap(path, dtype=np.float32, mode="r", offset=self.header["matrix_offset"], shape=(count, dim))
+        if self.header["norms_offset"] is not None:
+            self.norms = np.memmap(path, dtype=np.float32, mode="r", offset=self.header["norms_offset"], shape=(count,))
+        else:
+            # Private copy, but only 4 bytes per row
+            self.norms = np.linalg.norm(self.matrix, axis=1)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Exact cosine top-k over the mapped matrix, as (id, similarity) pairs"""
+        if len(self) == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.matrix @ query
+        scores /= np.maximum(self.norms * np.linalg.norm(query), 1e-12)
+
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+    def vectors(self, ids: List[int]) -> np.ndarray:
+        """Copy the embeddings of the given ids (ids are stored sorted)"""
+        return np.array(self.matrix[np.searchsorted(self.ids, ids)])
+
+
+class SnapshotStore:
+    """Tracks the current snapshot of one table and remaps when the pointer changes"""
+
+    def __init__(self, directory: str, table: str, check_interval: float = 1.0):
+        self.directory = directory
+        self.table = table
+        self.check_interval = check_interval
+        self._snapshot: Optional[EmbeddingSnapshot] = None
+        self._pointer_stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[EmbeddingSnapshot]:
+        """The live snapshot, or None if none has been exported yet"""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            self._checked_at = now
+            pointer = _pointer_path(self.directory, self.table)
+            try:
+                stat = os.stat(pointer)
+            except FileNotFoundError:
+                return self._snapshot
+            signature = (stat.st_ino, stat.st_mtime_ns)
+            if signature != self._pointer_stat:
+                with open(pointer) as f:
+                    filename = f.read().strip()
+                self._snapshot = EmbeddingSnapshot(os.path.join(self.directory, filename))
+                self._pointer_stat = signature
+        return self._snapshot
+
+
+_stores: Dict[Tuple[str, str], SnapshotStore] = {}
+
+
+def get_snapshot_store(directory: str, table: str) -> SnapshotStore:
+    """Process-wide store per (directory, table), so the mapping outlives pipelines"""
+    key = (os.path.abspath(directory), table)
+    if key not in _stores:
+        _stores[key] = SnapshotStore(*key)
+    return _stores[key]
@@ -0,0 +1,79 @@
+"""Deterministic offline stand-in for Gemini, for load tests
+
+With ADK_STUB_LLM=1 the agents run on `StubLlm` instead of calling Gemini. Its
+behavior is fixed: the first turn calls the agent's first tool with the user's
+text as `query`, and the turn after the tool result answers with a short summary
+of it. Tools, sessions and the HTTP layer all run for real, so load tests
+(scripts/12_load_harness.py) measure everything except the model. Each response
+records its own time in `custom_metadata["stub_llm_ms"]`.
+
+ADK_STUB_LLM_LATENCY_MS adds a fixed sleep per model call to mimic Gemini.
+"""
+import asyncio
+import os
+import time
+from typing import AsyncGenerator, Union
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+
+class StubLlm(BaseLlm):
+    """Calls the first tool with the user's text, then answers from its result"""
+
+    model: str = "stub-llm"
+    latency_ms: float = 0.0
+    stream_chunk_words: int = 4
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        start = time.perf_counter()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        parts = (llm_request.contents[-1].parts or []) if llm_request.contents else []
+        tool_results = [p.function_response for p in parts if p.function_response]
+        tool_name = next(iter(llm_request.tools_dict), None)
+
+        if tool_results or tool_name is None:
+            text = self._answer(tool_results)
+            if stream:
+                words = text.split(" ")
+                for i in range(0, len(words), self.stream_chunk_words):
+                    chunk = " ".join(words[i:i + self.stream_chunk_words]) + " "
+                    yield LlmResponse(
+                        content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                        partial=True
+                    )
+            content = types.Content(role="model", parts=[types.Part(text=text)])
+        else:
+            query = " ".join(p.text for p in parts if p.text).strip()
+            content = types.Content(role="model", parts=[
+                types.Part(function_call=types.FunctionCall(name=tool_name, args={"query": query}))
+            ])
+
+        yield LlmResponse(
+            content=content,
+            custom_metadata={"stub_llm_ms": (time.perf_counter() - start) * 1000}
+        )
+
+    @staticmethod
+    def _answer(tool_results) -> str:
+        if not tool_results:
+            return "Stub answer: no tool was called."
+        summaries = []
+        for result in tool_results:
+            response = result.response or {}
+            count = response.get("num_results", len(response.get("retrieved_documents") or response.get("retrieved_menus") or []))
+            summaries.append(f"{result.name} returned {count} results (success={response.get('success')})")
+        return "Stub answer: " + "; ".join(summaries) + "."
+
+
+def resolve_model(default: str) -> Union[str, BaseLlm]:
+    """`default`, or a StubLlm when ADK_STUB_LLM is set"""
+    if os.getenv("ADK_STUB_LLM", "false").lower() in ("1", "true", "yes"):
+        return StubLlm(latency_ms=float(os.getenv("ADK_STUB_LLM_LATENCY_MS", 0)))
+    return default
@@ -87,6 +87,172 @@ import uvicorn
 # Get the FastAPI app from ADK
 app = get_fast_api_app(agents_dir=str(project_root), web=False)
 
+# ============================================================================
+# STREAMING RAG ENDPOINT (SSE)
+# ============================================================================
+# ADK agents already stream via POST /run_sse with "streaming": true.
+# This route streams the plain RAGPipelineMVP answer token by token.
+
+import json
+import logging
+import threading
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger("custom_server")
+
+sys.path.insert(0, str(project_root / "first-agent"))
+
+_rag_pipeline = None
+_rag_pipeline_lock = threading.Lock()
+
+
+def get_rag_pipeline():
+    """Lazily create one shared RAGPipelineMVP (model load + connection pool)
+
+    Requests run concurrently in the threadpool; each search borrows its own
+    connection from a pool of STREAM_RAG_POOL_SIZE (default 4).
+    """
+    global _rag_pipeline
+    with _rag_pipeline_lock:
+        if _rag_pipeline is None:
+            from retrieval_generation import RAGPipelineMVP
+            _rag_pipeline = RAGPipelineMVP(pool_size=int(os.getenv("STREAM_RAG_POOL_SIZE", 4)))
+        return _rag_pipeline
+
+
+@app.get("/stream/rag", tags=["streaming"])
+def stream_rag(question: str, top_k: int = 3):
+    """Server-Sent Events: `retrieval`, then `token` chunks, then `done` with ttft_ms"""
+    def events():
+        try:
+            for event in get_rag_pipeline().query_stream(question, top_k=top_k):
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=float)}\n\n"
+        except Exception as e:
+            logger.exception("/stream/rag failed")
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    # Sync generators are iterated in the threadpool, so the event loop stays free
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============================================================================
+# FOOD TAG FACETS
+# ============================================================================
+# Counts come from the trigger-maintained food_menu_tag_counts table
+# (scripts/9_tag_index.py), not a scan of food_menu.
+
+@app.get("/food/tags", tags=["food"])
+def food_tags(prefix: str = "", min_count: int = 1, limit: int = 100):
+    """Menu count per cocok_untuk tag, most common first"""
+    from food_analyst_agent_adk.core.tag_facets import get_tag_facets
+    return get_tag_facets(prefix=prefix, min_count=min_count, limit=limit)
+
+# ============================================================================
+# PROMETHEUS METRICS
+# ============================================================================
+# Per-stage latency histograms (LLM calls included), result/error counters,
+# cache hit/miss counters and connection/pool gauges from agent_core/metrics.py.
+# Every agent in the process records into its one REGISTRY.
+
+from fastapi.responses import PlainTextResponse
+
+
+@app.get("/metrics", tags=["observability"], response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of the agent metrics"""
+    from agent_core.metrics import REGISTRY
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ============================================================================
+# SLOW QUERY CAPTURES
+# ============================================================================
+# Sampled EXPLAIN (ANALYZE, BUFFERS) plans of searches slower than
+# SLOW_QUERY_THRESHOLD_MS (agent_core/slow_queries.py), newest first.
+
+@app.get("/debug/slow-queries", tags=["observability"])
+def slow_queries(label: str = "", limit: int = 20, include_plan: bool = True):
+    """Captured slow searches with plan, parameters, settings and indexes used"""
+    from agent_core.slow_queries import get_slow_query_log
+    log = get_slow_query_log()
+    return {
+        "threshold_ms": log.threshold_ms,
+        "sample_rate": log.sample_rate,
+        "entries": log.entries(label=label, limit=limit, include_plan=include_plan)
+    }
+
+
+@app.get("/debug/replicas", tags=["observability"])
+def replicas():
+    """Read routing: each replica's health, replay lag and check latency"""
+    from agent_core.replicas import get_replica_router
+    return get_replica_router().status()
+
+
+@app.get("/debug/embedding-versions", tags=["observability"])
+def embedding_versions():
+    """Active and candidate embedding version per table, and dual-read overlap"""
+    from agent_core.embedding_versions import SOURCE_COLUMNS, get_embedding_versions, shadow_stats
+    from agent_core.replicas import get_replica_router
+    conn, _ = get_replica_router().connect_for_reads()
+    try:
+        cache = get_embedding_versions()
+        tables = {}
+        for table in SOURCE_COLUMNS:
+            candidate = cache.candidate(table, conn)
+            tables[table] = {
+                "active": vars(cache.active(table, conn)),
+                "candidate": vars(candidate) if candidate else None
+            }
+    finally:
+        conn.close()
+    return {"tables": tables, "shadow_overlap": shadow_stats()}
+
+# ============================================================================
+# SAMPLING PROFILER (ADMIN)
+# ============================================================================
+# Off unless PROFILER_ENABLED is set; the route then samples every server thread
+# for `seconds` and returns collapsed stacks (flamegraph.pl / speedscope input):
+#   curl "localhost:8000/admin/profile?seconds=30" > server.folded
+#   flamegraph.pl server.folded > server.svg
+# Idle cost is zero: the sampler thread only exists during a profile.
+
+import asyncio
+from fastapi import HTTPException
+
+_profile_lock = asyncio.Lock()
+
+
+@app.get("/admin/profile", tags=["admin"])
+async def profile(seconds: float = 10.0, interval_ms: float = 10.0, format: str = "collapsed"):
+    """Sample all threads for `seconds`; format is collapsed (text) or json"""
+    if os.getenv("PROFILER_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        raise HTTPException(status_code=404, detail="Profiler disabled (set PROFILER_ENABLED=1)")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    max_seconds = float(os.getenv("PROFILER_MAX_SECONDS", 60))
+    if not 0 < seconds <= max_seconds or not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {max_seconds}], interval_ms in [1, 1000]")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    from profiler import SamplingProfiler
+
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval_ms=interval_ms)
+        profiler.start()
+        try:
+            # Sleep on the event loop so the profiled requests keep being served
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+
+    if format == "json":
+        return {**profiler.summary(), "top_functions": profiler.top_functions(), "stacks": dict(profiler.stacks)}
+    return PlainTextResponse(profiler.collapsed())
+
 if __name__ == "__main__":
     uvicorn.run(
         app,
@@ -0,0 +1,245 @@
+# batch_qa.py
+"""
+Concurrent batch QA runner for RAGPipelineMVP
+- Reads questions from JSONL ({"id": ..., "question": ...}; id defaults to line number)
+- Retrieves in batches (one encode call + one SQL round trip per batch)
+- Generates with bounded concurrency behind a token-bucket rate limiter
+- Appends answers + per-stage timings to JSONL as they finish
+- Resumable: questions already answered in the output file are skipped; on
+  start, a partial last line is cut and records superseded by a later one
+  for the same id are dropped, so each id has one record (its latest)
+
+Run with:
+    python batch_qa.py questions.jsonl answers.jsonl --concurrency 4 --rate 2
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from retrieval_generation import RAGPipelineMVP
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests/second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a token is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def load_questions(path: str) -> list[dict]:
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            questions.append({"id": record.get("id", line_no), "question": record["question"]})
+    return questions
+
+
+def repair_output(path: str):
+    """Make an existing output file safe to append to and free of duplicate ids
+
+    An interrupted run can leave a partial last line; it is cut at the last
+    newline, so the next record doesn't get glued onto it. Earlier records of
+    an id that was written again (a failure, then its retry) are dropped.
+    """
+    try:
+        f = open(path, 'rb+')
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+    latest, lines = {}, []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                latest[json.loads(line)["id"]] = len(lines)
+            except (json.JSONDecodeError, KeyError):
+                pass
+            lines.append(line)
+    keep = set(latest.values())
+    if len(keep) == len(lines):
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(line for i, line in enumerate(lines) if i in keep)
+    os.replace(tmp_path, path)
+
+
+def load_completed(path: str) -> set:
+    """Ids whose latest record in an existing output file is a successful answer"""
+    succeeded = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partial last line from an interrupted run
+                succeeded[record["id"]] = "error" not in record
+    except FileNotFoundError:
+        pass
+    return {id_ for id_, ok in succeeded.items() if ok}
+
+
+class BatchQARunner:
+    """Runs a question set through retrieve + generate and streams results to JSONL"""
+
+    def __init__(
+        self,
+        rag: RAGPipelineMVP,
+        batch_size: int = 32,
+        concurrency: int = 4,
+        rate: float = 2.0,
+        burst: float = 4.0,
+        top_k: int = 3,
+        retries: int = 2
+    ):
+        self.rag = rag
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.top_k = top_k
+        self.retries = retries
+        self.write_lock = threading.Lock()
+
+    def _generate(self, question: str, context: str) -> tuple[str, dict]:
+        """Rate-limited generation with exponential backoff on errors"""
+        wait_s, attempt = 0.0, 0
+        while True:
+            wait_s += self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                answer = self.rag.generate_answer(question, context)
+                return answer, {
+                    "rate_wait_ms": wait_s * 1000,
+                    "generate_ms": (time.perf_counter() - start) * 1000,
+                    "attempts": attempt + 1
+                }
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                backoff = 2 ** attempt
+                time.sleep(backoff)
+                wait_s += backoff
+                attempt += 1
+
+    def _answer(self, item: dict, docs: list[dict], retrieval_timings: dict, out) -> bool:
+        record = {
+            "id": item["id"],
+            "question": item["question"],
+            "retrieved_documents": [
+                {"title": doc["title"], "similarity": float(doc["similarity"])}
+                for doc in docs
+            ],
+        }
+        try:
+            answer, timings = self._generate(item["question"], self.rag.build_context(docs))
+            record["answer"] = answer
+            record["timings"] = {**retrieval_timings, **timings}
+        except Exception as e:
+            record["error"] = str(e)
+            record["timings"] = retrieval_timings
+
+        with self.write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        return "error" not in record
+
+    def run(self, input_path: str, output_path: str) -> dict:
+        questions = load_questions(input_path)
+        repair_output(output_path)
+        completed = load_completed(output_path)
+        pending = [q for q in questions if q["id"] not in completed]
+        print(f"📥 {len(questions)} questions, {len(completed)} already answered, {len(pending)} to go")
+
+        stats = {"answered": 0, "failed": 0}
+        start = time.perf_counter()
+        with open(output_path, 'a', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for offset in range(0, len(pending), self.batch_size):
+                batch = pending[offset:offset + self.batch_size]
+                results = self.rag.retrieve_batch([q["question"] for q in batch], top_k=self.top_k)
+
+                # Batch retrieval cost amortized per question
+                retrieval_timings = {
+                    stage: ms / len(batch) for stage, ms in self.rag.last_timings.items()
+                }
+                futures = [
+                    pool.submit(self._answer, item, docs, retrieval_timings, out)
+                    for item, docs in zip(batch, results)
+                ]
+                # Finish this batch before retrieving the next, so memory stays bounded
+                for future in as_completed(futures):
+                    stats["answered" if future.result() else "failed"] += 1
+
+                done = offset + len(batch)
+                rate = done / (time.perf_counter() - start)
+                print(f"  ✓ {done}/{len(pending)} ({rate:.2f} q/s, {stats['failed']} failed)")
+
+        stats["elapsed_s"] = time.perf_counter() - start
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch QA over RAGPipelineMVP")
+    parser.add_argument("input", help="Questions JSONL")
+    parser.add_argument("output", help="Answers JSONL (appended; reruns resume and retry failures)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Questions retrieved per round trip")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel generation calls")
+    parser.add_argument("--rate", type=float, default=2.0, help="Generation requests per second")
+    parser.add_argument("--burst", type=float, default=4.0, help="Token bucket capacity")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed generation")
+    args = parser.parse_args()
+
+    rag = RAGPipelineMVP()
+    runner = BatchQARunner(
+        rag,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        burst=args.burst,
+        top_k=args.top_k,
+        retries=args.retries
+    )
+    stats = runner.run(args.input, args.output)
+    rag.close()
+
+    print(f"\n✅ Answered {stats['answered']}, failed {stats['failed']} in {stats['elapsed_s']:.1f}s")
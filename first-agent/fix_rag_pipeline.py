@@ -8,12 +8,17 @@ FIXED RAG Pipeline with Data Loading
 """
 
 import os
+import sys
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import google.generativeai as genai
 import json
+from response_cache import cache_from_env, temperature_from_env
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agent_core.encode_scheduler import BATCH, get_encode_scheduler
 
 load_dotenv()
 
@@ -21,7 +26,7 @@ load_dotenv()
 class FixedRAGPipeline:
     """Complete RAG pipeline with data loading"""
     
-    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2"):
+    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2", response_cache=None, temperature=None):
         """Initialize RAG components"""
         
         print("🚀 Initializing RAG Pipeline...")
@@ -39,6 +44,16 @@ class FixedRAGPipeline:
             raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY not set in .env")
         genai.configure(api_key=api_key)
         print(f"    Using model: gemini-2.5-flash-lite")
+        self.temperature = temperature if temperature is not None else temperature_from_env()
+        self.max_output_tokens = 300
+        # text-bison first, gemini when text-bison raises; cached answers are
+        # keyed on the model that produced them
+        self.answer_models = ('models/text-bison-001', 'gemini-2.5-flash-lite')
+
+        # Optional on-disk response cache (LLM_CACHE_PATH)
+        self.response_cache = response_cache or cache_from_env()
+        if self.response_cache:
+            print(f"  ✓ Response cache: {self.response_cache.path}")
         
         # 3. Connect to PostgreSQL
         print("  ✓ Connecting to PostgreSQL...")
@@ -112,6 +127,11 @@ class FixedRAGPipeline:
                         ADD CONSTRAINT documents_title_key UNIQUE (title);
                     """)
                     print("    ✓ UNIQUE constraint added")
+                # Partition key for scripts/13_partition_documents.py (--by collection)
+                cur.execute("""
+                    ALTER TABLE documents
+                    ADD COLUMN IF NOT EXISTS collection TEXT NOT NULL DEFAULT 'default';
+                """)
             else:
                 # Create new documents table
                 print("    Creating documents table...")
@@ -121,6 +141,7 @@ class FixedRAGPipeline:
                         title TEXT NOT NULL UNIQUE,
                         content TEXT NOT NULL,
                         embedding vector({self.embedding_dim}),
+                        collection TEXT NOT NULL DEFAULT 'default',
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     );
                 """)
@@ -144,7 +165,8 @@ class FixedRAGPipeline:
         """Load documents with embeddings into database
         
         Args:
-            documents: List of dicts with 'title' and 'content' keys
+            documents: List of dicts with 'title' and 'content' keys,
+                and optionally 'collection'
         
         Returns:
             Number of documents loaded
@@ -160,7 +182,7 @@ class FixedRAGPipeline:
                 content = doc['content']
                 
                 # Generate embedding
-                embedding = self.embedding_model.encode(content)
+                embedding = get_encode_scheduler().encode(self.embedding_model, content, priority=BATCH)
                 embedding_list = embedding.tolist()
                 
                 # Convert to pgvector format
@@ -168,10 +190,10 @@ class FixedRAGPipeline:
                 
                 # Insert into database
                 cur.execute("""
-                    INSERT INTO documents (title, content, embedding)
-                    VALUES (%s, %s, %s::vector)
+                    INSERT INTO documents (title, content, embedding, collection)
+                    VALUES (%s, %s, %s::vector, %s)
                     ON CONFLICT (title) DO NOTHING;
-                """, (title, content, embedding_str))
+                """, (title, content, embedding_str, doc.get('collection', 'default')))
                 
                 loaded_count += 1
                 
@@ -192,7 +214,7 @@ class FixedRAGPipeline:
         """Find most similar documents to query"""
         
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(query)
+        query_embedding = get_encode_scheduler().encode(self.embedding_model, query)
         embedding_str = "[" + ",".join([str(x) for x in query_embedding]) + "]"
         
         cur = self.conn.cursor(cursor_factory=RealDictCursor)
@@ -231,23 +253,39 @@ Question: {query}
 
 Answer:"""
         
+        if self.response_cache is None:
+            answer = self._generate(prompt)[1]
+        else:
+            primary, *fallbacks = self.answer_models
+            answer = self.response_cache.get_or_generate(
+                primary, prompt, self.temperature, self.max_output_tokens,
+                lambda: self._generate(prompt), fallback_models=fallbacks
+            )
+        return answer or "Unable to generate answer"
+
+    def _generate(self, prompt: str):
+        """Call Gemini; returns (model that answered, text), text None on failure so errors aren't cached"""
+        text_model, chat_model = self.answer_models
         try:
             response = genai.generate_text(
                 prompt=prompt,
-                temperature=0.7,
-                max_output_tokens=300,
-                model='models/text-bison-001'  # Use text-bison for text generation
+                temperature=self.temperature,
+                max_output_tokens=self.max_output_tokens,
+                model=text_model  # Use text-bison for text generation
             )
-            return response.result if response.result else "Unable to generate answer"
-        except Exception as e:
+            return text_model, response.result
+        except Exception:
             # Fallback to chat API if text-bison fails
             try:
-                model = genai.GenerativeModel('gemini-2.5-flash-lite')
-                response = model.generate_content(prompt)
-                return response.text
+                model = genai.GenerativeModel(chat_model)
+                response = model.generate_content(prompt, generation_config={
+                    "temperature": self.temperature,
+                    "max_output_tokens": self.max_output_tokens
+                })
+                return chat_model, response.text
             except Exception as e2:
                 print(f"Error generating answer: {e2}")
-                return "Unable to generate answer"
+                return chat_model, None
     
     def query(self, question: str, top_k: int = 3) -> dict:
         """Complete RAG pipeline"""
@@ -3,9 +3,13 @@ from sentence_transformers import SentenceTransformer
 import psycopg2
 from psycopg2.extras import execute_values
 import os
+import sys
 from dotenv import load_dotenv
 from data_loader import SimpleDocumentLoader
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agent_core.encode_scheduler import BATCH, get_encode_scheduler
+
 load_dotenv()
 
 class EmbeddingManager:
@@ -18,8 +22,8 @@ class EmbeddingManager:
         print(f"✓ Loaded model: {model_name} (dim: {self.embedding_dim})")
     
     def generate_embeddings(self, texts: list[str]) -> list:
-        """Generate embeddings for multiple texts"""
-        return self.model.encode(texts, convert_to_numpy=True, device="cpu")
+        """Generate embeddings for multiple texts (batch priority: capped to its share of the cores)"""
+        return get_encode_scheduler().encode(self.model, texts, priority=BATCH, convert_to_numpy=True, device="cpu")
 
 class DatabaseManager:
     """Manage database operations"""
@@ -48,6 +52,15 @@ class DatabaseManager:
         VALUES %s
         """
         
+        # The collection column (added by initialize_database.py) is only
+        # written when the documents carry one
+        if any("collection" in doc for doc in documents):
+            data = [row + (doc.get("collection", "default"),) for row, doc in zip(data, documents)]
+            insert_query = """
+            INSERT INTO documents (title, content, embedding, collection) 
+            VALUES %s
+            """
+        
         execute_values(cur, insert_query, data)
         self.conn.commit()
         
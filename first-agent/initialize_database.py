@@ -33,6 +33,7 @@ def setup_database():
         title TEXT,
         content TEXT,
         embedding vector(384),
+        collection TEXT NOT NULL DEFAULT 'default',
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     """
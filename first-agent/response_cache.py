@@ -0,0 +1,151 @@
+# response_cache.py
+"""
+Disk-backed cache for LLM responses
+- Keyed by sha256 of (model, prompt, temperature, max_output_tokens)
+- Stored in a local SQLite file, evicted least-recently-used by total size
+- Skips non-zero temperatures unless explicitly allowed (sampled answers vary);
+  the pipelines read their temperature from LLM_TEMPERATURE, so set it to 0 to
+  make answers cacheable
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Sequence
+
+
+class ResponseCache:
+    """Persistent LRU cache of generated answers"""
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, cache_nonzero_temperature: bool = False):
+        """
+        Args:
+            path: SQLite file to store responses in (created if missing)
+            max_bytes: Total response size kept before LRU eviction
+            cache_nonzero_temperature: Also cache sampled (temperature > 0) responses
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float, max_output_tokens: int) -> str:
+        payload = json.dumps([model, prompt, float(temperature), int(max_output_tokens)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def enabled_for(self, temperature: float) -> bool:
+        return temperature == 0 or self.cache_nonzero_temperature
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop least-recently-used rows until the total size fits"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def get_or_generate(
+        self,
+        model: str,
+        prompt: str,
+        temperature: float,
+        max_output_tokens: int,
+        generate: Callable[[], Any],
+        fallback_models: Sequence[str] = ()
+    ) -> Optional[str]:
+        """Return a cached response or call `generate()` and store its result
+
+        `generate` should return None for failures so they aren't cached; empty
+        responses aren't cached either. With `fallback_models`, `generate` tries
+        `model` then the fallbacks itself and returns (model that answered,
+        response): an answer cached for any of them is served, and a new one is
+        stored under the model that produced it.
+        """
+        if fallback_models:
+            answer = generate
+        else:
+            def answer():
+                return model, generate()
+
+        if not self.enabled_for(temperature):
+            return answer()[1]
+
+        for candidate in (model, *fallback_models):
+            cached = self.get(self.make_key(candidate, prompt, temperature, max_output_tokens))
+            if cached is not None:
+                return cached
+
+        answered_by, response = answer()
+        if response:
+            self.put(self.make_key(answered_by, prompt, temperature, max_output_tokens), response)
+        return response
+
+    def close(self):
+        self.conn.close()
+
+
+def temperature_from_env() -> float:
+    """Generation temperature from LLM_TEMPERATURE (default 0.7; 0 makes answers cacheable)"""
+    return float(os.getenv("LLM_TEMPERATURE", 0.7))
+
+
+def cache_from_env() -> Optional[ResponseCache]:
+    """Build the cache from LLM_CACHE_* settings; None when LLM_CACHE_PATH is unset"""
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+    return ResponseCache(
+        path,
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", 64)) * 1024 * 1024),
+        cache_nonzero_temperature=os.getenv("LLM_CACHE_NONZERO_TEMPERATURE", "false").lower() in ("1", "true", "yes")
+    )
@@ -2,70 +2,154 @@
 from sentence_transformers import SentenceTransformer
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+import logging
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
+from response_cache import cache_from_env, temperature_from_env
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agent_core.encode_scheduler import BATCH, get_encode_scheduler
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class RAGPipelineMVP:
-    """Minimal RAG pipeline"""
+    """Minimal RAG pipeline
+
+    Database reads borrow a connection from a pool of `pool_size`, so one
+    pipeline (one embedding model, one client) can serve concurrent requests.
+    """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", client=None, response_cache=None, temperature=None,
+                 pool_size: int = 1):
         # Initialize components (force CPU usage due to CUDA compatibility)
         self.embedding_model = SentenceTransformer(model_name, device='cpu')
 
-        # Initialize Google GenAI client
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        # Initialize Google GenAI client (injectable, e.g. a stub in tests)
+        self.client = client or genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+
+        # Generation settings
+        self.generation_model = 'gemini-2.5-flash-lite'
+        self.temperature = temperature if temperature is not None else temperature_from_env()
+        self.max_output_tokens = 300
+
+        # Optional on-disk response cache (LLM_CACHE_PATH)
+        self.response_cache = response_cache or cache_from_env()
+
+        # Per-stage latency (ms) of the last batch retrieval
+        self.last_timings = {}
 
-        # Database connection
-        self.conn = psycopg2.connect(
+        # Database connections; a caller waits for a free one instead of sharing it
+        self.pool = ThreadedConnectionPool(
+            1, pool_size,
             host=os.getenv("DB_HOST"),
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASSWORD"),
             database=os.getenv("DB_NAME"),
             port=int(os.getenv("DB_PORT", 5432))
         )
-        # Set autocommit for consistent query behavior
-        self.conn.autocommit = True
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    @contextmanager
+    def _cursor(self):
+        """RealDictCursor on a pooled autocommit connection; broken connections are discarded"""
+        with self._slots:
+            conn = self.pool.getconn()
+            broken = False
+            try:
+                # Set autocommit for consistent query behavior
+                conn.autocommit = True
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    yield cur
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                self.pool.putconn(conn, close=broken or bool(conn.closed))
     
     def retrieve_similar_documents(self, query: str, top_k: int = 3) -> list[dict]:
         """Find most similar documents to the query"""
 
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(query)
+        query_embedding = get_encode_scheduler().encode(self.embedding_model, query)
 
         # Convert to string format for pgvector
         embedding_str = "[" + ",".join([str(x) for x in query_embedding]) + "]"
 
-        # Debug output
-        print(f"  [DEBUG] Embedding string length: {len(embedding_str)}")
+        logger.debug("Embedding string length: %d", len(embedding_str))
 
         # Similarity search in PostgreSQL
         # Note: Using f-string for embedding because %s::vector doesn't work with psycopg2
-        cur = self.conn.cursor(cursor_factory=RealDictCursor)
+        with self._cursor() as cur:
+            if logger.isEnabledFor(logging.DEBUG):
+                # Verify we can see the documents at all (an extra round trip, debug only)
+                cur.execute("SELECT COUNT(*) as count FROM documents")
+                logger.debug("Document count: %d", cur.fetchone()['count'])
+
+            # Try the one-line format that worked in standalone test
+            search_query = f"SELECT id, title, content, 1 - (embedding <=> '{embedding_str}'::vector) as similarity FROM documents ORDER BY embedding <=> '{embedding_str}'::vector LIMIT {top_k}"
+
+            cur.execute(search_query)
+            results = cur.fetchall()
+        logger.debug("Query returned %d results", len(results))
+
+        return results
+
+    def retrieve_batch(self, questions: list[str], top_k: int = 3) -> list[list[dict]]:
+        """Retrieve for many questions: one encode call and one SQL round trip
 
-        # First, verify we can see the documents at all
-        cur.execute("SELECT COUNT(*) as count FROM documents")
-        count_result = cur.fetchone()
-        print(f"  [DEBUG] Document count in this transaction: {count_result['count']}")
+        Per-stage timings (ms, whole batch) are left in `self.last_timings`.
+        """
+        if not questions:
+            return []
 
-        # Try the one-line format that worked in standalone test
-        search_query = f"SELECT id, title, content, 1 - (embedding <=> '{embedding_str}'::vector) as similarity FROM documents ORDER BY embedding <=> '{embedding_str}'::vector LIMIT {top_k}"
+        start = time.perf_counter()
+        embeddings = get_encode_scheduler().encode(
+            self.embedding_model, questions, priority=BATCH, batch_size=64, convert_to_numpy=True
+        )
+        encode_ms = (time.perf_counter() - start) * 1000
 
-        print(f"  [DEBUG] Executing one-line query...")
-        cur.execute(search_query)
-        results = cur.fetchall()
-        print(f"  [DEBUG] Query returned {len(results)} results")
-        cur.close()
+        start = time.perf_counter()
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT q.idx, d.id, d.title, d.content, d.similarity
+                FROM unnest(%s::int[], %s::text[]) AS q(idx, embedding)
+                CROSS JOIN LATERAL (
+                    SELECT id, title, content,
+                           1 - (embedding <=> q.embedding::vector) AS similarity
+                    FROM documents
+                    ORDER BY embedding <=> q.embedding::vector
+                    LIMIT %s
+                ) d
+                ORDER BY q.idx, d.similarity DESC
+            """, (
+                list(range(len(questions))),
+                ["[" + ",".join(str(x) for x in embedding) + "]" for embedding in embeddings],
+                top_k
+            ))
+            rows = cur.fetchall()
+        results = [[] for _ in questions]
+        for row in rows:
+            results[row.pop("idx")].append(row)
 
+        self.last_timings = {
+            "encode_ms": encode_ms,
+            "search_ms": (time.perf_counter() - start) * 1000
+        }
         return results
     
-    def generate_answer(self, query: str, context: str) -> str:
-        """Generate answer using Google GenAI based on context"""
-
-        prompt = f"""Based on the following context, answer the question.
+    def build_prompt(self, query: str, context: str) -> str:
+        """Prompt sent to Gemini for a question and its retrieved context"""
+        return f"""Based on the following context, answer the question.
 If the context doesn't contain relevant information, say so.
 
 Context:
@@ -75,17 +159,65 @@ Question: {query}
 
 Answer:"""
 
-        response = self.client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                max_output_tokens=300,
+    def _generation_config(self):
+        return types.GenerateContentConfig(
+            temperature=self.temperature,
+            max_output_tokens=self.max_output_tokens,
+        )
+
+    def generate_answer(self, query: str, context: str) -> str:
+        """Generate answer using Google GenAI based on context"""
+
+        prompt = self.build_prompt(query, context)
+
+        def generate():
+            response = self.client.models.generate_content(
+                model=self.generation_model,
+                contents=prompt,
+                config=self._generation_config()
             )
+            return response.text
+
+        if self.response_cache is None:
+            return generate()
+        return self.response_cache.get_or_generate(
+            self.generation_model, prompt, self.temperature, self.max_output_tokens, generate
         )
 
-        return response.text
-    
+    def generate_answer_stream(self, query: str, context: str) -> Iterator[str]:
+        """Yield answer text chunks as Gemini produces them"""
+
+        prompt = self.build_prompt(query, context)
+        cache = self.response_cache
+        if cache is not None and cache.enabled_for(self.temperature):
+            key = cache.make_key(self.generation_model, prompt, self.temperature, self.max_output_tokens)
+            cached = cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        else:
+            key = None
+
+        chunks = []
+        for chunk in self.client.models.generate_content_stream(
+            model=self.generation_model,
+            contents=prompt,
+            config=self._generation_config()
+        ):
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+
+        # Only complete streams are cached
+        if key is not None and chunks:
+            cache.put(key, "".join(chunks))
+
+    def build_context(self, retrieved_docs: list[dict]) -> str:
+        return "\n\n".join([
+            f"Document: {doc['title']}\n{doc['content']}"
+            for doc in retrieved_docs
+        ])
+
     def query(self, question: str) -> dict:
         """Complete RAG pipeline: retrieve + generate"""
         
@@ -98,10 +230,7 @@ Answer:"""
             print(f"  {i}. {doc['title']} (similarity: {doc['similarity']:.3f})")
         
         # Step 2: Build context
-        context = "\n\n".join([
-            f"Document: {doc['title']}\n{doc['content']}"
-            for doc in retrieved_docs
-        ])
+        context = self.build_context(retrieved_docs)
         
         # Step 3: Generate
         print("🤖 Generating answer...")
@@ -115,9 +244,37 @@ Answer:"""
             ],
             "answer": answer
         }
+
+    def query_stream(self, question: str, top_k: int = 3) -> Iterator[dict]:
+        """Streaming RAG pipeline: one `retrieval` event, `token` events, then `done`
+
+        `done` carries time-to-first-token and total time in milliseconds.
+        """
+        start = time.perf_counter()
+        retrieved_docs = self.retrieve_similar_documents(question, top_k=top_k)
+        yield {
+            "type": "retrieval",
+            "retrieved_documents": [
+                {"title": doc["title"], "similarity": float(doc["similarity"])}
+                for doc in retrieved_docs
+            ],
+            "retrieval_ms": (time.perf_counter() - start) * 1000
+        }
+
+        ttft_ms = None
+        for text in self.generate_answer_stream(question, self.build_context(retrieved_docs)):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+            yield {"type": "token", "text": text}
+
+        yield {
+            "type": "done",
+            "ttft_ms": ttft_ms,
+            "total_ms": (time.perf_counter() - start) * 1000
+        }
     
     def close(self):
-        self.conn.close()
+        self.pool.closeall()
 
 # Example usage
 if __name__ == "__main__":
@@ -130,7 +287,18 @@ if __name__ == "__main__":
         "What is machine learning?"
     ]
     
+    stream = "--stream" in sys.argv
     for query in queries:
+        if stream:
+            # Print tokens as they arrive
+            print(f"\n📝 Question: {query}\n{'='*60}\nAnswer: ", end="", flush=True)
+            for event in rag.query_stream(query):
+                if event["type"] == "token":
+                    print(event["text"], end="", flush=True)
+                elif event["type"] == "done":
+                    print(f"\n⏱️ TTFT {event['ttft_ms'] or 0:.0f} ms, total {event['total_ms']:.0f} ms")
+            continue
+
         result = rag.query(query)
         print(f"\n{'='*60}")
         print(f"Answer: {result['answer']}")
@@ -6,12 +6,17 @@ from google.adk.agents.llm_agent import LlmAgent
 # Load environment variables
 load_dotenv()
 
+from agent_core.metrics import after_model_callback, before_model_callback
+from agent_core.stub_llm import resolve_model
 from .tools.query_food import query_food
+from .tools.query_nutrition import query_nutrition
+from .tools.plan_meals import plan_meals
+from .tools.query_food_stats import query_food_stats
 
 
 # Create the agent
 root_agent = LlmAgent(
-    model="gemini-2.5-flash-lite",
+    model=resolve_model("gemini-2.5-flash-lite"),
     name="food_agent",
     instruction="""You are a helpful Indonesian Food Analyst assistant that helps users find the best menu options and understand nutritional information.
 
@@ -23,6 +28,13 @@ When users ask questions:
 4. If no relevant menus are found (low similarity scores or empty results), let the user know
 5. Always be conversational and cite which menus you used in your answer
 6. For nutritional questions, provide detailed breakdowns with daily value percentages
+7. For broad questions (e.g. "menu sarapan apa saja?"), call query_food with diversify=True to get varied dishes
+8. For rankings or comparisons across the whole menu ("protein tertinggi per kalori", "bandingkan Rendang dan Sate"), use query_nutrition instead of query_food
+9. For budget questions ("menu di bawah Rp 30.000"), pass max_harga/min_harga in rupiah to query_food
+10. For dietary or meal-slot requests ("sarapan vegetarian"), pass cocok_untuk tags to query_food (e.g. tags="Sarapan, Vegetarian"; match_all_tags=False for "either")
+11. For a full day's menu with calorie/protein targets or a budget ("menu sehari 1800 kalori, budget Rp 100.000"), use plan_meals
+12. For aggregate questions ("rata-rata kalori per kategori", "menu paling sehat dari Jawa Timur"), use query_food_stats
+13. If query_food returns stale=True, the database is temporarily unavailable: answer from those menus but mention the data may be out of date
 
 Example queries:
 - "Saya sedang diet, menu apa yang cocok untuk turun berat?" (I'm on a diet, what's good for weight loss?)
@@ -31,5 +43,8 @@ Example queries:
 - "Rekomendasi menu tinggi protein untuk muscle building" (High protein menu recommendations for muscle building)
 
 Your goal is to provide accurate, nutrition-aware answers based on Indonesian cuisine database.""",
-    tools=[query_food]
+    tools=[query_food, query_nutrition, plan_meals, query_food_stats],
+    # LLM latency as the `llm` stage of agent_pipeline_stage_seconds
+    before_model_callback=before_model_callback,
+    after_model_callback=after_model_callback
 )
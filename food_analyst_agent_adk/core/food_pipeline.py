@@ -2,40 +2,29 @@
 from sentence_transformers import SentenceTransformer
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import json
+import logging
 import os
+import time
 
+import numpy as np
 
-class FoodPipeline:
-    """Food analyst pipeline for Indonesian menu retrieval and nutritional analysis"""
+from agent_core.embedding_versions import DEFAULT_COLUMN, get_embedding_versions, get_shadow_reader
+from agent_core.encode_scheduler import get_encode_scheduler
+from agent_core.metrics import DB_CONNECTIONS, PIPELINE_ERRORS, PIPELINE_RESULTS, record_timings
+from agent_core.replicas import PRIMARY, get_replica_router, is_connection_failure
+from agent_core.slow_queries import get_slow_query_log
+from agent_core.snapshot import get_snapshot_store
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        """Initialize food pipeline with embedding model and database connection"""
-        # Initialize embedding model (same as reference: all-MiniLM-L6-v2)
-        self.embedding_model = SentenceTransformer(model_name, device='cpu')
-
-        # Database connection
-        self.conn = psycopg2.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            user=os.getenv("DB_USER", "boilerplate"),
-            password=os.getenv("DB_PASSWORD", "boilerplate"),
-            database=os.getenv("DB_NAME", "boilerplate_db"),
-            port=int(os.getenv("DB_PORT", 5432))
-        )
-        self.conn.autocommit = True
+from .mmr import mmr_select
+from .nutrient_cache import get_nutrient_cache
 
-    def retrieve_similar_menus(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Find most similar Indonesian menus to the query"""
-        # Generate query embedding (384 dimensions)
-        query_embedding = self.embedding_model.encode(query)
+logger = logging.getLogger(__name__)
 
-        # Convert to string format for pgvector
-        embedding_str = "[" + ",".join([str(x) for x in query_embedding]) + "]"
 
-        # Similarity search in PostgreSQL - CHANGED TABLE & FIELDS
-        cur = self.conn.cursor(cursor_factory=RealDictCursor)
-        search_query = f"""
-            SELECT
+# Columns returned for every retrieved menu
+MENU_COLUMNS = """
                 id,
                 nama_menu,
                 kategori,
@@ -49,72 +38,278 @@ class FoodPipeline:
                 garam,
                 tingkat_kesehatan,
                 harga,
-                cocok_untuk,
-                1 - (embedding <=> '{embedding_str}'::vector) as similarity
+                cocok_untuk"""
+
+
+class FoodPipeline:
+    """Food analyst pipeline for Indonesian menu retrieval and nutritional analysis"""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        snapshot_dir: Optional[str] = None,
+        mmr_enabled: Optional[bool] = None,
+        mmr_fetch_factor: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        primary_dsn: Optional[str] = None,
+        replica_dsns: Optional[List[str]] = None
+    ):
+        """Initialize food pipeline with embedding model and database connection
+
+        Args:
+            model_name: SentenceTransformer model used for query embeddings.
+                Defaults to the model of the active embedding version
+                (agent_core/embedding_versions.py), all-MiniLM-L6-v2 before any migration.
+            snapshot_dir: Directory of memory-mapped embedding snapshots for in-process
+                search (see agent_core/snapshot.py). Defaults to FOOD_SNAPSHOT_DIR; unset
+                means pgvector does the search.
+            mmr_enabled: Diversify results with MMR by default. Defaults to FOOD_MMR_ENABLED.
+            mmr_fetch_factor: Candidates over-fetched per result for MMR.
+                Defaults to FOOD_MMR_FETCH_FACTOR or 4.
+            mmr_lambda: MMR relevance/diversity trade-off (1.0 = pure relevance).
+                Defaults to FOOD_MMR_LAMBDA or 0.5.
+            primary_dsn: Primary server; defaults to the DB_* variables.
+            replica_dsns: Streaming replicas that serve the searches (see
+                agent_core/replicas.py). Defaults to DB_REPLICA_DSNS; empty means the
+                primary serves them too.
+        """
+        # Database connection; the pipeline only reads, so a healthy replica
+        # serves it when one is configured, and the primary otherwise
+        self.router = get_replica_router(primary_dsn, replica_dsns)
+        self.conn, self.db_target = self.router.connect_for_reads()
+        DB_CONNECTIONS.inc()
+
+        try:
+            # Embedding version searched: its model encodes queries, its column is searched
+            self.embedding_version = get_embedding_versions().active("food_menu", self.conn)
+
+            # Initialize embedding model (all-MiniLM-L6-v2 until a migration flips it)
+            self.model_name = model_name or self.embedding_version.model_name
+            self.embedding_model = SentenceTransformer(self.model_name, device='cpu')
+        except Exception:
+            self.close()
+            raise
+
+        # MMR re-ranking stage
+        if mmr_enabled is None:
+            mmr_enabled = os.getenv("FOOD_MMR_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.mmr_enabled = mmr_enabled
+        self.mmr_fetch_factor = mmr_fetch_factor or int(os.getenv("FOOD_MMR_FETCH_FACTOR", 4))
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("FOOD_MMR_LAMBDA", 0.5))
+
+        # Per-stage latency (ms) and query embedding of the last retrieval
+        self.last_timings: Dict[str, float] = {}
+        self.last_query_embedding = None
+
+        # Shared in-process snapshot (mapped once per worker, not per pipeline)
+        snapshot_dir = snapshot_dir or os.getenv("FOOD_SNAPSHOT_DIR")
+        self.snapshot_store = get_snapshot_store(snapshot_dir, "food_menu") if snapshot_dir else None
+
+    def retrieve_similar_menus(
+        self,
+        query: str,
+        top_k: int = 3,
+        diversify: Optional[bool] = None,
+        min_harga: Optional[int] = None,
+        max_harga: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        match_all_tags: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Find most similar Indonesian menus to the query
+
+        Args:
+            query: Free-text preference or menu description
+            top_k: Number of menus to return
+            diversify: Re-rank an over-fetched candidate set with MMR so near-duplicate
+                dishes don't crowd out the results. Defaults to `self.mmr_enabled`.
+            min_harga: Only menus costing at least this many rupiah
+            max_harga: Only menus costing at most this many rupiah. Price filters
+                are evaluated in SQL on the indexed `harga_rp` column
+                (scripts/8_price_column.py).
+            tags: Only menus whose cocok_untuk contains these tags (exact,
+                case-sensitive; see GET /food/tags for the vocabulary)
+            match_all_tags: Require every tag (`@>`) instead of any tag (`&&`).
+                Both use the GIN index from scripts/9_tag_index.py.
+        """
+        diversify = self.mmr_enabled if diversify is None else diversify
+        fetch_k = top_k * self.mmr_fetch_factor if diversify else top_k
+        timings = {}
+
+        # Generate query embedding (384 dimensions)
+        start = time.perf_counter()
+        try:
+            query_embedding = get_encode_scheduler().encode(self.embedding_model, query)
+        except Exception:
+            PIPELINE_ERRORS.inc(stage="encode")
+            raise
+        timings["encode_ms"] = (time.perf_counter() - start) * 1000
+        self.last_query_embedding = query_embedding
+
+        start = time.perf_counter()
+        filters = {
+            "min_harga": min_harga,
+            "max_harga": max_harga,
+            "tags": list(tags) if tags else None,
+            "match_all_tags": match_all_tags
+        }
+        filtered = min_harga is not None or max_harga is not None or bool(tags)
+        # The snapshot ranks every row, so filtered searches go to PostgreSQL
+        snapshot = self.snapshot_store.current() if self.snapshot_store and not filtered else None
+        if snapshot is not None and snapshot.header.get("column", DEFAULT_COLUMN) != self.embedding_version.column:
+            # Exported before the last model flip; re-export with scripts/5_export_snapshot.py
+            snapshot = None
+        try:
+            if snapshot is not None:
+                results = self._read(
+                    self._retrieve_from_snapshot, snapshot, query_embedding, fetch_k, with_embeddings=diversify
+                )
+            else:
+                results = self._read(
+                    self._retrieve_from_db, query_embedding, fetch_k, with_embeddings=diversify, **filters
+                )
+        except Exception:
+            PIPELINE_ERRORS.inc(stage="search")
+            raise
+        timings["search_ms"] = (time.perf_counter() - start) * 1000
+
+        if diversify:
+            start = time.perf_counter()
+            results = self._apply_mmr(query_embedding, results, top_k)
+            timings["mmr_ms"] = (time.perf_counter() - start) * 1000
+
+        self.last_timings = timings
+        record_timings(timings)
+        PIPELINE_RESULTS.inc(len(results), source="snapshot" if snapshot is not None else "db")
+
+        # Dual read during a model migration: sampled, in the background; the
+        # shadow search has no filters, so only unfiltered ones are comparable
+        candidate = get_embedding_versions().candidate("food_menu", self.conn) if not filtered else None
+        if candidate is not None:
+            get_shadow_reader().submit(candidate, query, [menu["id"] for menu in results], top_k)
+        logger.debug("retrieve_similar_menus timings: %s", timings)
+        return results
+
+    def _read(self, retrieve, *args, **kwargs):
+        """Run a retrieval on self.conn; if its replica drops, retry once on the primary"""
+        try:
+            return retrieve(*args, **kwargs)
+        except psycopg2.Error as e:
+            if self.db_target == PRIMARY or not is_connection_failure(e):
+                raise
+            logger.warning("Replica %s failed, retrying on the primary: %s", self.db_target, e)
+            self.conn, self.db_target = self.router.fail_over(self.conn, self.db_target, e)
+            return retrieve(*args, **kwargs)
+
+    def _retrieve_from_db(
+        self,
+        query_embedding,
+        top_k: int,
+        with_embeddings: bool = False,
+        min_harga: Optional[int] = None,
+        max_harga: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        match_all_tags: bool = True
+    ) -> List[Dict[str, Any]]:
+        """pgvector similarity search, optionally restricted by price range and tags"""
+        # Convert to string format for pgvector
+        embedding_str = "[" + ",".join([str(x) for x in query_embedding]) + "]"
+        column = self.embedding_version.column
+        embedding_column = f",\n                {column}::text AS embedding" if with_embeddings else ""
+
+        conditions = []
+        if min_harga is not None:
+            conditions.append("harga_rp >= %(min_harga)s")
+        if max_harga is not None:
+            conditions.append("harga_rp <= %(max_harga)s")
+        if tags:
+            conditions.append(f"cocok_untuk {'@>' if match_all_tags else '&&'} %(tags)s::text[]")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Similarity search in PostgreSQL - CHANGED TABLE & FIELDS
+        cur = self.conn.cursor(cursor_factory=RealDictCursor)
+        search_query = f"""
+            SELECT{MENU_COLUMNS},
+                1 - ({column} <=> %(embedding)s::vector) as similarity{embedding_column}
             FROM food_menu
-            ORDER BY embedding <=> '{embedding_str}'::vector
-            LIMIT {top_k}
+            {where}
+            ORDER BY {column} <=> %(embedding)s::vector
+            LIMIT %(top_k)s
         """
 
-        cur.execute(search_query)
+        params = {
+            "embedding": embedding_str,
+            "top_k": top_k,
+            "min_harga": min_harga,
+            "max_harga": max_harga,
+            "tags": tags
+        }
+        start = time.perf_counter()
+        cur.execute(search_query, params)
         results = cur.fetchall()
         cur.close()
+        get_slow_query_log().observe(
+            self.conn, "food_menu_search", search_query, params, (time.perf_counter() - start) * 1000,
+            router=self.router, target=self.db_target
+        )
 
+        if with_embeddings:
+            for row in results:
+                row["embedding"] = np.array(json.loads(row["embedding"]), dtype=np.float32)
         return results
 
-    def get_nutrition_by_name(self, menu_name: str) -> Dict[str, Any]:
-        """Get complete nutritional information for a specific menu"""
+    def _apply_mmr(self, query_embedding, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Keep a diverse top-k of the candidates and drop their embeddings"""
+        if not candidates:
+            return []
+        embeddings = np.vstack([menu.pop("embedding") for menu in candidates])
+        selected = mmr_select(query_embedding, embeddings, top_k, self.mmr_lambda)
+        return [candidates[i] for i in selected]
+
+    def _retrieve_from_snapshot(
+        self,
+        snapshot,
+        query_embedding,
+        top_k: int,
+        with_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Rank in-process against the mapped snapshot, then fetch only the winning rows"""
+        hits = snapshot.search(query_embedding, top_k)
+        if not hits:
+            return []
+
         cur = self.conn.cursor(cursor_factory=RealDictCursor)
         cur.execute(
-            "SELECT * FROM food_menu WHERE nama_menu ILIKE %s",
-            (f"%{menu_name}%",)
+            f"SELECT{MENU_COLUMNS} FROM food_menu WHERE id = ANY(%s)",
+            ([menu_id for menu_id, _ in hits],)
         )
-        result = cur.fetchone()
+        rows = {row["id"]: row for row in cur.fetchall()}
         cur.close()
 
-        if not result:
-            return {"error": "Menu not found"}
+        # Keep snapshot order; rows deleted since the export are skipped
+        results = [
+            {**rows[menu_id], "similarity": similarity}
+            for menu_id, similarity in hits if menu_id in rows
+        ]
+        if with_embeddings and results:
+            vectors = snapshot.vectors([menu["id"] for menu in results])
+            for menu, vector in zip(results, vectors):
+                menu["embedding"] = vector
+        return results
 
-        # Calculate daily percentages based on 2000 kcal diet
-        daily_needs = {
-            "kalori": 2000,
-            "protein": 50,
-            "lemak": 70,
-            "karbohidrat": 300
-        }
+    def get_nutrition_by_name(self, menu_name: str) -> Dict[str, Any]:
+        """Get complete nutritional information for a specific menu
 
-        return {
-            "menu": result['nama_menu'],
-            "nutrition": {
-                "kalori": {
-                    "nilai": result['kalori'],
-                    "persen_harian": round(result['kalori'] / daily_needs['kalori'] * 100, 1)
-                },
-                "protein": {
-                    "gram": result['protein'],
-                    "persen_harian": round(result['protein'] / daily_needs['protein'] * 100, 1)
-                },
-                "lemak": {
-                    "gram": result['lemak'],
-                    "persen_harian": round(result['lemak'] / daily_needs['lemak'] * 100, 1)
-                },
-                "karbohidrat": {
-                    "gram": result['karbohidrat'],
-                    "persen_harian": round(result['karbohidrat'] / daily_needs['karbohidrat'] * 100, 1)
-                },
-                "serat": result['serat'],
-                "garam": result['garam']
-            },
-            "metadata": {
-                "kategori": result['kategori'],
-                "asal": result['asal'],
-                "tingkat_kesehatan": result['tingkat_kesehatan'],
-                "harga": result['harga'],
-                "cocok_untuk": result['cocok_untuk']
-            }
-        }
+        Served from the shared in-memory nutrient matrix (core/nutrient_cache.py);
+        daily percentages are based on a 2000 kcal diet.
+        """
+        matrix = get_nutrient_cache().get()
+        row = matrix.find(menu_name)
+        if row is None:
+            return {"error": "Menu not found"}
+        return matrix.describe(row)
 
     def close(self):
         """Close database connection"""
-        if hasattr(self, 'conn'):
+        if hasattr(self, 'conn') and not self.conn.closed:
             self.conn.close()
+            DB_CONNECTIONS.dec()
@@ -0,0 +1,173 @@
+"""Aggregate food_menu statistics served from materialized views
+
+The views (scripts/10_stats_views.py) hold per-kategori / asal /
+tingkat_kesehatan averages plus the healthiest and highest-protein menus of each
+group, so a lookup is a single unique-index probe instead of pulling rows.
+
+Writers bump a change counter through statement-level triggers. Once it crosses
+the configured threshold the views are refreshed CONCURRENTLY (readers are never
+blocked), either by `python scripts/10_stats_views.py --watch` or, lazily, by
+the first lookup that sees the counter over the threshold.
+"""
+import logging
+import os
+import threading
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from agent_core.replicas import get_replica_router
+
+logger = logging.getLogger(__name__)
+
+STATS_VIEWS = {
+    "kategori": "food_stats_by_kategori",
+    "asal": "food_stats_by_asal",
+    "tingkat_kesehatan": "food_stats_by_kesehatan",
+}
+
+SORTABLE_COLUMNS = [
+    "menu_count", "avg_kalori", "avg_protein", "avg_lemak", "avg_karbohidrat",
+    "avg_serat", "avg_garam", "avg_harga_rp", "avg_health_score",
+]
+
+REFRESH_LOCK_KEY = "food_stats_refresh"
+
+_conn = None
+_conn_target = None
+_conn_lock = threading.Lock()
+_refresh_thread: Optional[threading.Thread] = None
+
+
+def _connect():
+    """Primary connection; the refresh writes"""
+    conn = psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "boilerplate"),
+        password=os.getenv("DB_PASSWORD", "boilerplate"),
+        database=os.getenv("DB_NAME", "boilerplate_db"),
+        port=int(os.getenv("DB_PORT", 5432))
+    )
+    conn.autocommit = True
+    return conn
+
+
+def _connection():
+    """One small autocommit connection per process for lookups, reopened if it drops
+    or its replica falls behind (agent_core/replicas.py)"""
+    global _conn, _conn_target
+    router = get_replica_router()
+    if _conn is not None and not _conn.closed and not router.should_keep(_conn_target):
+        _conn.close()
+    if _conn is None or _conn.closed:
+        _conn, _conn_target = router.connect_for_reads()
+    return _conn
+
+
+def refresh_if_due(force: bool = False) -> bool:
+    """Refresh every stats view if the change counter crossed its threshold
+
+    The counter is claimed (reset) before refreshing, so changes made during the
+    refresh count toward the next one. An advisory lock keeps concurrent callers
+    from refreshing twice. Returns True if a refresh ran.
+    """
+    conn = _connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (REFRESH_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return False
+        try:
+            cur.execute("""
+                UPDATE food_stats_refresh_state s
+                SET changes = 0
+                FROM (SELECT changes FROM food_stats_refresh_state FOR UPDATE) claimed
+                WHERE s.changes >= s.threshold OR %s
+                RETURNING claimed.changes
+            """, (force,))
+            row = cur.fetchone()
+            if row is None:
+                return False
+            try:
+                for view in STATS_VIEWS.values():
+                    cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+            except psycopg2.Error:
+                # Give the claimed changes back so the next caller retries
+                cur.execute("UPDATE food_stats_refresh_state SET changes = changes + %s", (row[0],))
+                raise
+            cur.execute("UPDATE food_stats_refresh_state SET refreshed_at = CURRENT_TIMESTAMP")
+            logger.info("Food stats views refreshed after %d changes", row[0])
+            return True
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (REFRESH_LOCK_KEY,))
+            cur.close()
+    finally:
+        conn.close()
+
+
+def _refresh_in_background():
+    """Start at most one background refresh per process"""
+    global _refresh_thread
+    if _refresh_thread is not None and _refresh_thread.is_alive():
+        return
+
+    def run():
+        try:
+            refresh_if_due()
+        except Exception as e:
+            logger.warning("Food stats refresh failed: %s", e)
+
+    _refresh_thread = threading.Thread(target=run, name="food-stats-refresh", daemon=True)
+    _refresh_thread.start()
+
+
+def lookup_stats(
+    group_by: str,
+    value: str = "",
+    sort_by: str = "avg_kalori",
+    ascending: bool = False,
+    limit: int = 10
+) -> Dict[str, Any]:
+    """One group's row (`value`) or every group ordered by `sort_by`"""
+    if group_by not in STATS_VIEWS:
+        raise ValueError(f"Unknown group_by '{group_by}', expected one of {list(STATS_VIEWS)}")
+    if sort_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"Unknown sort_by '{sort_by}', expected one of {SORTABLE_COLUMNS}")
+
+    view = STATS_VIEWS[group_by]
+    if value:
+        # Served by the {view}_group_value_lower expression index (scripts/10_stats_views.py)
+        where, params = "WHERE lower(v.group_value) = lower(%s)", (value.strip(),)
+        order = ""
+    else:
+        where, params = "", ()
+        order = f"ORDER BY v.{sort_by} {'ASC' if ascending else 'DESC'} NULLS LAST LIMIT {int(limit)}"
+
+    with _conn_lock:
+        with _connection().cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT v.*, s.changes AS pending_changes, s.threshold, s.refreshed_at
+                FROM {view} v CROSS JOIN food_stats_refresh_state s
+                {where}
+                {order}
+            """, params)
+            rows = cur.fetchall()
+
+    # Refresh state rides along on every row; strip it off
+    pending = threshold = refreshed_at = None
+    for row in rows:
+        pending, threshold, refreshed_at = row.pop("pending_changes"), row.pop("threshold"), row.pop("refreshed_at")
+    if pending is not None and pending >= threshold:
+        _refresh_in_background()
+
+    return {
+        "group_by": group_by,
+        "groups": [
+            {k: float(v) if isinstance(v, Decimal) else v for k, v in row.items()}
+            for row in rows
+        ],
+        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+        "pending_changes": pending
+    }
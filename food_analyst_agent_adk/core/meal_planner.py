@@ -0,0 +1,203 @@
+"""Day meal-plan optimization over the nutrient matrix
+
+Picks one menu per meal slot so the day's totals land close to a calorie target,
+reach a protein target and stay within a budget. This is a multiple-choice
+bounded knapsack (each slot takes exactly one menu, each menu is used at most
+once), solved with a vectorized beam search over NutrientMatrix arrays:
+
+1. Each slot's eligible menus (matching cocok_untuk tag, known calories and
+   price) are pruned to the `candidates_per_slot` that best cover one slot's
+   share of the targets, plus the cheapest ones so tight budgets stay feasible.
+2. Slots are expanded one at a time: every partial plan is combined with every
+   candidate in one broadcast, plans that can no longer fit the budget or repeat
+   a menu are masked out, and the best `beam_width` survive.
+
+Per slot that is at most beam_width * candidates_per_slot combinations, a few
+milliseconds for 10k menus (see scripts/7_benchmark_meal_plan.py).
+
+The result is only guaranteed optimal when neither step cut anything (small
+menus, or a large beam). Otherwise it is a good plan, not necessarily the best,
+and `approximate` is True in the result.
+
+Menus without a known price never count as cheap: they are left out of the
+"cheapest" candidates and out of the budget, and a plan's total only covers
+known prices (`harga_unknown_slots` lists the rest).
+"""
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from .nutrient_cache import NUTRIENTS, NutrientMatrix
+
+DEFAULT_SLOTS = ("Sarapan", "Makan Siang", "Makan Malam")
+
+KALORI = NUTRIENTS.index("kalori")
+PROTEIN = NUTRIENTS.index("protein")
+LEMAK = NUTRIENTS.index("lemak")
+
+
+class MealPlanner:
+    """Solves meal plans against one NutrientMatrix snapshot"""
+
+    def __init__(
+        self,
+        matrix: NutrientMatrix,
+        candidates_per_slot: int = 200,
+        beam_width: int = 500,
+        price_weight: float = 0.05
+    ):
+        self.matrix = matrix
+        self.candidates_per_slot = candidates_per_slot
+        self.beam_width = beam_width
+        self.price_weight = price_weight
+        # Unknown macros count as zero; unknown calories make a menu ineligible
+        self.values = np.nan_to_num(matrix.values, nan=0.0)
+
+    def score(
+        self,
+        totals: np.ndarray,
+        costs: np.ndarray,
+        kalori: float,
+        protein: float,
+        budget: Optional[float],
+        max_lemak: Optional[float],
+        fraction: float = 1.0
+    ) -> np.ndarray:
+        """Lower is better: relative miss of each (prorated) target plus a small price term"""
+        kal_target = kalori * fraction
+        result = np.abs(totals[:, KALORI] - kal_target) / kal_target
+        if protein:
+            result += np.maximum(0.0, protein * fraction - totals[:, PROTEIN]) / (protein * fraction)
+        if max_lemak:
+            result += np.maximum(0.0, totals[:, LEMAK] - max_lemak * fraction) / (max_lemak * fraction)
+        if budget:
+            result += self.price_weight * costs / budget
+        return result
+
+    def _slot_candidates(self, slot, eligible, prices, targets, n_slots):
+        mask = self.matrix.slot_mask(slot) & eligible
+        tagged = bool(mask.any())
+        rows = np.flatnonzero(mask if tagged else eligible)
+
+        pruned = len(rows) > self.candidates_per_slot
+        if pruned:
+            fit = self.score(self.values[rows], prices[rows], *targets, fraction=1.0 / n_slots)
+            best = rows[np.argsort(fit, kind="stable")[:self.candidates_per_slot]]
+            priced = rows[~np.isnan(prices[rows])]
+            cheapest = priced[np.argsort(prices[priced], kind="stable")[:max(1, self.candidates_per_slot // 4)]]
+            rows = np.unique(np.concatenate([best, cheapest]))
+        return rows, tagged, pruned
+
+    def plan(
+        self,
+        slots: Sequence[str] = DEFAULT_SLOTS,
+        kalori: float = 2000,
+        protein: float = 60,
+        budget: Optional[float] = None,
+        max_lemak: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Best plan for the given slots and targets
+
+        Args:
+            slots: Meal slots in order, matched against cocok_untuk (untagged slots accept any menu)
+            kalori: Daily calorie target (two-sided)
+            protein: Minimum daily protein in grams (0 to ignore)
+            budget: Maximum total price in rupiah (None for no budget)
+            max_lemak: Maximum daily fat in grams (None to ignore)
+        """
+        start = time.perf_counter()
+        matrix = self.matrix
+        n_slots = len(slots)
+        targets = (kalori, protein, budget, max_lemak)
+
+        eligible = ~np.isnan(matrix.values[:, KALORI])
+        if budget:
+            eligible &= ~np.isnan(matrix.harga_rp) & (matrix.harga_rp <= budget)
+        # Unknown prices stay NaN for candidate selection; with a budget they are
+        # already ineligible, so the zeros below only reach the reported total
+        prices = matrix.harga_rp
+        known_prices = np.nan_to_num(prices, nan=0.0)
+
+        candidates, untagged, approximate = [], [], False
+        for slot in slots:
+            rows, tagged, pruned = self._slot_candidates(slot, eligible, prices, targets, n_slots)
+            if not tagged:
+                untagged.append(slot)
+            candidates.append(rows)
+            approximate |= pruned
+
+        result = {
+            "feasible": False,
+            "approximate": approximate,
+            "plan": [],
+            "targets": {"kalori": kalori, "protein": protein, "budget_rp": budget, "max_lemak": max_lemak},
+            "candidates": {slot: int(len(rows)) for slot, rows in zip(slots, candidates)},
+            "untagged_slots": untagged,
+        }
+        if n_slots == 0 or any(len(rows) == 0 for rows in candidates):
+            result["timing_ms"] = (time.perf_counter() - start) * 1000
+            return result
+
+        # Cheapest possible spend on the remaining slots, so the beam never keeps
+        # a partial plan that can no longer fit the budget
+        reserve = np.zeros(n_slots + 1)
+        for s in range(n_slots - 1, -1, -1):
+            reserve[s] = reserve[s + 1] + known_prices[candidates[s]].min()
+
+        plan_rows = np.empty((1, 0), dtype=np.int64)
+        totals = np.zeros((1, len(NUTRIENTS)))
+        costs = np.zeros(1)
+        for s, rows in enumerate(candidates):
+            parent = np.repeat(np.arange(len(plan_rows)), len(rows))
+            child = np.tile(rows, len(plan_rows))
+            new_totals = (totals[:, None, :] + self.values[rows][None, :, :]).reshape(-1, len(NUTRIENTS))
+            new_costs = (costs[:, None] + known_prices[rows][None, :]).reshape(-1)
+
+            ok = np.ones(len(child), dtype=bool)
+            if budget:
+                ok &= new_costs + reserve[s + 1] <= budget
+            if s > 0:
+                ok &= ~(plan_rows[parent] == child[:, None]).any(axis=1)
+            keep = np.flatnonzero(ok)
+            if len(keep) == 0:
+                result["timing_ms"] = (time.perf_counter() - start) * 1000
+                return result
+
+            fraction = (s + 1) / n_slots
+            scores = self.score(new_totals[keep], new_costs[keep], *targets, fraction=fraction)
+            if len(keep) > self.beam_width:
+                keep = keep[np.argpartition(scores, self.beam_width - 1)[:self.beam_width]]
+                approximate = True
+
+            plan_rows = np.concatenate([plan_rows[parent[keep]], child[keep, None]], axis=1)
+            totals, costs = new_totals[keep], new_costs[keep]
+
+        final = self.score(totals, costs, *targets)
+        best = int(np.argmin(final))
+        chosen = plan_rows[best]
+
+        result.update({
+            "feasible": True,
+            "approximate": approximate,
+            "plan": [self._describe_choice(slot, int(row)) for slot, row in zip(slots, chosen)],
+            "totals": {n: round(float(v), 1) for n, v in zip(NUTRIENTS, totals[best])},
+            "total_harga_rp": int(costs[best]),
+            "harga_unknown_slots": [slot for slot, row in zip(slots, chosen) if np.isnan(prices[row])],
+            "score": round(float(final[best]), 4),
+            "timing_ms": (time.perf_counter() - start) * 1000,
+        })
+        return result
+
+    def _describe_choice(self, slot: str, row: int) -> Dict[str, Any]:
+        matrix = self.matrix
+        price = matrix.harga_rp[row]
+        return {
+            "slot": slot,
+            "menu": matrix.names[row],
+            "harga": matrix.harga[row],
+            "harga_rp": None if np.isnan(price) else int(price),
+            "cocok_untuk": matrix.cocok_untuk[row],
+            **{n: matrix.describe_value(row, n) for n in NUTRIENTS}
+        }
+
@@ -0,0 +1,52 @@
+"""Maximal marginal relevance (MMR) selection for diverse retrieval results"""
+from typing import List
+
+import numpy as np
+
+
+def mmr_select(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    top_k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """Pick `top_k` candidate indices balancing relevance against redundancy
+
+    Each step selects the candidate maximising
+    `lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected)`.
+    All similarities are computed up front as one matrix product, so every
+    step is a vectorized argmax over the candidates.
+
+    Args:
+        query_embedding: Query vector, shape (dim,)
+        candidate_embeddings: Candidate vectors in retrieval order, shape (n, dim)
+        top_k: Number of candidates to keep
+        lambda_mult: 1.0 is pure relevance, 0.0 is pure diversity
+
+    Returns:
+        Indices into `candidate_embeddings`, in selection order
+    """
+    n = len(candidate_embeddings)
+    if n == 0 or top_k <= 0:
+        return []
+
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected: List[int] = []
+    max_redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(top_k, n)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, pairwise[best], out=max_redundancy)
+
+    return selected
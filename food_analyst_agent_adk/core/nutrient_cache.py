@@ -0,0 +1,308 @@
+"""In-memory columnar cache of food_menu nutrients for vectorized analytics
+
+All menus are loaded once into NumPy arrays (one row per menu, one column per
+nutrient). Daily-value percentages, rankings like "highest protein per kcal"
+and side-by-side comparisons are then single array expressions over every menu,
+with no per-row queries.
+
+A background thread LISTENs on the `table_changed` channel (see
+scripts/6_table_versions.py) and reloads the arrays when food_menu changes.
+Without the trigger the cache still refreshes every FOOD_NUTRIENT_CACHE_TTL
+seconds.
+
+The reload reads from a replica when DB_REPLICA_DSNS is set (agent_core/replicas.py).
+When a notification arrives, the listener records the primary's WAL position,
+and the reload only uses a replica that has replayed up to it. A reload
+therefore never picks up the pre-change rows.
+"""
+import logging
+import os
+import select
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from agent_core.replicas import get_replica_router
+
+from .prices import parse_harga
+
+logger = logging.getLogger(__name__)
+
+NUTRIENTS = ["kalori", "protein", "lemak", "karbohidrat", "serat", "garam"]
+
+# Daily needs for a 2000 kcal diet (serat: 25 g, garam: WHO 5 g salt)
+DAILY_NEEDS = {
+    "kalori": 2000,
+    "protein": 50,
+    "lemak": 70,
+    "karbohidrat": 300,
+    "serat": 25,
+    "garam": 5,
+}
+DAILY_NEEDS_VECTOR = np.array([DAILY_NEEDS[n] for n in NUTRIENTS], dtype=np.float64)
+
+# Meal slots and the cocok_untuk tags (lowercased) that qualify a menu for them
+SLOT_TAGS = {
+    "sarapan": {"sarapan", "breakfast"},
+    "makan siang": {"makan siang", "lunch", "lunch office"},
+    "makan malam": {"makan malam", "dinner", "makan lengkap"},
+    "snack": {"snack", "party snack", "appetizer", "side dish"},
+}
+
+
+class NutrientMatrix:
+    """An immutable snapshot of food_menu: metadata columns plus an (n, 6) nutrient matrix"""
+
+    def __init__(self, rows: List[tuple]):
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.names = np.array([r[1] or "" for r in rows], dtype=object)
+        self.kategori = np.array([r[2] for r in rows], dtype=object)
+        self.asal = np.array([r[3] for r in rows], dtype=object)
+        self.tingkat_kesehatan = np.array([r[4] for r in rows], dtype=object)
+        self.harga = np.array([r[5] for r in rows], dtype=object)
+        prices = [parse_harga(r[5]) for r in rows]
+        self.harga_rp = np.array([np.nan if p is None else p for p in prices], dtype=np.float64)
+        self.cocok_untuk = [r[6] or [] for r in rows]
+        self.values = np.array(
+            [[np.nan if v is None else v for v in r[7:7 + len(NUTRIENTS)]] for r in rows],
+            dtype=np.float64
+        ).reshape(len(rows), len(NUTRIENTS))
+        self._lower_names = [name.lower() for name in self.names]
+        self._slot_masks: Dict[str, np.ndarray] = {}
+        self.loaded_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def column(self, nutrient: str) -> np.ndarray:
+        if nutrient not in NUTRIENTS:
+            raise ValueError(f"Unknown nutrient '{nutrient}', expected one of {NUTRIENTS}")
+        return self.values[:, NUTRIENTS.index(nutrient)]
+
+    def describe_value(self, row: int, nutrient: str) -> Optional[float]:
+        v = self.values[row, NUTRIENTS.index(nutrient)]
+        return None if np.isnan(v) else float(v)
+
+    def slot_mask(self, slot: str) -> np.ndarray:
+        """Boolean mask of menus whose cocok_untuk tags fit a meal slot (e.g. "Sarapan")"""
+        key = slot.lower().strip()
+        if key not in self._slot_masks:
+            tags = SLOT_TAGS.get(key, {key})
+            self._slot_masks[key] = np.array(
+                [any(t.lower() in tags for t in row_tags) for row_tags in self.cocok_untuk],
+                dtype=bool
+            ).reshape(len(self))
+        return self._slot_masks[key]
+
+    def daily_percentages(self) -> np.ndarray:
+        """Percent of daily needs for every menu and nutrient, shape (n, 6)"""
+        return self.values / DAILY_NEEDS_VECTOR * 100
+
+    def row_of(self, menu_id: int) -> Optional[int]:
+        """Row of a menu id (rows are loaded in id order)"""
+        row = int(np.searchsorted(self.ids, menu_id))
+        return row if row < len(self.ids) and self.ids[row] == menu_id else None
+
+    def find(self, name: str) -> Optional[int]:
+        """Row of the first menu whose name contains `name` (case-insensitive)"""
+        needle = name.lower().strip()
+        for i, candidate in enumerate(self._lower_names):
+            if candidate == needle:
+                return i
+        for i, candidate in enumerate(self._lower_names):
+            if needle in candidate:
+                return i
+        return None
+
+    def describe(self, row: int) -> Dict[str, Any]:
+        """Nutrition of one menu in the get_nutrition_by_name format"""
+        percentages = self.values[row] / DAILY_NEEDS_VECTOR * 100
+
+        def value(nutrient):
+            v = self.values[row, NUTRIENTS.index(nutrient)]
+            return None if np.isnan(v) else (float(v) if nutrient == "garam" else int(v))
+
+        def with_percent(nutrient, unit_key):
+            pct = percentages[NUTRIENTS.index(nutrient)]
+            return {unit_key: value(nutrient), "persen_harian": None if np.isnan(pct) else round(float(pct), 1)}
+
+        return {
+            "menu": self.names[row],
+            "nutrition": {
+                "kalori": with_percent("kalori", "nilai"),
+                "protein": with_percent("protein", "gram"),
+                "lemak": with_percent("lemak", "gram"),
+                "karbohidrat": with_percent("karbohidrat", "gram"),
+                "serat": value("serat"),
+                "garam": value("garam")
+            },
+            "metadata": {
+                "kategori": self.kategori[row],
+                "asal": self.asal[row],
+                "tingkat_kesehatan": self.tingkat_kesehatan[row],
+                "harga": self.harga[row],
+                "cocok_untuk": self.cocok_untuk[row]
+            }
+        }
+
+    def rank(
+        self,
+        metric: str,
+        per: Optional[str] = None,
+        top_n: int = 5,
+        ascending: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Top menus by a nutrient, optionally normalized by another (e.g. protein per kalori)"""
+        scores = self.column(metric)
+        if per:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = scores / self.column(per)
+        scores = np.where(np.isfinite(scores), scores, np.nan)
+
+        valid = np.flatnonzero(~np.isnan(scores))
+        order = valid[np.argsort(scores[valid], kind="stable")]
+        if not ascending:
+            order = order[::-1]
+        label = f"{metric}_per_{per}" if per else metric
+        return [
+            {
+                "menu": self.names[i],
+                label: round(float(scores[i]), 4),
+                **{n: self.describe_value(i, n) for n in NUTRIENTS}
+            }
+            for i in order[:top_n]
+        ]
+
+    def compare(self, names: List[str]) -> Dict[str, Any]:
+        """Side-by-side nutrients and daily percentages for the named menus"""
+        rows, missing = [], []
+        for name in names:
+            row = self.find(name)
+            if row is None:
+                missing.append(name)
+            else:
+                rows.append(row)
+        if not rows:
+            return {"menus": [], "missing": missing}
+
+        values = self.values[rows]
+        percentages = values / DAILY_NEEDS_VECTOR * 100
+        best = {}
+        for j, nutrient in enumerate(NUTRIENTS):
+            column = values[:, j]
+            if not np.all(np.isnan(column)):
+                best[f"highest_{nutrient}"] = self.names[rows[int(np.nanargmax(column))]]
+        return {
+            "menus": [
+                {
+                    "menu": self.names[row],
+                    "nutrition": {n: self.describe_value(row, n) for n in NUTRIENTS},
+                    "persen_harian": {
+                        n: None if np.isnan(p) else round(float(p), 1)
+                        for n, p in zip(NUTRIENTS, percentages[k])
+                    }
+                }
+                for k, row in enumerate(rows)
+            ],
+            "best": best,
+            "missing": missing
+        }
+
+
+class NutrientCache:
+    """Process-wide holder of the current NutrientMatrix, refreshed via LISTEN/NOTIFY"""
+
+    CHANNEL = "table_changed"
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._matrix: Optional[NutrientMatrix] = None
+        self._stale = threading.Event()
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        # Primary WAL position of the last food_menu change the reload must include
+        self._min_lsn: Optional[str] = None
+
+    def load(self) -> NutrientMatrix:
+        """Read every menu's nutrients in one query"""
+        conn, _ = get_replica_router().connect_for_reads(min_lsn=self._min_lsn)
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT id, nama_menu, kategori, asal, tingkat_kesehatan, harga, cocok_untuk,
+                       {', '.join(NUTRIENTS)}
+                FROM food_menu
+                ORDER BY id
+            """)
+            rows = cur.fetchall()
+            cur.close()
+        finally:
+            conn.close()
+        return NutrientMatrix(rows)
+
+    def peek(self) -> Optional[NutrientMatrix]:
+        """The loaded matrix as-is, without touching the database (None before the first load)"""
+        return self._matrix
+
+    def get(self) -> NutrientMatrix:
+        """Current matrix, reloading first if a change was signalled or the TTL passed"""
+        self._ensure_listener()
+        matrix = self._matrix
+        if matrix is None or self._stale.is_set() or time.time() - matrix.loaded_at > self.ttl:
+            with self._lock:
+                matrix = self._matrix
+                if matrix is None or self._stale.is_set() or time.time() - matrix.loaded_at > self.ttl:
+                    self._stale.clear()
+                    matrix = self.load()
+                    self._matrix = matrix
+                    logger.info("Nutrient cache loaded: %d menus", len(matrix))
+        return matrix
+
+    def _ensure_listener(self):
+        if self._listener is None or not self._listener.is_alive():
+            self._listener = threading.Thread(target=self._listen, name="nutrient-cache-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        """Mark the matrix stale on every food_menu notification; reconnect on errors"""
+        reconnecting = False
+        while True:
+            try:
+                # NOTIFY is only delivered on the primary
+                router = get_replica_router()
+                conn = router.connect_primary()
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.CHANNEL};")
+                if reconnecting:
+                    # Anything may have changed while we weren't listening
+                    self._mark_stale(router, cur)
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        if conn.notifies.pop(0).payload == "food_menu":
+                            self._mark_stale(router, cur)
+            except Exception as e:
+                logger.warning("Nutrient cache listener error, retrying: %s", e)
+                reconnecting = True
+                time.sleep(5)
+
+    def _mark_stale(self, router, cur):
+        """Request a reload that must see the primary as of now"""
+        if router.replicas:
+            cur.execute("SELECT pg_current_wal_lsn()::text")
+            self._min_lsn = cur.fetchone()[0]
+        self._stale.set()
+
+
+_cache: Optional[NutrientCache] = None
+
+
+def get_nutrient_cache() -> NutrientCache:
+    global _cache
+    if _cache is None:
+        _cache = NutrientCache(ttl=float(os.getenv("FOOD_NUTRIENT_CACHE_TTL", 300)))
+    return _cache
@@ -0,0 +1,50 @@
+"""Parsing of free-text Indonesian menu prices (`food_menu.harga`)"""
+import re
+from typing import Optional
+
+_MULTIPLIERS = {"rb": 1e3, "ribu": 1e3, "k": 1e3, "jt": 1e6, "juta": 1e6}
+_AMOUNT = re.compile(r"(\d[\d.,]*)\s*(ribu|rb|k|juta|jt)?\b")
+_RANGE = re.compile(r"\s*(?:–|—|-|s/d|sampai|hingga)\s*")
+
+
+def _parse_number(digits: str, has_multiplier: bool) -> float:
+    """'45.000' -> 45000, '45.000,50' -> 45000.5, '1,5' -> 1.5, '45,000' -> 45000"""
+    digits = digits.rstrip(".,")
+    if "." in digits and "," in digits:
+        # The later separator is the decimal one
+        if digits.rfind(",") > digits.rfind("."):
+            return float(digits.replace(".", "").replace(",", "."))
+        return float(digits.replace(",", ""))
+    for sep in (".", ","):
+        if sep in digits:
+            head, *groups = digits.split(sep)
+            if not has_multiplier and all(len(g) == 3 for g in groups):
+                return float(head + "".join(groups))
+            return float(digits.replace(",", ".")) if len(groups) == 1 else float(head + "".join(groups))
+    return float(digits)
+
+
+def parse_harga(text: Optional[str]) -> Optional[float]:
+    """Price in rupiah from strings like 'Rp 45.000', 'Rp45rb', '1,5 jt' or 'Rp 30.000 - 40.000'
+
+    Ranges resolve to their upper bound, so budget checks stay conservative.
+    Returns None when no amount can be found.
+    """
+    if text is None:
+        return None
+    s = text.lower().replace("rp.", "").replace("rp", "").replace("idr", "").strip()
+    if s in ("gratis", "free"):
+        return 0.0
+    s = re.sub(r"[.,]-$", "", s)
+
+    amounts = []
+    for part in _RANGE.split(s):
+        match = _AMOUNT.search(part)
+        if not match:
+            continue
+        digits, unit = match.groups()
+        try:
+            amounts.append(_parse_number(digits, unit is not None) * _MULTIPLIERS.get(unit, 1))
+        except ValueError:
+            continue
+    return max(amounts) if amounts else None
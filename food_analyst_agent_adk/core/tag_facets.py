@@ -0,0 +1,75 @@
+"""Tag facets (menu counts per cocok_untuk tag)
+
+Reads the trigger-maintained `food_menu_tag_counts` summary table
+(scripts/9_tag_index.py), so a facet lookup costs one small index scan no matter
+how large food_menu grows. Before the migration has run it falls back to an
+unnest() scan of food_menu.
+"""
+import threading
+from typing import Any, Dict
+
+import psycopg2
+
+from agent_core.replicas import get_replica_router
+
+_conn = None
+_conn_target = None
+_conn_lock = threading.Lock()
+
+SUMMARY_SQL = """
+    SELECT tag, menu_count
+    FROM food_menu_tag_counts
+    WHERE menu_count >= %(min_count)s AND tag ILIKE %(pattern)s
+    ORDER BY menu_count DESC, tag
+    LIMIT %(limit)s
+"""
+
+SCAN_SQL = """
+    SELECT tag, count(*) AS menu_count
+    FROM food_menu, LATERAL (SELECT DISTINCT unnest(cocok_untuk) AS tag) t
+    WHERE tag ILIKE %(pattern)s
+    GROUP BY tag
+    HAVING count(*) >= %(min_count)s
+    ORDER BY menu_count DESC, tag
+    LIMIT %(limit)s
+"""
+
+
+def _connection():
+    """One small autocommit read connection per process, reopened if it drops or
+    its replica falls behind (agent_core/replicas.py)"""
+    global _conn, _conn_target
+    router = get_replica_router()
+    if _conn is not None and not _conn.closed and not router.should_keep(_conn_target):
+        _conn.close()
+    if _conn is None or _conn.closed:
+        _conn, _conn_target = router.connect_for_reads()
+    return _conn
+
+
+def get_tag_facets(prefix: str = "", min_count: int = 1, limit: int = 100) -> Dict[str, Any]:
+    """Tags ordered by how many menus carry them
+
+    Args:
+        prefix: Only tags starting with this text (case-insensitive)
+        min_count: Hide tags on fewer menus than this
+        limit: Maximum number of tags returned
+    """
+    params = {
+        "pattern": prefix.replace("%", r"\%").replace("_", r"\_") + "%",
+        "min_count": min_count,
+        "limit": limit
+    }
+    with _conn_lock:
+        with _connection().cursor() as cur:
+            try:
+                cur.execute(SUMMARY_SQL, params)
+                source = "summary"
+            except psycopg2.errors.UndefinedTable:
+                cur.execute(SCAN_SQL, params)
+                source = "scan"
+            rows = cur.fetchall()
+    return {
+        "tags": [{"tag": tag, "menu_count": count} for tag, count in rows],
+        "source": source
+    }
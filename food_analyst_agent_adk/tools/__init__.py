@@ -1,3 +1,6 @@
 from .query_food import query_food
+from .query_nutrition import query_nutrition
+from .plan_meals import plan_meals
+from .query_food_stats import query_food_stats
 
-__all__ = ['query_food']
+__all__ = ['query_food', 'query_nutrition', 'plan_meals', 'query_food_stats']
@@ -0,0 +1,62 @@
+"""Meal Plan Tool for ADK - optimizes a day's menu over every menu in the database"""
+from typing import Dict, Any
+
+
+def plan_meals(
+    kalori: int = 2000,
+    protein: int = 60,
+    budget: int = 0,
+    slots: str = "Sarapan, Makan Siang, Makan Malam",
+    max_lemak: int = 0
+) -> Dict[str, Any]:
+    """
+    Build a day's meal plan (one menu per slot) that hits calorie and protein targets within a budget.
+
+    Args:
+        kalori: Daily calorie target in kcal (default: 2000)
+        protein: Minimum daily protein in grams, 0 to ignore (default: 60)
+        budget: Maximum total price in rupiah, e.g. 100000, 0 for no budget (default: 0)
+        slots: Comma-separated meal slots matched against cocok_untuk,
+            e.g. "Sarapan, Makan Siang" (default: "Sarapan, Makan Siang, Makan Malam")
+        max_lemak: Maximum daily fat in grams, 0 to ignore (default: 0)
+
+    Returns:
+        Dictionary containing:
+            - feasible: Whether a plan within the budget was found
+            - approximate: True when the search was pruned, so a better plan may exist;
+              present the plan as a good fit, not the best possible one
+            - plan: One entry per slot with the menu, price and nutrients
+            - totals: Summed nutrients of the plan
+            - total_harga_rp: Total price in rupiah of the menus with a known price
+            - harga_unknown_slots: Slots whose menu has no known price (not in the total)
+            - untagged_slots: Slots with no tagged menus (any menu was allowed)
+            - success: Boolean indicating if planning ran successfully
+            - error: Error message if unsuccessful
+    """
+    try:
+        from ..core.meal_planner import MealPlanner
+        from ..core.nutrient_cache import get_nutrient_cache
+
+        slot_list = [slot.strip() for slot in slots.split(",") if slot.strip()]
+        if kalori <= 0:
+            raise ValueError("kalori must be positive")
+        if not slot_list:
+            raise ValueError("at least one slot is required")
+
+        result = MealPlanner(get_nutrient_cache().get()).plan(
+            slot_list,
+            kalori=kalori,
+            protein=protein,
+            budget=budget or None,
+            max_lemak=max_lemak or None
+        )
+        result["success"] = True
+        return result
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "feasible": False,
+            "plan": []
+        }
@@ -1,42 +1,135 @@
 """Food Query Tool for ADK - Indonesian Menu Analysis"""
+import math
 import os
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Optional
 
+from google.adk.tools.tool_context import ToolContext
 
-def query_food(query: str, top_k: int = 3) -> Dict[str, Any]:
+
+def query_food(
+    query: str,
+    top_k: int = 3,
+    diversify: Optional[bool] = None,
+    min_harga: int = 0,
+    max_harga: int = 0,
+    tags: str = "",
+    match_all_tags: bool = True,
+    tool_context: Optional[ToolContext] = None
+) -> Dict[str, Any]:
     """
     Query the food database to retrieve relevant Indonesian menus based on preferences.
 
     Args:
         query: The food preference, dietary requirement, or menu description
         top_k: Number of relevant menus to retrieve (default: 3)
+        diversify: Set to True for broad questions so near-identical dishes
+            (e.g. several nasi goreng variants) don't fill every slot, False to
+            keep the plain similarity order (default: FOOD_MMR_ENABLED)
+        min_harga: Minimum price in rupiah, e.g. 20000; 0 for no minimum (default: 0)
+        max_harga: Maximum price in rupiah, e.g. 30000 for "di bawah 30 ribu"; 0 for no maximum (default: 0)
+        tags: Comma-separated cocok_untuk tags to filter on, exactly as stored,
+            e.g. "Sarapan, Vegetarian" (default: no tag filter)
+        match_all_tags: True requires every tag, False accepts menus with any of them (default: True)
 
     Returns:
         Dictionary containing:
             - query: The original query
             - retrieved_menus: List of retrieved menus with nutritional info
             - context: Formatted context string from retrieved menus
+            - context_tokens: Estimated tokens of the full vs. budgeted context
             - success: Boolean indicating if the query was successful
             - error: Error message if unsuccessful
+            - memoized: True when served from this session's earlier results
+            - stale: True when the database was unavailable and the menus come from
+              an earlier result or the in-memory index (degraded_source says which)
     """
+    from agent_core.memo import memoized_call, normalize_query
+    from agent_core.metrics import instrument_tool
+    from agent_core.resilience import call_with_breaker
+
+    tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    key_parts = {
+        "query": normalize_query(query),
+        "top_k": top_k,
+        "diversify": diversify,
+        "min_harga": min_harga,
+        "max_harga": max_harga,
+        "tags": tag_list,
+        "match_all_tags": match_all_tags
+    }
+
+    # Repeated calls in a session are served from session state until food_menu changes;
+    # database failures degrade to stale results instead of blocking
+    return instrument_tool("query_food", lambda: memoized_call(
+        tool_context,
+        state_key="query_food_memo",
+        table="food_menu",
+        key_parts=key_parts,
+        compute=lambda: call_with_breaker(
+            "food_menu",
+            "query_food",
+            key_parts,
+            compute=lambda: _query_food(query, top_k, diversify, min_harga, max_harga, tag_list, match_all_tags),
+            fallback=lambda: _query_food_in_memory(query, top_k, min_harga, max_harga, tag_list, match_all_tags),
+            unavailable={"query": query, "retrieved_menus": [], "context": ""}
+        ),
+        max_entries=int(os.getenv("FOOD_MEMO_MAX_ENTRIES", 16))
+    ))
+
+
+def _query_food(
+    query: str,
+    top_k: int,
+    diversify: Optional[bool],
+    min_harga: int,
+    max_harga: int,
+    tags: List[str],
+    match_all_tags: bool
+) -> Dict[str, Any]:
+    """Uncached query_food: retrieve, then build the budgeted context
+
+    Database failures are raised for call_with_breaker; other errors become an
+    unsuccessful result.
+    """
+    from agent_core.resilience import is_database_failure
+
     try:
         from ..core import FoodPipeline
+        from agent_core.context_builder import ContextBuilder
+        from agent_core.metrics import PIPELINE_STAGE_SECONDS
 
         # Initialize food pipeline
         food_pipeline = FoodPipeline()
 
         # Retrieve similar menus
-        retrieved_menus = food_pipeline.retrieve_similar_menus(query, top_k=top_k)
-
-        # Close the connection
-        food_pipeline.close()
+        # None defers to the pipeline default (FOOD_MMR_ENABLED)
+        # 0 means no price bound
+        try:
+            retrieved_menus = food_pipeline.retrieve_similar_menus(
+                query,
+                top_k=top_k,
+                diversify=diversify,
+                min_harga=min_harga or None,
+                max_harga=max_harga or None,
+                tags=tags or None,
+                match_all_tags=match_all_tags
+            )
+        finally:
+            # Close the connection
+            food_pipeline.close()
 
-        # Build context from retrieved menus - CHANGED FORMAT
-        context = "\n\n".join([
-            f"""Menu: {menu['nama_menu']}
+        # Build context from retrieved menus, trimmed to the token budget.
+        # Nutrition facts stay in the header; only the description is ranked/trimmed.
+        start = time.perf_counter()
+        builder = ContextBuilder(
+            food_pipeline.embedding_model, int(os.getenv("FOOD_CONTEXT_TOKEN_BUDGET", 800)),
+            model_name=food_pipeline.model_name
+        )
+        context, context_stats = builder.build(food_pipeline.last_query_embedding, [
+            (f"""Menu: {menu['nama_menu']}
 Kategori: {menu['kategori']}
 Asal: {menu['asal']}
-Deskripsi: {menu['deskripsi']}
 Nutrisi per porsi:
   - Kalori: {menu['kalori']} kcal
   - Protein: {menu['protein']}g
@@ -46,9 +139,11 @@ Nutrisi per porsi:
 Tingkat Kesehatan: {menu['tingkat_kesehatan']}
 Harga: {menu['harga']}
 Cocok untuk: {', '.join(menu['cocok_untuk'])}
-Similarity Score: {menu['similarity']:.2f}"""
+Similarity Score: {menu['similarity']:.2f}
+Deskripsi:""", menu['deskripsi'], menu['id'])
             for menu in retrieved_menus
         ])
+        PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - start, stage="format")
 
         return {
             "query": query,
@@ -64,11 +159,14 @@ Similarity Score: {menu['similarity']:.2f}"""
                 for menu in retrieved_menus
             ],
             "context": context,
+            "context_tokens": context_stats,
             "success": True,
             "num_results": len(retrieved_menus)
         }
 
     except Exception as e:
+        if is_database_failure(e):
+            raise
         return {
             "query": query,
             "success": False,
@@ -76,3 +174,92 @@ Similarity Score: {menu['similarity']:.2f}"""
             "retrieved_menus": [],
             "context": ""
         }
+
+
+_fallback_encoders: Dict[str, Any] = {}
+
+
+def _query_food_in_memory(
+    query: str,
+    top_k: int,
+    min_harga: int,
+    max_harga: int,
+    tags: List[str],
+    match_all_tags: bool
+) -> Optional[Dict[str, Any]]:
+    """Degraded query_food without PostgreSQL
+
+    Ranks against the embedding snapshot (FOOD_SNAPSHOT_DIR) and describes the
+    hits from the already-loaded nutrient matrix. Returns None when either is
+    missing. Descriptions aren't held in memory, so the context is facts only.
+    """
+    from agent_core.encode_scheduler import get_encode_scheduler
+    from ..core.nutrient_cache import get_nutrient_cache
+    from agent_core.snapshot import get_snapshot_store
+
+    snapshot_dir = os.getenv("FOOD_SNAPSHOT_DIR")
+    snapshot = get_snapshot_store(snapshot_dir, "food_menu").current() if snapshot_dir else None
+    matrix = get_nutrient_cache().peek()
+    if snapshot is None or matrix is None:
+        return None
+
+    # Queries must be encoded by the model the snapshot was exported with
+    model_name = snapshot.header.get("model", "all-MiniLM-L6-v2")
+    if model_name not in _fallback_encoders:
+        from sentence_transformers import SentenceTransformer
+        _fallback_encoders[model_name] = SentenceTransformer(model_name, device='cpu')
+
+    # Over-fetch so the filters still leave top_k menus
+    filtered = bool(min_harga or max_harga or tags)
+    query_embedding = get_encode_scheduler().encode(_fallback_encoders[model_name], query)
+    hits = snapshot.search(query_embedding, top_k * 10 if filtered else top_k)
+
+    menus = []
+    for menu_id, similarity in hits:
+        row = matrix.row_of(menu_id)
+        if row is None:
+            continue
+        price = matrix.harga_rp[row]
+        if (min_harga or max_harga) and math.isnan(price):
+            continue
+        if (min_harga and price < min_harga) or (max_harga and price > max_harga):
+            continue
+        if tags:
+            menu_tags = set(matrix.cocok_untuk[row])
+            if not (set(tags) <= menu_tags if match_all_tags else set(tags) & menu_tags):
+                continue
+        menus.append((row, similarity))
+        if len(menus) == top_k:
+            break
+
+    context = "\n\n".join(f"""Menu: {matrix.names[row]}
+Kategori: {matrix.kategori[row]}
+Asal: {matrix.asal[row]}
+Nutrisi per porsi:
+  - Kalori: {matrix.describe_value(row, 'kalori')} kcal
+  - Protein: {matrix.describe_value(row, 'protein')}g
+  - Lemak: {matrix.describe_value(row, 'lemak')}g
+  - Karbohidrat: {matrix.describe_value(row, 'karbohidrat')}g
+  - Serat: {matrix.describe_value(row, 'serat')}g
+Tingkat Kesehatan: {matrix.tingkat_kesehatan[row]}
+Harga: {matrix.harga[row]}
+Cocok untuk: {', '.join(matrix.cocok_untuk[row])}
+Similarity Score: {similarity:.2f}""" for row, similarity in menus)
+
+    return {
+        "query": query,
+        "retrieved_menus": [
+            {
+                "nama": matrix.names[row],
+                "kalori": matrix.describe_value(row, "kalori"),
+                "protein": matrix.describe_value(row, "protein"),
+                "kesehatan": matrix.tingkat_kesehatan[row],
+                "harga": matrix.harga[row],
+                "similarity": float(similarity)
+            }
+            for row, similarity in menus
+        ],
+        "context": context,
+        "success": True,
+        "num_results": len(menus)
+    }
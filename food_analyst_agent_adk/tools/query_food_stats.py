@@ -0,0 +1,48 @@
+"""Food Stats Tool for ADK - aggregate questions answered from materialized views"""
+from typing import Dict, Any
+
+
+def query_food_stats(
+    group_by: str = "kategori",
+    value: str = "",
+    sort_by: str = "avg_kalori",
+    ascending: bool = False,
+    limit: int = 10
+) -> Dict[str, Any]:
+    """
+    Answer aggregate questions about the menu database, per kategori, asal or tingkat_kesehatan.
+
+    Args:
+        group_by: Dimension to group by: "kategori", "asal" or "tingkat_kesehatan" (default: "kategori")
+        value: One group to look up, e.g. "Jawa Timur" or "Sup/Kuah"; empty for all groups (default: "")
+        sort_by: Column to order all groups by: menu_count, avg_kalori, avg_protein, avg_lemak,
+            avg_karbohidrat, avg_serat, avg_garam, avg_harga_rp or avg_health_score (default: avg_kalori)
+        ascending: Order lowest first (default: False)
+        limit: Maximum number of groups when listing all (default: 10)
+
+    Returns:
+        Dictionary containing:
+            - group_by: The requested dimension
+            - groups: Per-group averages, healthiest_menus and highest_protein_menus
+            - refreshed_at: When the statistics were last refreshed
+            - success: Boolean indicating if the lookup was successful
+            - error: Error message if unsuccessful
+
+    Example questions: "rata-rata kalori per kategori", "menu paling sehat dari Jawa Timur".
+    """
+    try:
+        from ..core.food_stats import lookup_stats
+
+        result = lookup_stats(group_by, value=value, sort_by=sort_by, ascending=ascending, limit=limit)
+        result["success"] = True
+        if value and not result["groups"]:
+            result["error"] = f"No {group_by} named '{value}'"
+        return result
+
+    except Exception as e:
+        return {
+            "group_by": group_by,
+            "success": False,
+            "error": str(e),
+            "groups": []
+        }
@@ -0,0 +1,66 @@
+"""Nutrition Analytics Tool for ADK - vectorized over every menu"""
+from typing import Dict, Any
+
+
+def query_nutrition(
+    action: str,
+    metric: str = "protein",
+    per: str = "",
+    menus: str = "",
+    top_n: int = 5,
+    ascending: bool = False
+) -> Dict[str, Any]:
+    """
+    Analyze nutrition across ALL Indonesian menus in the database (not just search results).
+
+    Args:
+        action: One of:
+            - "rank": menus ordered by a nutrient, e.g. highest protein or protein per kcal
+            - "compare": side-by-side nutrients and daily value % for specific menus
+            - "daily_values": daily value % of one menu (2000 kcal diet)
+        metric: Nutrient to rank by: kalori, protein, lemak, karbohidrat, serat or garam (default: protein)
+        per: Optional nutrient to divide by, e.g. "kalori" for "protein per kcal" (default: none)
+        menus: Comma-separated menu names for "compare" / "daily_values", e.g. "Rendang Daging, Sate Ayam"
+        top_n: Number of menus returned by "rank" (default: 5)
+        ascending: Rank lowest first, e.g. lowest kalori (default: False)
+
+    Returns:
+        Dictionary containing:
+            - action: The requested action
+            - result: Ranking, comparison or daily values
+            - num_menus: Number of menus analyzed
+            - success: Boolean indicating if the analysis was successful
+            - error: Error message if unsuccessful
+    """
+    try:
+        from ..core.nutrient_cache import get_nutrient_cache
+
+        matrix = get_nutrient_cache().get()
+        names = [name.strip() for name in menus.split(",") if name.strip()]
+
+        if action == "rank":
+            result = matrix.rank(metric, per=per or None, top_n=top_n, ascending=ascending)
+        elif action == "compare":
+            result = matrix.compare(names)
+        elif action == "daily_values":
+            if not names:
+                raise ValueError("daily_values needs a menu name in 'menus'")
+            row = matrix.find(names[0])
+            result = matrix.describe(row) if row is not None else {"error": "Menu not found"}
+        else:
+            raise ValueError(f"Unknown action '{action}', expected rank, compare or daily_values")
+
+        return {
+            "action": action,
+            "result": result,
+            "num_menus": len(matrix),
+            "success": True
+        }
+
+    except Exception as e:
+        return {
+            "action": action,
+            "success": False,
+            "error": str(e),
+            "result": None
+        }
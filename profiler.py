@@ -0,0 +1,93 @@
+"""In-process stack-sampling profiler for custom_server.py
+
+A daemon thread wakes every `interval_ms` and reads the current frame of every
+other thread (`sys._current_frames()`). It counts each stack, collapsed to one
+line as `thread;file:function;...;file:function`. The output is the input
+format of flamegraph.pl and speedscope. Nothing runs between sessions: the
+thread exists only while a profile is being taken.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Samples all threads' stacks on a timer between start() and stop()"""
+
+    def __init__(self, interval_ms: float = 10.0, max_depth: int = 128):
+        """
+        Args:
+            interval_ms: Time between samples (10 ms = 100 Hz)
+            max_depth: Innermost frames kept per stack; deeper ones are cut at the root
+        """
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            self.sampling_seconds += time.perf_counter() - start
+
+    def collapsed(self) -> str:
+        """One `stack count` line per distinct stack, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Functions by self samples (the leaf of the stack)"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": function, "samples": count, "percent": 100.0 * count / total}
+            for function, count in leaves.most_common(limit)
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        duration = (self.stopped_at or time.perf_counter()) - self.started_at
+        return {
+            "duration_s": duration,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            # Share of one core spent inside the sampler itself
+            "overhead_percent": 100.0 * self.sampling_seconds / duration if duration else 0.0
+        }
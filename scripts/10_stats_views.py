@@ -0,0 +1,206 @@
+"""
+Script 10: Materialized analytics views for the food analyst
+Run with:
+    python scripts/10_stats_views.py                  # create views + triggers
+    python scripts/10_stats_views.py --threshold 100  # refresh after 100 changed rows
+    python scripts/10_stats_views.py --watch          # refresh worker (LISTEN food_stats_stale)
+
+Creates one materialized view per dimension (kategori, asal,
+tingkat_kesehatan) with averages, price and health scores plus each group's
+healthiest and highest-protein menus. Statement-level triggers count changed
+rows via transition tables; when the count crosses the threshold they send
+`NOTIFY food_stats_stale`, and the views are refreshed CONCURRENTLY by the
+watcher (or lazily by the next query_food_stats lookup, see core/food_stats.py).
+"""
+import argparse
+import os
+import select
+import sys
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from food_analyst_agent_adk.core.food_stats import STATS_VIEWS, refresh_if_due
+
+VIEW_SQL = """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS public.{view} AS
+    SELECT
+        coalesce({column}, '(tidak diketahui)') AS group_value,
+        count(*) AS menu_count,
+        round(avg(kalori), 1) AS avg_kalori,
+        round(avg(protein), 1) AS avg_protein,
+        round(avg(lemak), 1) AS avg_lemak,
+        round(avg(karbohidrat), 1) AS avg_karbohidrat,
+        round(avg(serat), 1) AS avg_serat,
+        round(avg(garam)::numeric, 2) AS avg_garam,
+        min(kalori) AS min_kalori,
+        max(kalori) AS max_kalori,
+        {price} AS avg_harga_rp,
+        round(avg(public.food_health_score(tingkat_kesehatan)), 2) AS avg_health_score,
+        (array_agg(nama_menu ORDER BY public.food_health_score(tingkat_kesehatan) DESC,
+                   kalori ASC NULLS LAST))[1:5] AS healthiest_menus,
+        (array_agg(nama_menu ORDER BY protein DESC NULLS LAST))[1:5] AS highest_protein_menus
+    FROM public.food_menu
+    GROUP BY 1
+    WITH DATA;
+"""
+
+
+def get_db_params():
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "boilerplate"),
+        "password": os.getenv("DB_PASSWORD", "boilerplate"),
+        "database": os.getenv("DB_NAME", "boilerplate_db"),
+        "port": int(os.getenv("DB_PORT", 5432))
+    }
+
+
+def create_stats_views(threshold: int, rebuild: bool):
+    """Create the health score function, the views, the change counter and its triggers"""
+    db_params = get_db_params()
+    print(f"Connecting to database: {db_params['database']} at {db_params['host']}:{db_params['port']}")
+    conn = psycopg2.connect(**db_params)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION public.food_health_score(level text) RETURNS int AS $$
+            SELECT CASE
+                WHEN level ILIKE 'sangat baik%' THEN 4
+                WHEN level ILIKE 'baik%' THEN 3
+                WHEN level ILIKE 'sedang%' THEN 2
+                WHEN level ILIKE 'cukup%' THEN 1
+                ELSE 0
+            END
+        $$ LANGUAGE sql IMMUTABLE;
+    """)
+
+    # avg_harga_rp needs the numeric price column from scripts/8_price_column.py
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'food_menu' AND column_name = 'harga_rp'
+    """)
+    price = "round(avg(harga_rp))" if cursor.fetchone() else "NULL::numeric"
+    if price.startswith("NULL"):
+        print("  ⚠️ harga_rp missing (run scripts/8_price_column.py); avg_harga_rp will be NULL")
+
+    for column, view in STATS_VIEWS.items():
+        if rebuild:
+            cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS public.{view};")
+        cursor.execute(VIEW_SQL.format(view=view, column=column, price=price))
+        # REFRESH ... CONCURRENTLY requires a unique index
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {view}_group_value ON public.{view} (group_value);")
+        # query_food_stats matches groups case-insensitively (core/food_stats.py)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {view}_group_value_lower ON public.{view} (lower(group_value));")
+        cursor.execute(f"SELECT count(*) FROM public.{view};")
+        print(f"✓ {view}: {cursor.fetchone()[0]} groups")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.food_stats_refresh_state (
+            id boolean PRIMARY KEY DEFAULT true CHECK (id),
+            changes bigint NOT NULL DEFAULT 0,
+            threshold bigint NOT NULL,
+            refreshed_at timestamp DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        INSERT INTO public.food_stats_refresh_state (id, changes, threshold) VALUES (true, 0, %s)
+        ON CONFLICT (id) DO UPDATE SET threshold = EXCLUDED.threshold;
+    """, (threshold,))
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION public.food_stats_count_changes() RETURNS trigger AS $$
+        DECLARE
+            changed bigint;
+            total bigint;
+            limit_rows bigint;
+        BEGIN
+            -- Embedding backfills (scripts/14_reembed.py) don't change any column
+            -- the views aggregate
+            IF current_setting('rag.embedding_backfill', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'TRUNCATE' THEN
+                -- Everything changed: make the views due immediately
+                UPDATE public.food_stats_refresh_state SET changes = greatest(changes, threshold)
+                RETURNING changes, threshold INTO total, limit_rows;
+                PERFORM pg_notify('food_stats_stale', total::text);
+                RETURN NULL;
+            END IF;
+
+            SELECT count(*) INTO changed FROM changed_rows;
+            IF changed = 0 THEN
+                RETURN NULL;
+            END IF;
+            UPDATE public.food_stats_refresh_state SET changes = changes + changed
+            RETURNING changes, threshold INTO total, limit_rows;
+            -- Notify once, when this statement pushes the counter over the threshold
+            IF total >= limit_rows AND total - changed < limit_rows THEN
+                PERFORM pg_notify('food_stats_stale', total::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    # Transition tables can't be shared across events, so one trigger per event
+    triggers = {
+        "insert": "AFTER INSERT ON public.food_menu REFERENCING NEW TABLE AS changed_rows",
+        "update": "AFTER UPDATE ON public.food_menu REFERENCING NEW TABLE AS changed_rows",
+        "delete": "AFTER DELETE ON public.food_menu REFERENCING OLD TABLE AS changed_rows",
+        "truncate": "AFTER TRUNCATE ON public.food_menu",
+    }
+    for event, clause in triggers.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS food_stats_changes_{event} ON public.food_menu;")
+        cursor.execute(f"""
+            CREATE TRIGGER food_stats_changes_{event} {clause}
+            FOR EACH STATEMENT EXECUTE FUNCTION public.food_stats_count_changes();
+        """)
+    print(f"✓ Change counter installed (refresh after {threshold} changed rows)")
+
+    cursor.close()
+    conn.close()
+    print("\n✅ Food stats views are ready!")
+
+
+def watch():
+    """Refresh the views whenever the triggers report the threshold was crossed"""
+    conn = psycopg2.connect(**get_db_params())
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+    cursor.execute("LISTEN food_stats_stale;")
+    print("👀 Listening on food_stats_stale (Ctrl+C to stop)")
+
+    # Catch up on anything that crossed the threshold while nobody listened
+    if refresh_if_due():
+        print("✓ Caught up on pending changes")
+
+    while True:
+        if select.select([conn], [], [], 60) == ([], [], []):
+            continue
+        conn.poll()
+        if not conn.notifies:
+            continue
+        conn.notifies.clear()
+        start = time.perf_counter()
+        if refresh_if_due():
+            print(f"✓ Views refreshed in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialized food stats views")
+    parser.add_argument("--threshold", type=int, default=50, help="Changed rows before a refresh")
+    parser.add_argument("--rebuild", action="store_true", help="Drop and recreate the views")
+    parser.add_argument("--watch", action="store_true", help="Run the refresh worker")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch()
+    else:
+        create_stats_views(args.threshold, args.rebuild)
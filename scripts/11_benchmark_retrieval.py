@@ -0,0 +1,554 @@
+"""
+Script 11: Retrieval micro-benchmarks on synthetic corpora
+Run with:
+    python scripts/11_benchmark_retrieval.py generate --sizes 1000,10000,100000
+    python scripts/11_benchmark_retrieval.py run --sizes 1000,10000 --json bench.json
+    python scripts/11_benchmark_retrieval.py generate --backend snapshot --dir /tmp/bench --sizes 1000000
+    python scripts/11_benchmark_retrieval.py run --backend snapshot --dir /tmp/bench --sizes 1000000
+    python scripts/11_benchmark_retrieval.py compare baseline.json bench.json
+
+Corpora are random unit vectors with synthetic text. Generation is seeded per
+chunk, so every size, run and backend sees the same data. Each size gets its
+own schema (`bench_<size>`) holding `documents` and `food_menu` tables shaped
+like the real ones. The pipelines run unmodified, with `search_path` pointed at
+that schema.
+
+Backends:
+  postgres  RAGPipeline.retrieve_similar_documents / FoodPipeline.retrieve_similar_menus
+            against pgvector; recall@k is measured against an exact sequential scan
+  snapshot  In-process stand-in without a database: EmbeddingSnapshot search over
+            the same vectors (agent_core/snapshot.py), rows rebuilt from their ids
+
+Measured per size and table: encode / search / format / total latency (p50,
+p95, p99), QPS at each --concurrency level, and recall@k. `compare` exits
+non-zero when p95 latency grows or recall drops beyond the tolerances.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psycopg2
+from psycopg2.extensions import make_dsn
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'adk-first-agent'))
+from agent_core.context_builder import ContextBuilder
+from agent_core.snapshot import get_snapshot_store, write_snapshot
+
+DIM = 384
+TABLES = ["documents", "food_menu"]
+CHUNK_ROWS = 50000
+
+WORDS = [
+    "nasi", "ayam", "sapi", "ikan", "sayur", "tahu", "tempe", "sambal", "kuah", "goreng",
+    "bakar", "rebus", "pedas", "manis", "gurih", "segar", "protein", "serat", "kalori", "sehat",
+    "vector", "index", "query", "search", "database", "embedding", "model", "latency", "cache", "agent",
+    "retrieval", "context", "token", "answer", "document", "pipeline", "server", "session", "tool", "prompt",
+]
+KATEGORI = ["Nasi Goreng", "Sayuran", "Daging", "Sup/Kuah", "Snack/Side Dish", "Vegan/Vegetarian", "Fusion"]
+ASAL = ["Jawa", "Jawa Barat", "Jawa Timur", "Minangkabau", "Bali", "Sulawesi"]
+KESEHATAN = ["Sangat Baik", "Baik", "Sedang", "Cukup"]
+TAGS = ["Sarapan", "Makan Siang", "Makan Malam", "Snack", "Vegetarian", "High Protein", "Diet Sehat"]
+
+QUERIES = [
+    "menu sehat tinggi protein untuk makan siang",
+    "how does the vector index speed up search",
+    "sup kuah segar rendah kalori",
+    "cache tokens in the agent pipeline",
+    "sayur vegetarian untuk sarapan",
+    "database latency of the retrieval server",
+]
+
+
+# ============================================================================
+# SYNTHETIC DATA
+# ============================================================================
+
+def synthetic_vectors(table: str, chunk_no: int, count: int) -> np.ndarray:
+    """Unit vectors for one chunk; the seed depends only on table and chunk number"""
+    rng = np.random.default_rng((TABLES.index(table), chunk_no))
+    vectors = rng.standard_normal((count, DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_text(row_id: int, sentences: int = 4) -> str:
+    """Cheap deterministic text: word choice is a hash of the row id"""
+    out = []
+    for s in range(sentences):
+        words = [WORDS[(row_id * 7919 + s * 104729 + w * 31) % len(WORDS)] for w in range(10)]
+        out.append(" ".join(words).capitalize() + ".")
+    return " ".join(out)
+
+
+def synthetic_row(table: str, row_id: int) -> dict:
+    """Non-vector columns of one synthetic row"""
+    if table == "documents":
+        return {"id": row_id, "title": f"Synthetic document {row_id}", "content": synthetic_text(row_id)}
+    harga_rp = 8000 + (row_id * 37 % 100) * 500
+    return {
+        "id": row_id,
+        "nama_menu": f"Menu Sintetis {row_id}",
+        "kategori": KATEGORI[row_id % len(KATEGORI)],
+        "asal": ASAL[row_id % len(ASAL)],
+        "deskripsi": synthetic_text(row_id, 2),
+        "kalori": 150 + row_id * 13 % 750,
+        "protein": 3 + row_id * 7 % 42,
+        "lemak": 2 + row_id * 11 % 38,
+        "karbohidrat": 10 + row_id * 17 % 100,
+        "serat": row_id % 12,
+        "garam": round(0.2 + (row_id % 28) / 10, 1),
+        "tingkat_kesehatan": KESEHATAN[row_id % len(KESEHATAN)],
+        "harga": f"Rp {harga_rp:,}".replace(",", "."),
+        "harga_rp": harga_rp,
+        "cocok_untuk": [TAGS[row_id % len(TAGS)], TAGS[(row_id // 7) % len(TAGS)]],
+    }
+
+
+def iter_chunks(table: str, size: int):
+    """(ids, vectors) in CHUNK_ROWS pieces; ids start at 1"""
+    for chunk_no, start in enumerate(range(0, size, CHUNK_ROWS)):
+        count = min(CHUNK_ROWS, size - start)
+        yield np.arange(start + 1, start + count + 1, dtype=np.int64), synthetic_vectors(table, chunk_no, count)
+
+
+# ============================================================================
+# GENERATE
+# ============================================================================
+
+def connection_dsn(schema: str = None) -> str:
+    """DSN from DB_* variables; with a schema, every session starts on its search_path
+
+    The pipelines may reconnect (replica fail-over, reconnect after an error); a
+    startup option survives that where a SET on the first connection doesn't.
+    """
+    params = dict(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "boilerplate"),
+        password=os.getenv("DB_PASSWORD", "boilerplate"),
+        dbname=os.getenv("DB_NAME", "boilerplate_db"),
+        port=int(os.getenv("DB_PORT", 5432))
+    )
+    if schema:
+        params["options"] = f"-c search_path={schema},public"
+    return make_dsn(**params)
+
+
+def get_connection(schema: str = None):
+    """Open an autocommit connection, optionally scoped to a benchmark schema"""
+    conn = psycopg2.connect(connection_dsn(schema))
+    conn.autocommit = True
+    return conn
+
+
+def copy_row(table: str, row_id: int, vector: np.ndarray) -> str:
+    """One COPY text-format line"""
+    embedding = "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+    row = synthetic_row(table, row_id)
+    if table == "documents":
+        values = [row["id"], row["title"], row["content"], embedding]
+    else:
+        tags = "{" + ",".join(f'"{t}"' for t in row["cocok_untuk"]) + "}"
+        values = [
+            row["id"], row["nama_menu"], row["kategori"], row["asal"], row["deskripsi"],
+            row["kalori"], row["protein"], row["lemak"], row["karbohidrat"], row["serat"], row["garam"],
+            row["tingkat_kesehatan"], row["harga"], row["harga_rp"], tags, embedding
+        ]
+    return "\t".join(str(v) for v in values) + "\n"
+
+
+def generate_postgres(size: int, index: str):
+    schema = f"bench_{size}"
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    cur.execute(f"DROP TABLE IF EXISTS {schema}.documents, {schema}.food_menu")
+    cur.execute(f"""
+        CREATE TABLE {schema}.documents (
+            id bigint PRIMARY KEY,
+            title text,
+            content text,
+            embedding vector({DIM})
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE {schema}.food_menu (
+            id int PRIMARY KEY,
+            nama_menu text,
+            kategori text,
+            asal text,
+            deskripsi text,
+            kalori int4,
+            protein int4,
+            lemak int4,
+            karbohidrat int4,
+            serat int4,
+            garam float8,
+            tingkat_kesehatan text,
+            harga text,
+            harga_rp bigint,
+            cocok_untuk text[],
+            embedding vector({DIM})
+        )
+    """)
+
+    for table in TABLES:
+        start = time.perf_counter()
+        for ids, vectors in iter_chunks(table, size):
+            buf = io.StringIO("".join(copy_row(table, int(i), v) for i, v in zip(ids, vectors)))
+            cur.copy_expert(f"COPY {schema}.{table} FROM STDIN", buf)
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if index == "hnsw":
+            cur.execute(f"CREATE INDEX ON {schema}.{table} USING hnsw (embedding vector_cosine_ops)")
+        elif index == "ivfflat":
+            lists = max(1, int(np.sqrt(size)))
+            cur.execute(f"CREATE INDEX ON {schema}.{table} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})")
+        cur.execute(f"ANALYZE {schema}.{table}")
+        print(f"  ✓ {schema}.{table}: {size:,} rows loaded in {load_s:.1f}s, "
+              f"{index} index in {time.perf_counter() - start:.1f}s")
+
+    cur.close()
+    conn.close()
+
+
+def generate_snapshot(size: int, directory: str):
+    target = os.path.join(directory, f"bench_{size}")
+    for table in TABLES:
+        start = time.perf_counter()
+        chunks = list(iter_chunks(table, size))
+        path = write_snapshot(
+            target, table,
+            np.concatenate([ids for ids, _ in chunks]),
+            np.vstack([vectors for _, vectors in chunks])
+        )
+        print(f"  ✓ {path}: {size:,} rows in {time.perf_counter() - start:.1f}s")
+
+
+# ============================================================================
+# RUN
+# ============================================================================
+
+def percentiles(values) -> dict:
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return {}
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+    }
+
+
+def sections_for(table: str, rows: list) -> list:
+    """The (header, body) pairs query_rag / query_food hand to ContextBuilder"""
+    if table == "documents":
+        return [(f"Document: {row['title']}", row["content"]) for row in rows]
+    return [
+        (f"Menu: {row['nama_menu']}\nKategori: {row['kategori']}\nKalori: {row['kalori']} kcal\n"
+         f"Protein: {row['protein']}g\nHarga: {row['harga']}\nDeskripsi:", row["deskripsi"])
+        for row in rows
+    ]
+
+
+class PostgresTarget:
+    """The real pipeline for one table, pointed at a benchmark schema"""
+
+    def __init__(self, table: str, schema: str, top_k: int, rerank: bool):
+        # Reads stay on the primary: replicas may not have the benchmark schema
+        dsn = connection_dsn(schema)
+        if table == "documents":
+            from rag_agent.core.rag_pipeline import RAGPipeline
+            self.pipeline = RAGPipeline(primary_dsn=dsn, replica_dsns=[])
+            if not rerank:
+                self.pipeline.reranker = None
+            # Always search the schema's table, whatever RAG_SHARDS says
+            self.pipeline.sharded_searcher = None
+        else:
+            from food_analyst_agent_adk.core.food_pipeline import FoodPipeline
+            self.pipeline = FoodPipeline(primary_dsn=dsn, replica_dsns=[])
+        # Always measure pgvector, whatever *_SNAPSHOT_DIR says
+        self.pipeline.snapshot_store = None
+        self.table = table
+        self.schema = schema
+        self.top_k = top_k
+        self.rerank = rerank
+        self.embedding_model = self.pipeline.embedding_model
+        self._exact_conn = None
+
+    def search(self, query: str):
+        """(rows, timings, query_embedding)"""
+        if self.table == "documents":
+            rows = self.pipeline.retrieve_similar_documents(query, top_k=self.top_k)
+        else:
+            rows = self.pipeline.retrieve_similar_menus(query, top_k=self.top_k, diversify=False)
+        return rows, dict(self.pipeline.last_timings), self.pipeline.last_query_embedding
+
+    def exact_ids(self, query_embedding) -> list:
+        """Ground truth: the same ORDER BY with index scans disabled"""
+        if self._exact_conn is None:
+            self._exact_conn = get_connection(self.schema)
+            with self._exact_conn.cursor() as cur:
+                cur.execute("SET enable_indexscan = off")
+                cur.execute("SET enable_bitmapscan = off")
+        embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
+        with self._exact_conn.cursor() as cur:
+            cur.execute(
+                f"SELECT id FROM {self.table} ORDER BY embedding <=> %s::vector LIMIT %s",
+                (embedding_str, self.top_k)
+            )
+            return [row[0] for row in cur.fetchall()]
+
+    def clone(self):
+        """A worker with its own pipeline (and connection), built the same way"""
+        return PostgresTarget(self.table, self.schema, self.top_k, self.rerank)
+
+    def close(self):
+        self.pipeline.close()
+        if self._exact_conn is not None:
+            self._exact_conn.close()
+
+
+class SnapshotTarget:
+    """In-process stand-in: encode, exact search over the mapped snapshot, rebuild rows"""
+
+    _model = None
+
+    def __init__(self, table: str, directory: str, top_k: int):
+        if SnapshotTarget._model is None:
+            from sentence_transformers import SentenceTransformer
+            SnapshotTarget._model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+        self.embedding_model = SnapshotTarget._model
+        self.snapshot = get_snapshot_store(directory, table).current()
+        if self.snapshot is None:
+            raise FileNotFoundError(f"No {table} snapshot in {directory}; run generate --backend snapshot")
+        self.table = table
+        self.top_k = top_k
+
+    def search(self, query: str):
+        start = time.perf_counter()
+        query_embedding = self.embedding_model.encode(query)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        hits = self.snapshot.search(query_embedding, self.top_k)
+        rows = [{**synthetic_row(self.table, row_id), "similarity": sim} for row_id, sim in hits]
+        search_ms = (time.perf_counter() - start) * 1000
+        return rows, {"encode_ms": encode_ms, "search_ms": search_ms}, query_embedding
+
+    def exact_ids(self, query_embedding) -> list:
+        """Independent float64 brute force, as a check on the float32 snapshot path"""
+        query = np.asarray(query_embedding, dtype=np.float64)
+        query /= max(np.linalg.norm(query), 1e-12)
+        scores = np.empty(len(self.snapshot))
+        # Blockwise, so a 1M-row corpus never needs a float64 copy of the whole matrix
+        for start in range(0, len(self.snapshot), CHUNK_ROWS):
+            block = np.asarray(self.snapshot.matrix[start:start + CHUNK_ROWS], dtype=np.float64)
+            scores[start:start + len(block)] = block @ query / np.maximum(np.linalg.norm(block, axis=1), 1e-12)
+        top = np.argsort(-scores)[:self.top_k]
+        return [int(self.snapshot.ids[i]) for i in top]
+
+    def clone(self):
+        return self
+
+    def close(self):
+        pass
+
+
+def run_queries(target, queries: list, builder: ContextBuilder) -> dict:
+    """Sequential pass: per-stage latency and recall inputs"""
+    stages = {"encode_ms": [], "search_ms": [], "format_ms": [], "total_ms": []}
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        rows, timings, query_embedding = target.search(query)
+        format_start = time.perf_counter()
+        builder.build(query_embedding, sections_for(target.table, rows))
+        end = time.perf_counter()
+
+        stages["encode_ms"].append(timings.get("encode_ms", 0.0))
+        stages["search_ms"].append(timings.get("search_ms", 0.0))
+        stages["format_ms"].append((end - format_start) * 1000)
+        stages["total_ms"].append((end - start) * 1000)
+        results.append(([row["id"] for row in rows], query_embedding))
+    return {"latency_ms": {stage: percentiles(v) for stage, v in stages.items()}, "results": results}
+
+
+def measure_qps(target, queries: list, concurrency: int) -> float:
+    """Retrieval-only throughput with `concurrency` workers"""
+    workers = [target.clone() for _ in range(concurrency)]
+    shards = [queries[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda pair: [pair[0].search(q) for q in pair[1]], zip(workers, shards)))
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        if worker is not target:
+            worker.close()
+    return len(queries) / elapsed
+
+
+def run_benchmark(args) -> dict:
+    report = {
+        "meta": {
+            "backend": args.backend,
+            "top_k": args.top_k,
+            "queries": args.queries,
+            "recall_queries": args.recall_queries,
+            "concurrency": args.concurrency,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT
+            ).stdout.strip() or None,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": []
+    }
+    queries = [f"{QUERIES[i % len(QUERIES)]} {i}" for i in range(args.queries)]
+
+    for size in args.sizes:
+        for table in args.tables:
+            print(f"\n🔍 {table} @ {size:,} rows ({args.backend})")
+            if args.backend == "postgres":
+                target = PostgresTarget(table, f"bench_{size}", args.top_k, args.rerank)
+            else:
+                target = SnapshotTarget(table, os.path.join(args.dir, f"bench_{size}"), args.top_k)
+            builder = ContextBuilder(target.embedding_model, args.token_budget)
+
+            target.search(queries[0])  # Warm-up: model, connection, index pages
+            sequential = run_queries(target, queries, builder)
+
+            recalls = []
+            for approx_ids, query_embedding in sequential["results"][:args.recall_queries]:
+                exact = target.exact_ids(query_embedding)
+                if exact:
+                    recalls.append(len(set(approx_ids) & set(exact)) / len(exact))
+
+            qps = {str(c): measure_qps(target, queries, c) for c in args.concurrency}
+            target.close()
+
+            result = {
+                "size": size,
+                "table": table,
+                "latency_ms": sequential["latency_ms"],
+                "qps": qps,
+                f"recall_at_{args.top_k}": float(np.mean(recalls)) if recalls else None,
+            }
+            report["results"].append(result)
+
+            total = result["latency_ms"]["total_ms"]
+            print(f"  ⏱️  total p50 {total['p50']:.1f} / p95 {total['p95']:.1f} / p99 {total['p99']:.1f} ms")
+            for stage in ("encode_ms", "search_ms", "format_ms"):
+                print(f"     {stage:<10} p50 {result['latency_ms'][stage]['p50']:.2f} ms")
+            print("  🚀 QPS: " + ", ".join(f"c={c}: {v:.1f}" for c, v in qps.items()))
+            if recalls:
+                print(f"  🎯 recall@{args.top_k}: {np.mean(recalls):.3f}")
+    return report
+
+
+# ============================================================================
+# COMPARE
+# ============================================================================
+
+def compare(baseline_path: str, current_path: str, latency_tolerance: float, recall_tolerance: float) -> int:
+    """Print per-result deltas; return the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    base = {(r["size"], r["table"]): r for r in baseline["results"]}
+    regressions = 0
+    for result in current["results"]:
+        key = (result["size"], result["table"])
+        if key not in base:
+            continue
+        old = base[key]
+        print(f"\n{result['table']} @ {result['size']:,}")
+        for stage, stats in result["latency_ms"].items():
+            old_p95 = old["latency_ms"].get(stage, {}).get("p95")
+            if not old_p95 or not stats:
+                continue
+            change = stats["p95"] / old_p95 - 1
+            flag = change > latency_tolerance
+            regressions += flag
+            print(f"  {'❌' if flag else '✓'} {stage:<10} p95 {old_p95:.2f} → {stats['p95']:.2f} ms ({change:+.0%})")
+        for key_name in result:
+            if key_name.startswith("recall_at_") and result[key_name] is not None and old.get(key_name) is not None:
+                drop = old[key_name] - result[key_name]
+                flag = drop > recall_tolerance
+                regressions += flag
+                print(f"  {'❌' if flag else '✓'} {key_name} {old[key_name]:.3f} → {result[key_name]:.3f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval micro-benchmarks on synthetic corpora")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def int_list(value):
+        return [int(v) for v in value.split(",")]
+
+    gen = sub.add_parser("generate", help="Create synthetic corpora")
+    gen.add_argument("--sizes", type=int_list, default=[1000, 10000, 100000])
+    gen.add_argument("--backend", choices=["postgres", "snapshot"], default="postgres")
+    gen.add_argument("--index", choices=["hnsw", "ivfflat", "none"], default="hnsw")
+    gen.add_argument("--dir", default="bench_snapshots", help="Snapshot directory (snapshot backend)")
+
+    run = sub.add_parser("run", help="Benchmark the generated corpora")
+    run.add_argument("--sizes", type=int_list, default=[1000, 10000, 100000])
+    run.add_argument("--backend", choices=["postgres", "snapshot"], default="postgres")
+    run.add_argument("--dir", default="bench_snapshots", help="Snapshot directory (snapshot backend)")
+    run.add_argument("--tables", type=lambda v: v.split(","), default=TABLES)
+    run.add_argument("--queries", type=int, default=200)
+    run.add_argument("--recall-queries", type=int, default=50, help="Queries checked against exact search")
+    run.add_argument("--concurrency", type=int_list, default=[1, 4, 16])
+    run.add_argument("--top-k", type=int, default=5)
+    run.add_argument("--token-budget", type=int, default=1000)
+    run.add_argument("--rerank", action="store_true", help="Keep the cross-encoder stage if configured")
+    run.add_argument("--json", help="Write the report to this file")
+
+    cmp = sub.add_parser("compare", help="Flag regressions between two reports")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--latency-tolerance", type=float, default=0.15, help="Allowed p95 growth (0.15 = 15%%)")
+    cmp.add_argument("--recall-tolerance", type=float, default=0.01, help="Allowed recall drop")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        for size in args.sizes:
+            print(f"🧪 Generating {size:,}-row corpora ({args.backend})...")
+            if args.backend == "postgres":
+                generate_postgres(size, args.index)
+            else:
+                generate_snapshot(size, args.dir)
+        print("\n✅ Corpora ready")
+    elif args.command == "run":
+        report = run_benchmark(args)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n📄 Report written to {args.json}")
+        print("\n✅ Benchmark complete")
+    else:
+        regressions = compare(args.baseline, args.current, args.latency_tolerance, args.recall_tolerance)
+        if regressions:
+            print(f"\n❌ {regressions} regressions")
+            sys.exit(1)
+        print("\n✅ No regressions")
@@ -0,0 +1,157 @@
+"""
+Script 12: End-to-end load test for custom_server.py
+Run with:
+    ADK_STUB_LLM=1 python custom_server.py                    # server on the stub model
+    python scripts/12_load_harness.py --sessions 200 --concurrency 100 --turns 3
+    python scripts/12_load_harness.py --app food_analyst_agent_adk --json load.json
+
+Each virtual user creates a session (POST /apps/<app>/users/<user>/sessions)
+and sends --turns messages through POST /run. The split of each turn comes from
+the returned events:
+  llm        sum of `stub_llm_ms` reported by StubLlm (agent_core/stub_llm.py)
+  tool       functionResponse event timestamp minus its functionCall timestamp
+  framework  the rest: HTTP, session storage, event handling
+
+Against real Gemini the llm column stays empty and its time lands in framework.
+rag_agent is not under custom_server.py's agents dir; for it, run
+`ADK_STUB_LLM=1 adk api_server` in adk-first-agent/ and pass --app rag_agent.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+
+QUESTIONS = [
+    "Rekomendasi menu tinggi protein untuk muscle building",
+    "Menu vegetarian sehat apa yang tersedia?",
+    "Berapa kalori dan protein dalam Nasi Goreng?",
+    "Saya sedang diet, menu apa yang cocok untuk turun berat?",
+    "What is machine learning?",
+    "How does renewable energy work?",
+]
+
+
+def _get(d: dict, snake: str, camel: str):
+    """Event JSON may be snake_case or camelCase depending on the ADK version"""
+    return d.get(camel, d.get(snake))
+
+
+def split_turn(events: list, total_ms: float) -> dict:
+    """Attribute a turn's wall time to llm / tool / framework from its events"""
+    llm_ms = tool_ms = 0.0
+    call_times = {}
+    for event in events:
+        metadata = _get(event, "custom_metadata", "customMetadata") or {}
+        llm_ms += metadata.get("stub_llm_ms", 0.0)
+        for part in (event.get("content") or {}).get("parts") or []:
+            call = _get(part, "function_call", "functionCall")
+            response = _get(part, "function_response", "functionResponse")
+            if call:
+                call_times[call.get("id") or call.get("name")] = event.get("timestamp")
+            if response:
+                started = call_times.get(response.get("id") or response.get("name"))
+                if started is not None and event.get("timestamp") is not None:
+                    tool_ms += (event["timestamp"] - started) * 1000
+    return {
+        "total_ms": total_ms,
+        "llm_ms": llm_ms,
+        "tool_ms": tool_ms,
+        "framework_ms": max(0.0, total_ms - llm_ms - tool_ms),
+    }
+
+
+async def run_user(client: httpx.AsyncClient, app: str, user_no: int, turns: int, samples: list, errors: list):
+    user_id = f"load_user_{user_no}"
+    try:
+        response = await client.post(f"/apps/{app}/users/{user_id}/sessions", json={})
+        response.raise_for_status()
+        session_id = response.json()["id"]
+    except Exception as e:
+        errors.append(f"session: {e}")
+        return
+
+    for turn in range(turns):
+        question = QUESTIONS[(user_no + turn) % len(QUESTIONS)]
+        start = time.perf_counter()
+        try:
+            response = await client.post("/run", json={
+                "appName": app,
+                "userId": user_id,
+                "sessionId": session_id,
+                "newMessage": {"role": "user", "parts": [{"text": question}]}
+            })
+            response.raise_for_status()
+            events = response.json()
+        except Exception as e:
+            errors.append(f"run: {e}")
+            continue
+        samples.append(split_turn(events, (time.perf_counter() - start) * 1000))
+
+
+async def load_test(base_url: str, app: str, sessions: int, concurrency: int, turns: int, timeout: float) -> dict:
+    samples, errors = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def bounded(user_no):
+            async with semaphore:
+                await run_user(client, app, user_no, turns, samples, errors)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(sessions)))
+        elapsed = time.perf_counter() - start
+
+    report = {
+        "app": app,
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "turns_per_session": turns,
+        "completed_turns": len(samples),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": len(samples) / elapsed if elapsed else 0.0,
+        "latency_ms": {},
+        "error_samples": errors[:5],
+    }
+    for key in ("total_ms", "llm_ms", "tool_ms", "framework_ms"):
+        values = np.array([s[key] for s in samples]) if samples else np.array([0.0])
+        report["latency_ms"][key] = {
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+            "mean": float(values.mean()),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the ADK server")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--app", default="food_analyst_agent_adk")
+    parser.add_argument("--sessions", type=int, default=200, help="Virtual users (one session each)")
+    parser.add_argument("--concurrency", type=int, default=100, help="Sessions in flight at once")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per session")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    print(f"🚀 {args.sessions} sessions x {args.turns} turns against {args.url} ({args.app}), "
+          f"concurrency {args.concurrency}")
+    report = asyncio.run(load_test(args.url, args.app, args.sessions, args.concurrency, args.turns, args.timeout))
+
+    print(f"\n✓ {report['completed_turns']} turns in {report['elapsed_s']:.1f}s "
+          f"({report['throughput_turns_per_s']:.1f} turns/s), {report['errors']} errors")
+    for key, stats in report["latency_ms"].items():
+        print(f"  {key:<13} p50 {stats['p50']:8.1f}  p95 {stats['p95']:8.1f}  p99 {stats['p99']:8.1f} ms")
+    for error in report["error_samples"]:
+        print(f"  ⚠️ {error}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Report written to {args.json}")
+    print("\n✅ Load test complete")
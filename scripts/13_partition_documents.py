@@ -0,0 +1,598 @@
+"""
+Script 13: Partitioned and sharded documents for scatter-gather search
+Run with:
+    python scripts/13_partition_documents.py partition --partitions 8              # hash(id) partitions
+    python scripts/13_partition_documents.py partition --by collection --collections news,wiki
+    python scripts/13_partition_documents.py shard --shards 4                      # schemas rag_shard_0..3
+    python scripts/13_partition_documents.py shard --dsns "host=pg1 dbname=rag;host=pg2 dbname=rag"
+    python scripts/13_partition_documents.py sync --dsns "host=pg1 dbname=rag;host=pg2 dbname=rag" --follow
+    python scripts/13_partition_documents.py verify --spec "#documents_partitioned"
+    python scripts/13_partition_documents.py verify --spec "#rag_shard_0.documents;#rag_shard_1.documents"
+
+Commands:
+- `partition` copies `documents` into `documents_partitioned`, partitioned by
+  HASH(id) or LIST(collection), and builds one HNSW index per partition.
+  It adds `documents.collection` (default 'default') if missing. The loaders
+  in first-agent/ fill it from each document's "collection" key.
+- `shard` copies `documents` into N slices (id % N). The slices go to schemas in
+  the same database (a local stand-in for several nodes), or to `documents_shard`
+  on each of the given DSNs.
+- `sync` applies the changes queued for `shard --dsns` nodes (see below).
+- `verify` runs RAGPipeline's scatter-gather (core/sharded_search.py) over a
+  RAG_SHARDS spec and checks it against the source table:
+  - row coverage, meaning every source row appears in exactly one target;
+  - recall@k against an exact sequential scan of `documents`;
+  - latency compared with a single-table HNSW search.
+
+Ingestion keeps writing to `documents`. The targets follow it through an AFTER
+trigger on `documents`, installed before the copy:
+- `documents_partitioned` and the local shard schemas are written in the same
+  transaction as the source row;
+- other nodes can't be written from a trigger, so changed ids are queued in
+  `documents_shard_outbox`. Run `sync --follow` next to ingestion (or after
+  each load) to apply them. Searches see those changes once synced.
+Drop the trigger (`documents_mirror_*`) when a target is retired.
+
+Enable in the agent with RAG_SHARDS=<spec> (printed after partition/shard).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'adk-first-agent', '.env'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'adk-first-agent'))
+from rag_agent.core.rag_pipeline import build_search_query, exact_search_ids, percentile, sample_queries
+from rag_agent.core.sharded_search import ShardedSearcher, parse_shards
+
+PARTITIONED = "documents_partitioned"
+SHARD_SCHEMA = "rag_shard_{}"
+OUTBOX = "documents_shard_outbox"
+BATCH_ROWS = 5000
+
+# Columns the targets copy; an UPDATE of anything else (e.g. a re-embedding's
+# embedding_vN backfill) doesn't touch them
+MIRRORED_COLUMNS = "title, content, embedding, collection"
+
+
+def get_connection(dsn: str = ""):
+    """Open a connection from a DSN, or from the DB_* environment variables"""
+    if dsn:
+        return psycopg2.connect(dsn)
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "boilerplate"),
+        password=os.getenv("DB_PASSWORD", "boilerplate"),
+        database=os.getenv("DB_NAME", "boilerplate_db"),
+        port=int(os.getenv("DB_PORT", 5432))
+    )
+
+
+def table_sql(table: str) -> sql.Composable:
+    return sql.Identifier(*table.split("."))
+
+
+def build_hnsw_indexes(targets: list[tuple[str, str]], m: int, ef_construction: int, jobs: int):
+    """One HNSW index per (dsn, table), built `jobs` at a time on separate connections"""
+    def build(target):
+        dsn, table = target
+        conn = get_connection(dsn)
+        conn.autocommit = True
+        cur = conn.cursor()
+        start = time.perf_counter()
+        cur.execute(sql.SQL("""
+            CREATE INDEX IF NOT EXISTS {name} ON {table}
+            USING hnsw (embedding vector_cosine_ops) WITH (m = {m}, ef_construction = {ef})
+        """).format(
+            name=sql.Identifier(f"{table.split('.')[-1]}_embedding_hnsw"),
+            table=table_sql(table),
+            m=sql.Literal(m),
+            ef=sql.Literal(ef_construction)
+        ))
+        cur.execute(sql.SQL("ANALYZE {}").format(table_sql(table)))
+        conn.close()
+        return table, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for table, seconds in pool.map(build, targets):
+            print(f"  ✓ HNSW on {table} ({seconds:.1f}s)")
+
+
+def install_mirror_trigger(cur, name: str, body: str):
+    """AFTER trigger on documents that runs `body` (plpgsql; TG_OP, OLD and NEW in scope)"""
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+        BEGIN
+            {body}
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE TRIGGER {name}
+        AFTER INSERT OR DELETE OR UPDATE OF id, {MIRRORED_COLUMNS} ON documents
+        FOR EACH ROW EXECUTE FUNCTION {name}()
+    """)
+    print(f"✓ {name} trigger keeps the copy in sync with documents")
+
+
+def add_collection_column(cur):
+    """`documents.collection`, the LIST partition key ('default' until a loader sets it)"""
+    cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS collection TEXT NOT NULL DEFAULT 'default'")
+
+
+def partition(num_partitions: int, by: str, collections: list[str], dim: int,
+              m: int, ef_construction: int, jobs: int, rebuild: bool):
+    """Copy documents into a partitioned table with per-partition HNSW indexes"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    cur.execute("SELECT to_regclass(%s)", (PARTITIONED,))
+    if cur.fetchone()[0] is not None:
+        if not rebuild:
+            print(f"❌ {PARTITIONED} already exists (use --rebuild to drop and recreate it)")
+            return
+        cur.execute("DROP TRIGGER IF EXISTS documents_mirror_partitioned ON documents")
+        cur.execute(f"DROP TABLE {PARTITIONED}")
+    add_collection_column(cur)
+
+    # Primary keys must include the partition key
+    if by == "hash":
+        cur.execute(f"""
+            CREATE TABLE {PARTITIONED} (
+                id BIGINT NOT NULL PRIMARY KEY,
+                title TEXT,
+                content TEXT,
+                embedding vector({dim}),
+                collection TEXT NOT NULL DEFAULT 'default'
+            ) PARTITION BY HASH (id)
+        """)
+        leaves = [f"{PARTITIONED}_p{i}" for i in range(num_partitions)]
+        for i, leaf in enumerate(leaves):
+            cur.execute(f"""
+                CREATE TABLE {leaf} PARTITION OF {PARTITIONED}
+                FOR VALUES WITH (MODULUS {num_partitions}, REMAINDER {i})
+            """)
+    else:
+        cur.execute(f"""
+            CREATE TABLE {PARTITIONED} (
+                id BIGINT NOT NULL,
+                title TEXT,
+                content TEXT,
+                embedding vector({dim}),
+                collection TEXT NOT NULL DEFAULT 'default',
+                PRIMARY KEY (id, collection)
+            ) PARTITION BY LIST (collection)
+        """)
+        leaves = []
+        for i, collection in enumerate(collections):
+            leaf = f"{PARTITIONED}_c{i}"
+            cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES IN ({})").format(
+                sql.Identifier(leaf), sql.Identifier(PARTITIONED), sql.Literal(collection)
+            ))
+            leaves.append(leaf)
+        leaves.append(f"{PARTITIONED}_default")
+        cur.execute(f"CREATE TABLE {PARTITIONED}_default PARTITION OF {PARTITIONED} DEFAULT")
+    print(f"✓ {PARTITIONED}: {len(leaves)} partitions by {by}")
+
+    # Writes from here on reach the copy through the trigger. An update racing
+    # the batch that copies the same row waits for it, then overwrites it.
+    key = "id" if by == "hash" else "id, collection"
+    install_mirror_trigger(cur, "documents_mirror_partitioned", f"""
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {PARTITIONED} WHERE id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {PARTITIONED} (id, {MIRRORED_COLUMNS})
+                VALUES (NEW.id, NEW.title, NEW.content, NEW.embedding, NEW.collection)
+                ON CONFLICT ({key}) DO UPDATE
+                SET title = EXCLUDED.title, content = EXCLUDED.content, embedding = EXCLUDED.embedding;
+            END IF;""")
+
+    # Copy in id order, one batch per statement; rows the trigger already wrote are kept
+    copied, last_id = 0, 0
+    while True:
+        cur.execute(f"""
+            WITH batch AS (
+                SELECT id, {MIRRORED_COLUMNS} FROM documents
+                WHERE id > %s ORDER BY id LIMIT %s
+            ), moved AS (
+                INSERT INTO {PARTITIONED} (id, {MIRRORED_COLUMNS})
+                SELECT id, {MIRRORED_COLUMNS} FROM batch
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            )
+            SELECT (SELECT COUNT(*) FROM moved), (SELECT MAX(id) FROM batch)
+        """, (last_id, BATCH_ROWS))
+        count, max_id = cur.fetchone()
+        if max_id is None:
+            break
+        copied += count
+        last_id = max_id
+        print(f"  ✓ Copied {copied:,} rows...")
+    print(f"✓ {copied:,} rows copied")
+
+    cur.execute(f"SELECT collection, COUNT(*) FROM {PARTITIONED} GROUP BY 1 ORDER BY 2 DESC")
+    per_collection = cur.fetchall()
+    if by == "collection":
+        for collection, count in per_collection:
+            print(f"  {collection}: {count:,} rows")
+        if [c for c, _ in per_collection] == ["default"]:
+            print("  ⚠️ Every row is in the default partition: set documents.collection "
+                  "(or a \"collection\" key in the loaded documents) and re-run with --rebuild")
+
+    cur.close()
+    conn.close()
+
+    print("Building per-partition HNSW indexes...")
+    build_hnsw_indexes([("", leaf) for leaf in leaves], m, ef_construction, jobs)
+    print(f'\n✅ Partitioning complete! Enable with RAG_SHARDS="#{PARTITIONED}"')
+
+
+def shard(num_shards: int, dsns: list[str], dim: int, m: int, ef_construction: int, jobs: int):
+    """Split documents by id % N into schemas (local) or onto other nodes (DSNs)"""
+    if dsns:
+        targets = [(dsn, "documents_shard") for dsn in dsns]
+    else:
+        targets = [("", f"{SHARD_SCHEMA.format(i)}.documents") for i in range(num_shards)]
+    num_shards = len(targets)
+
+    writers = []
+    for dsn, table in targets:
+        conn = get_connection(dsn)
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        if "." in table:
+            cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(table.split(".")[0])))
+        cur.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {} (
+                id BIGINT PRIMARY KEY,
+                title TEXT,
+                content TEXT,
+                embedding vector({})
+            )
+        """).format(table_sql(table), sql.Literal(dim)))
+        cur.execute(sql.SQL("TRUNCATE {}").format(table_sql(table)))
+        writers.append((conn, cur, table))
+    print(f"✓ {num_shards} shard tables ready")
+
+    # Writes from here on follow the copy: directly into the local schemas, or
+    # through the outbox for other nodes (the copy covers anything queued before it)
+    source = get_connection()
+    with source.cursor() as cur:
+        add_collection_column(cur)
+        if dsns:
+            cur.execute("DROP TRIGGER IF EXISTS documents_mirror_shards ON documents")
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {OUTBOX} (seq BIGSERIAL PRIMARY KEY, id BIGINT NOT NULL)")
+            cur.execute(f"TRUNCATE {OUTBOX}")
+            install_mirror_trigger(cur, "documents_mirror_outbox", f"""
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO {OUTBOX} (id) VALUES (OLD.id);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {OUTBOX} (id) VALUES (NEW.id);
+            END IF;""")
+        else:
+            cur.execute("DROP TRIGGER IF EXISTS documents_mirror_outbox ON documents")
+            prefix = SHARD_SCHEMA.format("")
+            install_mirror_trigger(cur, "documents_mirror_shards", f"""
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                EXECUTE format('DELETE FROM %I.documents WHERE id = $1', '{prefix}' || (OLD.id % {num_shards}))
+                USING OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                EXECUTE format('INSERT INTO %I.documents (id, title, content, embedding)
+                                VALUES ($1, $2, $3, $4)
+                                ON CONFLICT (id) DO UPDATE
+                                SET title = EXCLUDED.title, content = EXCLUDED.content,
+                                    embedding = EXCLUDED.embedding', '{prefix}' || (NEW.id % {num_shards}))
+                USING NEW.id, NEW.title, NEW.content, NEW.embedding;
+            END IF;""")
+    source.commit()
+
+    if dsns:
+        copied = _export_to_nodes(source, writers)
+    else:
+        copied = _copy_to_schemas(source, [table for _, _, table in writers])
+    source.close()
+    for conn, cur, _ in writers:
+        cur.close()
+        conn.close()
+    print(f"✓ {copied:,} rows copied")
+
+    print("Building per-shard HNSW indexes...")
+    build_hnsw_indexes(targets, m, ef_construction, jobs)
+    spec = ";".join(f"{dsn}#{table}" for dsn, table in targets)
+    print(f'\n✅ Sharding complete! Enable with RAG_SHARDS="{spec}"')
+    if dsns:
+        print(f'   Keep the nodes current with: sync --dsns "{";".join(dsns)}" --follow')
+
+
+def _copy_to_schemas(source, tables: list[str]) -> int:
+    """Copy into local shard schemas in id order, one batch per statement
+
+    Each batch reads a fresh snapshot, so a row deleted before its batch is never
+    copied. One deleted while its batch runs can still be copied after the
+    trigger's DELETE found nothing, so rows whose source is gone are removed at
+    the end.
+    """
+    num_shards = len(tables)
+    source.autocommit = True
+    cur = source.cursor()
+    # One CTE per shard, all fed from the same batch
+    inserts = sql.SQL(", ").join(
+        sql.SQL("""s{} AS (
+                INSERT INTO {} (id, title, content, embedding)
+                SELECT id, title, content, embedding FROM batch WHERE id %% {} = {}
+                ON CONFLICT (id) DO NOTHING
+            )""").format(sql.Literal(i), table_sql(table), sql.Literal(num_shards), sql.Literal(i))
+        for i, table in enumerate(tables)
+    )
+    query = sql.SQL("""
+            WITH batch AS (
+                SELECT id, title, content, embedding FROM documents
+                WHERE id > %s ORDER BY id LIMIT %s
+            ), {}
+            SELECT COUNT(*), MAX(id) FROM batch
+        """).format(inserts)
+
+    # Rows the trigger already wrote are newer; keep them
+    copied, last_id = 0, 0
+    while True:
+        cur.execute(query, (last_id, BATCH_ROWS))
+        count, max_id = cur.fetchone()
+        if max_id is None:
+            break
+        copied += count
+        last_id = max_id
+        print(f"  ✓ Copied {copied:,} rows...")
+
+    removed = 0
+    for table in tables:
+        cur.execute(sql.SQL(
+            "DELETE FROM {} s WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.id = s.id)"
+        ).format(table_sql(table)))
+        removed += cur.rowcount
+    if removed:
+        print(f"  ✓ Removed {removed:,} rows deleted from documents during the copy")
+    cur.close()
+    return copied
+
+
+def _export_to_nodes(source, writers) -> int:
+    """Stream documents to other nodes from one snapshot
+
+    Changes made during the export (deletes included) are queued in the outbox
+    and applied by `sync`.
+    """
+    num_shards = len(writers)
+    reader = source.cursor(name="shard_export")
+    reader.itersize = BATCH_ROWS
+    reader.execute("SELECT id, title, content, embedding::text FROM documents ORDER BY id")
+
+    copied = 0
+    while True:
+        rows = reader.fetchmany(BATCH_ROWS)
+        if not rows:
+            break
+        buckets = [[] for _ in range(num_shards)]
+        for row in rows:
+            buckets[row[0] % num_shards].append(row)
+        for (conn, cur, table), bucket in zip(writers, buckets):
+            if bucket:
+                # Rows sync applied since the export began are newer; keep them
+                execute_values(
+                    cur,
+                    sql.SQL("INSERT INTO {} (id, title, content, embedding) VALUES %s ON CONFLICT (id) DO NOTHING").format(
+                        table_sql(table)
+                    ).as_string(conn),
+                    bucket,
+                    template="(%s, %s, %s, %s::vector)"
+                )
+        copied += len(rows)
+        print(f"  ✓ Copied {copied:,} rows...")
+    reader.close()
+    source.commit()
+    return copied
+
+
+def sync(dsns: list[str], follow: bool, poll: float):
+    """Apply the outbox to `shard --dsns` nodes: upsert current rows, delete removed ones
+
+    The DSNs must be given in the same order as to `shard`, since row id % N picks the node.
+    Outbox entries are removed only after every node has committed, so a crash
+    re-applies them (each apply is idempotent).
+    """
+    source = get_connection()
+    nodes = [get_connection(dsn) for dsn in dsns]
+    num_shards = len(nodes)
+
+    while True:
+        applied = 0
+        while True:
+            with source.cursor() as cur:
+                cur.execute(f"SELECT seq, id FROM {OUTBOX} ORDER BY seq LIMIT %s", (BATCH_ROWS,))
+                queued = cur.fetchall()
+                if not queued:
+                    source.commit()
+                    break
+                ids = sorted({row[1] for row in queued})
+                cur.execute(
+                    "SELECT id, title, content, embedding::text FROM documents WHERE id = ANY(%s)", (ids,)
+                )
+                current = {row[0]: row for row in cur.fetchall()}
+            source.commit()
+
+            for i, node in enumerate(nodes):
+                upserts = [current[id_] for id_ in ids if id_ % num_shards == i and id_ in current]
+                deletes = [id_ for id_ in ids if id_ % num_shards == i and id_ not in current]
+                with node.cursor() as cur:
+                    if upserts:
+                        execute_values(
+                            cur,
+                            """
+                            INSERT INTO documents_shard (id, title, content, embedding) VALUES %s
+                            ON CONFLICT (id) DO UPDATE
+                            SET title = EXCLUDED.title, content = EXCLUDED.content, embedding = EXCLUDED.embedding
+                            """,
+                            upserts,
+                            template="(%s, %s, %s, %s::vector)"
+                        )
+                    if deletes:
+                        cur.execute("DELETE FROM documents_shard WHERE id = ANY(%s)", (deletes,))
+                node.commit()
+
+            with source.cursor() as cur:
+                cur.execute(f"DELETE FROM {OUTBOX} WHERE seq <= %s", (queued[-1][0],))
+            source.commit()
+            applied += len(ids)
+
+        if applied:
+            print(f"  ✓ Synced {applied:,} changed rows")
+        if not follow:
+            break
+        time.sleep(poll)
+
+    for node in nodes:
+        node.close()
+    source.close()
+    print(f"\n✅ {num_shards} nodes in sync with documents")
+
+
+def verify(spec: str, num_queries: int, top_k: int, noise: float, ef_search: int, output: str = None):
+    """Coverage, recall@k and latency of scatter-gather against the source table"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    searcher = ShardedSearcher(parse_shards(spec), ef_search=ef_search)
+    print(f"✓ {len(searcher.targets)} search targets")
+
+    # Coverage: every source row in exactly one target
+    cur.execute("SELECT COUNT(*) AS n FROM documents")
+    source_rows = cur.fetchone()["n"]
+    target_rows = {
+        target.name: target.query(sql.SQL("SELECT COUNT(*) AS n FROM {}").format(table_sql(target.table)))[0]["n"]
+        for target in searcher.targets
+    }
+    covered = sum(target_rows.values())
+
+    queries = sample_queries(cur, num_queries, noise)
+    if not queries:
+        print("❌ documents table is empty")
+        return
+
+    truth = [exact_search_ids(cur, q, top_k) for q in queries]
+
+    if ef_search:
+        cur.execute("SET hnsw.ef_search = %s", (ef_search,))
+    single_ms, sharded_ms, single_recall, sharded_recall, missing = [], [], [], [], 0
+    for embedding_str, expected in zip(queries, truth):
+        start = time.perf_counter()
+        cur.execute(build_search_query("none"), {"embedding": embedding_str, "top_k": top_k})
+        rows = cur.fetchall()
+        single_ms.append((time.perf_counter() - start) * 1000)
+        single_recall.append(len({row["id"] for row in rows} & expected) / max(1, len(expected)))
+
+        start = time.perf_counter()
+        rows, info = searcher.search(embedding_str, top_k)
+        sharded_ms.append((time.perf_counter() - start) * 1000)
+        sharded_recall.append(len({row["id"] for row in rows} & expected) / max(1, len(expected)))
+        missing += len(info["missing"])
+
+    searcher.close()
+    cur.close()
+    conn.close()
+
+    results = {
+        "spec": spec,
+        "targets": len(target_rows),
+        "source_rows": source_rows,
+        "target_rows": target_rows,
+        "coverage_ok": covered == source_rows,
+        "num_queries": len(queries),
+        "top_k": top_k,
+        "failed_target_searches": missing,
+        "single_table": {
+            "recall_at_k": round(statistics.mean(single_recall), 4),
+            "latency_ms_p50": round(percentile(single_ms, 50), 3),
+            "latency_ms_p95": round(percentile(single_ms, 95), 3),
+        },
+        "scatter_gather": {
+            "recall_at_k": round(statistics.mean(sharded_recall), 4),
+            "latency_ms_p50": round(percentile(sharded_ms, 50), 3),
+            "latency_ms_p95": round(percentile(sharded_ms, 95), 3),
+        },
+    }
+
+    print(f"\n📊 Scatter-gather verification ({len(queries)} queries, top_k={top_k})")
+    print("-" * 60)
+    print(f"  Rows: source {source_rows:,}, targets {covered:,} "
+          f"{'✓' if results['coverage_ok'] else '❌ MISMATCH'}")
+    print(f"  {'search':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name in ("single_table", "scatter_gather"):
+        stats = results[name]
+        print(f"  {name:<16}{stats['recall_at_k']:>10.3f}{stats['latency_ms_p50']:>10.2f}{stats['latency_ms_p95']:>10.2f}")
+    print("-" * 60)
+    if missing:
+        print(f"  ⚠️ {missing} target searches failed")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Report written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partitioned / sharded documents for scatter-gather search")
+    parser.add_argument("command", choices=["partition", "shard", "sync", "verify"])
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--partitions", type=int, default=8, help="Partition: number of hash partitions")
+    parser.add_argument("--by", choices=["hash", "collection"], default="hash", help="Partition: key")
+    parser.add_argument("--collections", default="", help="Partition: comma-separated collections (--by collection)")
+    parser.add_argument("--rebuild", action="store_true", help=f"Partition: drop an existing {PARTITIONED}")
+    parser.add_argument("--shards", type=int, default=4, help="Shard: number of local schemas")
+    parser.add_argument("--dsns", default="", help="Shard/sync: ';'-separated DSNs of other nodes (instead of schemas)")
+    parser.add_argument("--follow", action="store_true", help="Sync: keep applying new changes")
+    parser.add_argument("--poll", type=float, default=5.0, help="Sync: seconds between --follow passes")
+    parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW ef_construction")
+    parser.add_argument("--jobs", type=int, default=4, help="Indexes built in parallel")
+    parser.add_argument("--spec", default=os.getenv("RAG_SHARDS", ""), help="Verify: RAG_SHARDS spec")
+    parser.add_argument("--queries", type=int, default=50, help="Verify: number of sampled queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Verify: results per query")
+    parser.add_argument("--noise", type=float, default=0.02, help="Verify: query perturbation stddev")
+    parser.add_argument("--ef-search", type=int, default=0, help="Verify: hnsw.ef_search (0: server default)")
+    parser.add_argument("--output", help="Verify: write JSON results to this path")
+    args = parser.parse_args()
+
+    if args.command == "partition":
+        collections = [c.strip() for c in args.collections.split(",") if c.strip()]
+        if args.by == "collection" and not collections:
+            parser.error("--by collection needs --collections")
+        partition(args.partitions, args.by, collections, args.dim, args.m, args.ef_construction,
+                  args.jobs, args.rebuild)
+    elif args.command == "shard":
+        dsns = [d.strip() for d in args.dsns.split(";") if d.strip()]
+        shard(args.shards, dsns, args.dim, args.m, args.ef_construction, args.jobs)
+    elif args.command == "sync":
+        dsns = [d.strip() for d in args.dsns.split(";") if d.strip()]
+        if not dsns:
+            parser.error("sync needs --dsns")
+        sync(dsns, args.follow, args.poll)
+    else:
+        if not args.spec:
+            parser.error("verify needs --spec or RAG_SHARDS")
+        verify(args.spec, args.queries, args.top_k, args.noise, args.ef_search, args.output)
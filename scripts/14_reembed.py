@@ -0,0 +1,474 @@
+"""
+Script 14: Online re-embedding and zero-downtime embedding model migration
+Run with:
+    python scripts/14_reembed.py start --table documents --model paraphrase-multilingual-MiniLM-L12-v2
+    python scripts/14_reembed.py run --table documents --rows-per-second 200   # resumable; Ctrl-C is safe
+    python scripts/14_reembed.py index --table documents
+    python scripts/14_reembed.py activate --table documents                    # atomic flip
+    python scripts/14_reembed.py activate --table documents --version 1        # roll back
+    python scripts/14_reembed.py status
+    python scripts/14_reembed.py drop --table documents --version 2            # abandon, or clean up a retired one
+
+Steps (agent_core/embedding_versions.py explains how searches pick a version):
+1. `start` records the current `embedding` column as version 1, if not done yet.
+   It adds an empty `embedding_vN` column, which does not rewrite the table, and
+   registers version N as `building`. A trigger clears the new vector whenever a
+   row's source text changes.
+2. `run` fills the column in id order, in batches.
+   - Each batch's vectors and the resume cursor commit in one transaction, so a
+     killed worker continues where it stopped.
+   - --rows-per-second and ENCODE_BATCH_THREADS bound its load on the database
+     and the CPU.
+   - A batch only writes rows whose text still matches what was encoded.
+   - A final pass fills rows inserted or changed meanwhile. With --follow, that
+     pass repeats until stopped, which keeps the column complete for writers
+     that still only set `embedding`.
+3. `index` builds the HNSW index CONCURRENTLY. Once every row has a vector and
+   the index is valid, the version is `ready`.
+4. `activate` flips the active version in one transaction and bumps
+   table_versions. Workers switch within EMBEDDING_VERSION_TTL_S. Memos computed
+   under the old model are dropped. Searches are served throughout, from the
+   old column until the flip and from the new one after it.
+   A new column can't be activated while documents is searched through
+   partitions or shards (scripts/13_partition_documents.py): those copies only
+   hold `embedding`.
+
+Backfill batches set the rag.embedding_backfill session flag. The
+table_versions trigger (script 6) and the food stats change counter (script 10)
+ignore the writes it covers; re-run those scripts to install the check.
+
+Set EMBEDDING_SHADOW_RATE in the agents during steps 2-3 to dual-read: a sample
+of searches is repeated against the new version, and the overlap is reported
+(GET /debug/embedding-versions).
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agent_core.embedding_versions import (
+    ACTIVE, BUILDING, DEFAULT_COLUMN, DEFAULT_MODEL, READY, RETIRED, SOURCE_COLUMNS,
+    load_versions, source_text_sql
+)
+from agent_core.encode_scheduler import BATCH, get_encode_scheduler
+
+# Session flag bump_table_version() (scripts/6_table_versions.py) checks, so
+# backfill batches don't invalidate memos or reload caches
+BACKFILL_FLAG = "rag.embedding_backfill"
+
+
+def get_connection():
+    """Connect to the primary; every step here writes"""
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "boilerplate"),
+        password=os.getenv("DB_PASSWORD", "boilerplate"),
+        database=os.getenv("DB_NAME", "boilerplate_db"),
+        port=int(os.getenv("DB_PORT", 5432))
+    )
+
+
+def ensure_registry(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.embedding_versions (
+            table_name text NOT NULL,
+            version int NOT NULL,
+            model_name text NOT NULL,
+            dim int NOT NULL,
+            column_name text NOT NULL,
+            state text NOT NULL CHECK (state IN ('building', 'ready', 'active', 'retired')),
+            last_id bigint NOT NULL DEFAULT 0,
+            rows_done bigint NOT NULL DEFAULT 0,
+            created_at timestamp DEFAULT CURRENT_TIMESTAMP,
+            activated_at timestamp,
+            PRIMARY KEY (table_name, version)
+        );
+    """)
+    # At most one active version per table
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS embedding_versions_one_active
+        ON public.embedding_versions (table_name) WHERE state = 'active';
+    """)
+
+
+def _column_dim(cur, table: str, column: str) -> int:
+    """Declared dimension of a vector column (its type modifier)"""
+    cur.execute("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s AND NOT attisdropped
+    """, (table, column))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def _get_version(conn, table: str, version: int = 0, states=(BUILDING, READY)):
+    """A registry row by number, or the newest one in `states`"""
+    versions = load_versions(conn, table)
+    if version:
+        matches = [v for v in versions if v.version == version]
+    else:
+        matches = [v for v in versions if v.state in states]
+    if not matches:
+        wanted = f"v{version}" if version else "/".join(states)
+        print(f"❌ No {wanted} embedding version for {table} (see `status`)")
+        sys.exit(1)
+    return matches[-1]
+
+
+def _missing_rows(cur, table: str, column: str) -> int:
+    cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} IS NULL")
+    return cur.fetchone()[0]
+
+
+def start(table: str, model_name: str):
+    """Register a new version and add its empty column"""
+    from sentence_transformers import SentenceTransformer
+
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    ensure_registry(cur)
+
+    versions = load_versions(conn, table)
+    if not versions:
+        cur.execute("""
+            INSERT INTO embedding_versions (table_name, version, model_name, dim, column_name, state, activated_at)
+            VALUES (%s, 1, %s, %s, %s, 'active', CURRENT_TIMESTAMP)
+        """, (table, DEFAULT_MODEL, _column_dim(cur, table, DEFAULT_COLUMN), DEFAULT_COLUMN))
+        print(f"✓ Registered existing {table}.{DEFAULT_COLUMN} as v1 ({DEFAULT_MODEL}, active)")
+        versions = load_versions(conn, table)
+
+    pending = [v for v in versions if v.state in (BUILDING, READY)]
+    if pending:
+        print(f"❌ {pending[-1]} is still in progress; activate or drop it first")
+        return
+
+    dim = SentenceTransformer(model_name, device='cpu').get_sentence_embedding_dimension()
+    version = versions[-1].version + 1
+    column = f"embedding_v{version}"
+
+    # Nullable column without default: a catalog change, no table rewrite
+    cur.execute("SET lock_timeout = '5s'")
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} vector({dim})")
+    cur.execute("""
+        INSERT INTO embedding_versions (table_name, version, model_name, dim, column_name, state)
+        VALUES (%s, %s, %s, %s, %s, 'building')
+    """, (table, version, model_name, dim, column))
+
+    # A changed source text makes the new vector stale; clear it so `run` redoes the row
+    source = SOURCE_COLUMNS[table]
+    changed = " OR ".join(f"OLD.{c} IS DISTINCT FROM NEW.{c}" for c in source)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION {table}_{column}_invalidate() RETURNS trigger AS $$
+        BEGIN
+            NEW.{column} := NULL;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cur.execute(f"DROP TRIGGER IF EXISTS {table}_{column}_invalidate ON {table}")
+    cur.execute(f"""
+        CREATE TRIGGER {table}_{column}_invalidate
+        BEFORE UPDATE OF {', '.join(source)} ON {table}
+        FOR EACH ROW WHEN ({changed})
+        EXECUTE FUNCTION {table}_{column}_invalidate();
+    """)
+
+    print(f"✓ {table}.{column} vector({dim}) added for {model_name} (v{version}, building)")
+    print(f"\n✅ Next: python scripts/14_reembed.py run --table {table}")
+    cur.close()
+    conn.close()
+
+
+def _fill_batch(conn, model, version, rows) -> int:
+    """Encode and write one batch plus the resume cursor, in one transaction"""
+    texts = [text or "" for _, text, _ in rows]
+    vectors = get_encode_scheduler().encode(model, texts, priority=BATCH, convert_to_numpy=True)
+    values = [
+        (row_id, digest, "[" + ",".join(str(x) for x in vector) + "]")
+        for (row_id, _, digest), vector in zip(rows, vectors)
+    ]
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config(%s, 'on', true)", (BACKFILL_FLAG,))
+            # Rows whose text changed since it was read keep NULL for the catch-up pass
+            execute_values(cur, f"""
+                UPDATE {version.table} t SET {version.column} = v.embedding::vector
+                FROM (VALUES %s) AS v(id, digest, embedding)
+                WHERE t.id = v.id AND md5({source_text_sql(version.table)}) = v.digest
+            """, values, page_size=len(values))
+            written = cur.rowcount
+            cur.execute("""
+                UPDATE embedding_versions
+                SET last_id = GREATEST(last_id, %s), rows_done = rows_done + %s
+                WHERE table_name = %s AND version = %s
+            """, (rows[-1][0], written, version.table, version.version))
+    return written
+
+
+def run(table: str, version_number: int, batch_size: int, rows_per_second: float, follow: bool, poll: float):
+    """Fill a version's column: resumable id-order pass, then catch-up passes"""
+    from sentence_transformers import SentenceTransformer
+
+    conn = get_connection()
+    version = _get_version(conn, table, version_number, states=(BUILDING, READY, ACTIVE))
+    print(f"Re-embedding {table} with {version.model_name} into {version.column} (v{version.version})")
+    model = SentenceTransformer(version.model_name, device='cpu')
+    text_sql = source_text_sql(table)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT last_id FROM embedding_versions WHERE table_name = %s AND version = %s",
+                    (table, version.version))
+        last_id = cur.fetchone()[0]
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        total = cur.fetchone()[0]
+    conn.commit()
+    if last_id:
+        print(f"  • Resuming after id {last_id}")
+
+    def throttle(started: float, count: int):
+        if rows_per_second > 0:
+            time.sleep(max(0.0, count / rows_per_second - (time.perf_counter() - started)))
+
+    # Pass 1: id order from the cursor
+    done, pass_start = 0, time.perf_counter()
+    while True:
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT id, {text_sql}, md5({text_sql}) FROM {table}
+                WHERE id > %s ORDER BY id LIMIT %s
+            """, (last_id, batch_size))
+            rows = cur.fetchall()
+        conn.commit()
+        if not rows:
+            break
+        done += _fill_batch(conn, model, version, rows)
+        last_id = rows[-1][0]
+        rate = done / max(1e-9, time.perf_counter() - pass_start)
+        eta = (total - done) / rate if rate else 0
+        print(f"  ✓ {done:,}/{total:,} rows ({rate:.0f} rows/s, ~{eta:.0f}s left)")
+        throttle(started, len(rows))
+
+    # Pass 2: rows inserted behind the cursor or changed since (vector cleared by the trigger)
+    while True:
+        filled = 0
+        while True:
+            started = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT id, {text_sql}, md5({text_sql}) FROM {table}
+                    WHERE {version.column} IS NULL ORDER BY id LIMIT %s
+                """, (batch_size,))
+                rows = cur.fetchall()
+            conn.commit()
+            if not rows:
+                break
+            written = _fill_batch(conn, model, version, rows)
+            filled += written
+            throttle(started, len(rows))
+            if not written:
+                # Every row changed under us; let the writers settle
+                time.sleep(1)
+        if filled:
+            print(f"  ✓ Catch-up: {filled:,} new or changed rows")
+        if not follow:
+            break
+        time.sleep(poll)
+
+    with conn.cursor() as cur:
+        missing = _missing_rows(cur, table, version.column)
+    conn.commit()
+    conn.close()
+    print(f"\n✅ {table}.{version.column}: {total - missing:,}/{total:,} rows embedded")
+    if version.state == BUILDING and not missing:
+        print(f"   Next: python scripts/14_reembed.py index --table {table}")
+
+
+def index(table: str, version_number: int, m: int, ef_construction: int):
+    """Build the version's HNSW index without blocking writes; mark it ready"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    version = _get_version(conn, table, version_number)
+    name = f"{table}_{version.column}_hnsw"
+
+    # A failed CONCURRENTLY build leaves an invalid index behind; rebuild it
+    cur.execute("""
+        SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (name,))
+    row = cur.fetchone()
+    if row is not None and not row[0]:
+        print(f"  • Dropping invalid {name} from an interrupted build")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    print(f"Building {name} CONCURRENTLY (searches and writes continue)...")
+    start = time.perf_counter()
+    cur.execute("SET statement_timeout = 0")
+    cur.execute(f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}
+        USING hnsw ({version.column} vector_cosine_ops) WITH (m = %s, ef_construction = %s)
+    """, (m, ef_construction))
+    cur.execute(f"ANALYZE {table}")
+    print(f"✓ {name} built in {time.perf_counter() - start:.1f}s")
+
+    missing = _missing_rows(cur, table, version.column)
+    if missing:
+        print(f"⚠️ {missing:,} rows have no vector yet; run `run` again, then `index`")
+    else:
+        cur.execute("""
+            UPDATE embedding_versions SET state = 'ready'
+            WHERE table_name = %s AND version = %s AND state = 'building'
+        """, (table, version.version))
+        print(f"\n✅ v{version.version} is ready. Next: python scripts/14_reembed.py activate --table {table}")
+    cur.close()
+    conn.close()
+
+
+def activate(table: str, version_number: int, max_missing: int):
+    """Make a version the one searches use, in a single transaction"""
+    conn = get_connection()
+    version = _get_version(conn, table, version_number, states=(READY,))
+    if version.state not in (READY, RETIRED):
+        print(f"❌ {version} can't be activated (needs ready, or retired for a rollback)")
+        sys.exit(1)
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s
+        """, (f"{table}_{version.column}_hnsw",))
+        row = cur.fetchone()
+        # v1 predates this script; its index has whatever name scripts/1_create_table.py gave it
+        if version.column != DEFAULT_COLUMN and (row is None or not row[0]):
+            print(f"❌ No valid index on {table}.{version.column}; run `index` first")
+            sys.exit(1)
+        missing = _missing_rows(cur, table, version.column)
+        if missing > max_missing:
+            print(f"❌ {missing:,} rows have no {version.column} vector (allowed: {max_missing}); run `run` first")
+            sys.exit(1)
+        # Partition and shard copies (scripts/13_partition_documents.py) only hold `embedding`
+        cur.execute("""
+            SELECT tgname FROM pg_trigger
+            WHERE tgrelid = %s::regclass AND tgname LIKE 'documents\\_mirror\\_%%'
+        """, (table,))
+        mirrors = [row[0] for row in cur.fetchall()]
+        if version.column != DEFAULT_COLUMN and (mirrors or os.getenv("RAG_SHARDS")):
+            print(f"❌ {table} is searched through partitions/shards ({', '.join(mirrors) or 'RAG_SHARDS'}), "
+                  f"which have no {version.column} column")
+            print("   Unset RAG_SHARDS in the agents and drop the documents_mirror_* triggers first")
+            sys.exit(1)
+    conn.commit()
+
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM embedding_versions WHERE table_name = %s FOR UPDATE", (table,))
+            cur.execute("""
+                UPDATE embedding_versions SET state = 'retired'
+                WHERE table_name = %s AND state = 'active'
+            """, (table,))
+            cur.execute("""
+                UPDATE embedding_versions SET state = 'active', activated_at = CURRENT_TIMESTAMP
+                WHERE table_name = %s AND version = %s
+            """, (table, version.version))
+            # Memoized results were ranked by the old model (agent_core/memo.py)
+            cur.execute("SELECT to_regclass('public.table_versions')")
+            if cur.fetchone()[0] is not None:
+                cur.execute("""
+                    UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE table_name = %s
+                """, (table,))
+                cur.execute("SELECT pg_notify('table_changed', %s)", (table,))
+    conn.close()
+
+    print(f"✅ {table} now searches v{version.version} ({version.model_name}, column {version.column})")
+    print(f"   Workers switch within EMBEDDING_VERSION_TTL_S ({os.getenv('EMBEDDING_VERSION_TTL_S', '5')}s).")
+    print("   Re-export snapshots (scripts/5_export_snapshot.py) if the agents use them.")
+
+
+def drop(table: str, version_number: int):
+    """Remove a retired (or abandoned, unfinished) version's column, index and trigger"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    version = _get_version(conn, table, version_number)
+    if version.state == ACTIVE or version.column == DEFAULT_COLUMN:
+        print(f"❌ The active version and the original column can't be dropped ({version})")
+        sys.exit(1)
+
+    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_{version.column}_hnsw")
+    cur.execute("SET lock_timeout = '5s'")
+    cur.execute(f"DROP TRIGGER IF EXISTS {table}_{version.column}_invalidate ON {table}")
+    cur.execute(f"DROP FUNCTION IF EXISTS {table}_{version.column}_invalidate()")
+    cur.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {version.column}")
+    cur.execute("DELETE FROM embedding_versions WHERE table_name = %s AND version = %s", (table, version.version))
+    print(f"✅ Dropped {table}.{version.column} (v{version.version}); VACUUM reclaims the space over time")
+    cur.close()
+    conn.close()
+
+
+def status():
+    """Every table's versions with fill progress"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    print("\n📊 Embedding versions")
+    print("-" * 96)
+    print(f"  {'table':<12}{'ver':>4}  {'state':<10}{'column':<15}{'model':<40}{'filled':>12}")
+    for table in SOURCE_COLUMNS:
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is None:
+            continue
+        versions = load_versions(conn, table)
+        if not versions:
+            print(f"  {table:<12}{'1':>4}  {'active':<10}{DEFAULT_COLUMN:<15}{DEFAULT_MODEL:<40}{'(no registry)':>12}")
+            continue
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        total = cur.fetchone()[0]
+        for v in versions:
+            filled = total - _missing_rows(cur, table, v.column)
+            percent = 100.0 * filled / total if total else 100.0
+            print(f"  {table:<12}{v.version:>4}  {v.state:<10}{v.column:<15}{v.model_name[:39]:<40}{percent:>11.1f}%")
+    print("-" * 96)
+    cur.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online re-embedding and embedding model migration")
+    parser.add_argument("command", choices=["start", "run", "index", "activate", "drop", "status"])
+    parser.add_argument("--table", choices=list(SOURCE_COLUMNS), default="documents")
+    parser.add_argument("--model", help="Start: SentenceTransformer model of the new version")
+    parser.add_argument("--version", type=int, default=0, help="Version to act on (default: the one in progress)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Run: rows per transaction")
+    parser.add_argument("--rows-per-second", type=float, default=0, help="Run: throttle (0: unthrottled)")
+    parser.add_argument("--follow", action="store_true", help="Run: keep filling new or changed rows")
+    parser.add_argument("--poll", type=float, default=10.0, help="Run: seconds between --follow passes")
+    parser.add_argument("--m", type=int, default=16, help="Index: HNSW m")
+    parser.add_argument("--ef-construction", type=int, default=64, help="Index: HNSW ef_construction")
+    parser.add_argument("--max-missing", type=int, default=0, help="Activate: rows allowed without a vector")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        if not args.model:
+            parser.error("start needs --model")
+        start(args.table, args.model)
+    elif args.command == "run":
+        run(args.table, args.version, args.batch_size, args.rows_per_second, args.follow, args.poll)
+    elif args.command == "index":
+        index(args.table, args.version, args.m, args.ef_construction)
+    elif args.command == "activate":
+        activate(args.table, args.version, args.max_missing)
+    elif args.command == "drop":
+        drop(args.table, args.version)
+    else:
+        status()
@@ -0,0 +1,331 @@
+"""
+Script 3: Export / import food_menu in a compact binary seed format
+Run with:
+    python scripts/3_binary_seed.py export              # dump the live table
+    python scripts/3_binary_seed.py export --from-sql   # convert seed_data.sql offline
+    python scripts/3_binary_seed.py import              # load the seed with COPY
+
+The seed is two files:
+    food_menu.columns.json.gz   - scalar columns stored column-wise (gzip JSON)
+    food_menu.embeddings.npy    - embeddings as one raw float32 matrix (rows aligned)
+
+Import streams the rows through `COPY ... FROM STDIN (FORMAT binary)` into a
+staging table, so embeddings are shipped as packed float4 instead of being
+parsed from 384 text-formatted floats per row.
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+DEFAULT_SEED_DIR = os.path.join(os.path.dirname(__file__), 'seed')
+COLUMNS_FILE = 'food_menu.columns.json.gz'
+EMBEDDINGS_FILE = 'food_menu.embeddings.npy'
+
+# Scalar columns in table order, with the COPY binary encoder for each type
+SCALAR_COLUMNS = [
+    ("nama_menu", "text"),
+    ("kategori", "text"),
+    ("asal", "text"),
+    ("deskripsi", "text"),
+    ("kalori", "int4"),
+    ("protein", "int4"),
+    ("lemak", "int4"),
+    ("karbohidrat", "int4"),
+    ("serat", "int4"),
+    ("garam", "float8"),
+    ("tingkat_kesehatan", "text"),
+    ("harga", "text"),
+    ("cocok_untuk", "text[]"),
+    ("created_at", "timestamp"),
+]
+
+TEXT_OID = 25
+PG_EPOCH = datetime(2000, 1, 1)
+
+
+def get_db_params() -> dict:
+    """Database connection parameters from the environment"""
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "boilerplate"),
+        "password": os.getenv("DB_PASSWORD", "boilerplate"),
+        "database": os.getenv("DB_NAME", "boilerplate_db"),
+        "port": int(os.getenv("DB_PORT", 5432))
+    }
+
+
+# ============================================================================
+# SEED FILE I/O
+# ============================================================================
+
+def write_seed(seed_dir: str, columns: dict, embeddings: np.ndarray):
+    """Write the columnar scalar file and the float32 embedding matrix"""
+    os.makedirs(seed_dir, exist_ok=True)
+
+    columns_path = os.path.join(seed_dir, COLUMNS_FILE)
+    with gzip.open(columns_path, 'wt', encoding='utf-8') as f:
+        json.dump({"count": len(embeddings), "columns": columns}, f, ensure_ascii=False)
+
+    embeddings_path = os.path.join(seed_dir, EMBEDDINGS_FILE)
+    np.save(embeddings_path, np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    for path in (columns_path, embeddings_path):
+        print(f"  • {path} ({os.path.getsize(path):,} bytes)")
+
+
+def read_seed(seed_dir: str) -> tuple[dict, np.ndarray]:
+    """Read the columnar scalar file and the float32 embedding matrix"""
+    with gzip.open(os.path.join(seed_dir, COLUMNS_FILE), 'rt', encoding='utf-8') as f:
+        payload = json.load(f)
+    embeddings = np.load(os.path.join(seed_dir, EMBEDDINGS_FILE))
+
+    if embeddings.dtype != np.float32 or embeddings.ndim != 2:
+        raise ValueError(f"Expected a 2-D float32 matrix, got {embeddings.dtype} {embeddings.shape}")
+    if len(embeddings) != payload["count"]:
+        raise ValueError(f"Row mismatch: {payload['count']} scalar rows vs {len(embeddings)} embeddings")
+
+    return payload["columns"], embeddings
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def export_from_db(seed_dir: str):
+    """Dump the live food_menu table into the binary seed format"""
+    db_params = get_db_params()
+    print(f"Connecting to database: {db_params['database']}")
+    conn = psycopg2.connect(**db_params)
+    cursor = conn.cursor()
+
+    names = [name for name, _ in SCALAR_COLUMNS]
+    cursor.execute(f"SELECT {', '.join(names)}, embedding::text FROM food_menu ORDER BY id;")
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    columns = {name: [] for name in names}
+    vectors = []
+    for row in rows:
+        for name, value in zip(names, row[:-1]):
+            if isinstance(value, datetime):
+                value = value.isoformat(sep=' ')
+            columns[name].append(value)
+        vectors.append(np.array(json.loads(row[-1]), dtype=np.float32))
+
+    print(f"Exporting {len(rows)} rows...")
+    write_seed(seed_dir, columns, np.vstack(vectors) if vectors else np.zeros((0, 0), np.float32))
+
+
+def _parse_sql_values(sql: str) -> list[list]:
+    """Tokenize the VALUES tuples of seed_data.sql into Python values"""
+    rows, row, in_values, i, n = [], None, False, 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            # Quoted literal, '' is an escaped quote
+            j, buf = i + 1, []
+            while True:
+                if sql[j] == "'" and sql[j + 1:j + 2] == "'":
+                    buf.append("'")
+                    j += 2
+                elif sql[j] == "'":
+                    break
+                else:
+                    buf.append(sql[j])
+                    j += 1
+            if row is not None:
+                row.append(''.join(buf))
+            i = j + 1
+            # Skip a trailing ::type cast
+            if sql.startswith('::', i):
+                while i < n and sql[i] not in ',)':
+                    i += 1
+        elif sql.startswith('VALUES', i):
+            in_values = True
+            i += len('VALUES')
+        elif ch == ';':
+            in_values = False
+            i += 1
+        elif ch == '(' and in_values and row is None:
+            row = []
+            i += 1
+        elif ch == ')' and row is not None:
+            rows.append(row)
+            row = None
+            i += 1
+        elif row is not None and (ch.isdigit() or ch in '-.'):
+            j = i
+            while sql[j] not in ',)':
+                j += 1
+            token = sql[i:j].strip()
+            row.append(float(token) if any(c in token for c in '.eE') else int(token))
+            i = j
+        elif row is not None and sql.startswith('NULL', i):
+            row.append(None)
+            i += 4
+        else:
+            i += 1
+    return rows
+
+
+def _parse_pg_array(literal: str) -> list[str]:
+    """Parse a one-dimensional Postgres text[] literal like {a,"b c"}"""
+    body = literal.strip()[1:-1]
+    items, buf, quoted, i = [], [], False, 0
+    while i < len(body):
+        ch = body[i]
+        if ch == '\\' and quoted:
+            buf.append(body[i + 1])
+            i += 2
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif ch == ',' and not quoted:
+            items.append(''.join(buf).strip())
+            buf = []
+        else:
+            buf.append(ch)
+        i += 1
+    if buf or items:
+        items.append(''.join(buf).strip())
+    return items
+
+
+def export_from_sql(sql_file: str, seed_dir: str):
+    """Convert seed_data.sql into the binary seed format without a database"""
+    print(f"Reading seed data from: {sql_file}")
+    with open(sql_file, 'r') as f:
+        rows = _parse_sql_values(f.read())
+
+    # seed_data.sql lists the scalar columns, then embedding, then created_at
+    names = [name for name, _ in SCALAR_COLUMNS if name != "created_at"]
+    columns = {name: [] for name, _ in SCALAR_COLUMNS}
+    vectors = []
+    for row in rows:
+        for name, value in zip(names, row):
+            columns[name].append(_parse_pg_array(value) if name == "cocok_untuk" else value)
+        vectors.append(np.array(json.loads(row[len(names)]), dtype=np.float32))
+        columns["created_at"].append(row[len(names) + 1])
+
+    print(f"Exporting {len(rows)} rows...")
+    write_seed(seed_dir, columns, np.vstack(vectors))
+
+
+# ============================================================================
+# IMPORT
+# ============================================================================
+
+def _encode_field(kind: str, value) -> bytes:
+    """Encode one field for COPY binary (length-prefixed, -1 for NULL)"""
+    if value is None:
+        return struct.pack('>i', -1)
+    if kind == "text":
+        data = value.encode('utf-8')
+    elif kind == "int4":
+        data = struct.pack('>i', int(value))
+    elif kind == "float8":
+        data = struct.pack('>d', float(value))
+    elif kind == "timestamp":
+        delta = datetime.fromisoformat(value) - PG_EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+        data = struct.pack('>q', micros)
+    elif kind == "text[]":
+        elems = [v.encode('utf-8') for v in value]
+        data = struct.pack('>iiiii', 1, 0, TEXT_OID, len(elems), 1) + b''.join(
+            struct.pack('>i', len(e)) + e for e in elems
+        )
+    else:
+        raise ValueError(f"Unsupported column type: {kind}")
+    return struct.pack('>i', len(data)) + data
+
+
+def build_copy_stream(columns: dict, embeddings: np.ndarray) -> io.BytesIO:
+    """Build a COPY binary stream for the scalar columns plus the vector column"""
+    count, dim = embeddings.shape
+    # pgvector binary layout: int16 dim, int16 unused, dim x big-endian float4
+    vector_header = struct.pack('>ihh', 4 + 4 * dim, dim, 0)
+    vector_bodies = embeddings.astype('>f4')
+
+    buf = io.BytesIO()
+    buf.write(b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0))
+    tuple_header = struct.pack('>h', len(SCALAR_COLUMNS) + 1)
+    for i in range(count):
+        buf.write(tuple_header)
+        for name, kind in SCALAR_COLUMNS:
+            buf.write(_encode_field(kind, columns[name][i]))
+        buf.write(vector_header)
+        buf.write(vector_bodies[i].tobytes())
+    buf.write(struct.pack('>h', -1))
+    buf.seek(0)
+    return buf
+
+
+def import_seed(seed_dir: str):
+    """Load the binary seed into food_menu with COPY, skipping duplicate menus"""
+    columns, embeddings = read_seed(seed_dir)
+    print(f"Loaded seed: {len(embeddings)} rows x {embeddings.shape[1]} dims")
+
+    db_params = get_db_params()
+    print(f"Connecting to database: {db_params['database']}")
+    conn = psycopg2.connect(**db_params)
+    cursor = conn.cursor()
+
+    start = time.perf_counter()
+    names = [name for name, _ in SCALAR_COLUMNS] + ["embedding"]
+    column_list = ', '.join(names)
+
+    # COPY cannot skip conflicts, so stage first and merge with ON CONFLICT
+    cursor.execute("""
+        CREATE TEMP TABLE food_menu_stage
+        (LIKE public.food_menu INCLUDING DEFAULTS) ON COMMIT DROP;
+    """)
+    cursor.copy_expert(
+        f"COPY food_menu_stage ({column_list}) FROM STDIN (FORMAT binary)",
+        build_copy_stream(columns, embeddings)
+    )
+    cursor.execute(f"""
+        INSERT INTO public.food_menu ({column_list})
+        SELECT {column_list} FROM food_menu_stage
+        ON CONFLICT (nama_menu) DO NOTHING;
+    """)
+    inserted = cursor.rowcount
+    conn.commit()
+    elapsed = time.perf_counter() - start
+
+    print(f"✓ Inserted {inserted} rows ({len(embeddings) - inserted} duplicates skipped) in {elapsed * 1000:.1f} ms")
+
+    cursor.execute("SELECT COUNT(*) FROM food_menu;")
+    print(f"\n📊 Total records in food_menu: {cursor.fetchone()[0]}")
+
+    cursor.close()
+    conn.close()
+    print("\n✅ Import complete!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Binary seed export/import for food_menu")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--dir", default=DEFAULT_SEED_DIR, help="Seed directory")
+    parser.add_argument("--from-sql", nargs="?", const=os.path.join(os.path.dirname(__file__), 'seed_data.sql'),
+                        help="Export from a seed SQL file instead of the database")
+    args = parser.parse_args()
+
+    if args.command == "export" and args.from_sql:
+        export_from_sql(args.from_sql, args.dir)
+    elif args.command == "export":
+        export_from_db(args.dir)
+    else:
+        import_seed(args.dir)
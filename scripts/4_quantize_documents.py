@@ -0,0 +1,178 @@
+"""
+Script 4: Quantized vector storage for the documents table
+Run with:
+    python scripts/4_quantize_documents.py migrate    # add halfvec/bit columns + HNSW indexes
+    python scripts/4_quantize_documents.py report     # recall/latency/size vs full vectors
+    python scripts/4_quantize_documents.py rollback   # drop the quantized columns
+
+The quantized columns are STORED generated columns derived from `embedding`,
+so inserts from the existing loaders keep them in sync without code changes.
+Retrieval opts in with RAG_QUANTIZATION=halfvec|bit (see RAGPipeline), which
+over-fetches from the compact index and rescores against the full vectors.
+Requires pgvector >= 0.7.0.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'adk-first-agent', '.env'))
+
+# Reuse the exact SQL the RAG agent runs
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'adk-first-agent'))
+from rag_agent.core.rag_pipeline import build_search_query, exact_search_ids, percentile, sample_queries
+
+MODES = ["none", "halfvec", "bit"]
+
+
+def get_connection():
+    """Open a connection from the DB_* environment variables"""
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "boilerplate"),
+        password=os.getenv("DB_PASSWORD", "boilerplate"),
+        database=os.getenv("DB_NAME", "boilerplate_db"),
+        port=int(os.getenv("DB_PORT", 5432))
+    )
+
+
+def migrate(dim: int):
+    """Add generated halfvec/bit columns and their HNSW indexes"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    print("Adding quantized columns (rewrites the table once)...")
+    cur.execute(f"""
+        ALTER TABLE documents
+        ADD COLUMN IF NOT EXISTS embedding_half halfvec({dim})
+            GENERATED ALWAYS AS (embedding::halfvec({dim})) STORED;
+    """)
+    cur.execute(f"""
+        ALTER TABLE documents
+        ADD COLUMN IF NOT EXISTS embedding_bit bit({dim})
+            GENERATED ALWAYS AS (binary_quantize(embedding)::bit({dim})) STORED;
+    """)
+    print("✓ embedding_half / embedding_bit ready")
+
+    print("Building HNSW indexes...")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS documents_embedding_half_idx
+        ON documents USING hnsw (embedding_half halfvec_cosine_ops);
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS documents_embedding_bit_idx
+        ON documents USING hnsw (embedding_bit bit_hamming_ops);
+    """)
+    cur.execute("ANALYZE documents;")
+    print("✓ Indexes created")
+
+    cur.close()
+    conn.close()
+    print("\n✅ Migration complete! Enable with RAG_QUANTIZATION=halfvec or RAG_QUANTIZATION=bit")
+
+
+def rollback():
+    """Drop the quantized columns (their indexes go with them)"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_half;")
+    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_bit;")
+    cur.close()
+    conn.close()
+    print("✅ Quantized columns dropped")
+
+
+def report(num_queries: int, top_k: int, rescore_factor: int, noise: float, output: str = None):
+    """Compare recall@k, latency and on-disk size of each storage mode"""
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    queries = sample_queries(cur, num_queries, noise)
+    if not queries:
+        print("❌ documents table is empty")
+        return
+    truth = [exact_search_ids(cur, q, top_k) for q in queries]
+
+    candidates = top_k * rescore_factor
+    cur.execute("SET hnsw.ef_search = %s", (max(40, candidates),))
+
+    results = {"num_queries": len(queries), "top_k": top_k, "rescore_factor": rescore_factor, "modes": {}}
+    for mode in MODES:
+        sql = build_search_query(mode)
+        latencies, recalls = [], []
+        for embedding_str, expected in zip(queries, truth):
+            params = {"embedding": embedding_str, "top_k": top_k, "candidates": candidates}
+            start = time.perf_counter()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len({row["id"] for row in rows} & expected) / max(1, len(expected)))
+
+        results["modes"][mode] = {
+            "recall_at_k": round(statistics.mean(recalls), 4),
+            "latency_ms_p50": round(percentile(latencies, 50), 3),
+            "latency_ms_p95": round(percentile(latencies, 95), 3),
+        }
+
+    # Index and column sizes
+    cur.execute("""
+        SELECT indexname, pg_relation_size(quote_ident(indexname)::regclass) AS bytes
+        FROM pg_indexes WHERE tablename = 'documents'
+    """)
+    results["index_bytes"] = {row["indexname"]: row["bytes"] for row in cur.fetchall()}
+    cur.execute("""
+        SELECT SUM(pg_column_size(embedding)) AS vector,
+               SUM(pg_column_size(embedding_half)) AS halfvec,
+               SUM(pg_column_size(embedding_bit)) AS bit
+        FROM documents
+    """)
+    results["column_bytes"] = {k: int(v or 0) for k, v in cur.fetchone().items()}
+
+    cur.close()
+    conn.close()
+
+    print(f"\n📊 Quantization report ({len(queries)} queries, top_k={top_k}, rescore x{rescore_factor})")
+    print("-" * 60)
+    print(f"  {'mode':<10}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'column bytes':>16}")
+    for mode in MODES:
+        stats = results["modes"][mode]
+        column = results["column_bytes"]["vector" if mode == "none" else mode]
+        print(f"  {mode:<10}{stats['recall_at_k']:>10.3f}{stats['latency_ms_p50']:>10.2f}"
+              f"{stats['latency_ms_p95']:>10.2f}{column:>16,}")
+    print("-" * 60)
+    for name, size in results["index_bytes"].items():
+        print(f"  {name}: {size:,} bytes")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Report written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantized vector storage for documents")
+    parser.add_argument("command", choices=["migrate", "report", "rollback"])
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=100, help="Report: number of sampled queries")
+    parser.add_argument("--top-k", type=int, default=3, help="Report: results per query")
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Report: over-fetch multiplier")
+    parser.add_argument("--noise", type=float, default=0.02, help="Report: query perturbation stddev")
+    parser.add_argument("--output", help="Report: write JSON results to this path")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.dim)
+    elif args.command == "rollback":
+        rollback()
+    else:
+        report(args.queries, args.top_k, args.rescore_factor, args.noise, args.output)
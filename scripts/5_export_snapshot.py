@@ -0,0 +1,68 @@
+"""
+Script 5: Export memory-mapped embedding snapshots for in-process search
+Run with:
+    python scripts/5_export_snapshot.py --table food_menu --dir /var/lib/rag/snapshots
+    python scripts/5_export_snapshot.py --table documents --dir /var/lib/rag/snapshots
+
+Each run writes a new `<table>-vNNNNNN.snap` version and atomically swaps the
+`<table>.current` pointer. Workers started with FOOD_SNAPSHOT_DIR /
+RAG_SNAPSHOT_DIR pointing at the same directory remap the new version on their
+next search; no restart needed.
+
+The active embedding version's column and model are exported
+(scripts/14_reembed.py). Re-run after a model flip. Until then, workers skip
+the outdated snapshot and search PostgreSQL.
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agent_core.embedding_versions import get_embedding_versions
+from agent_core.snapshot import export_table_snapshot, EmbeddingSnapshot
+
+
+def export_snapshot(table: str, directory: str, with_norms: bool):
+    """Export one table and print what the workers will map"""
+    db_params = {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "boilerplate"),
+        "password": os.getenv("DB_PASSWORD", "boilerplate"),
+        "database": os.getenv("DB_NAME", "boilerplate_db"),
+        "port": int(os.getenv("DB_PORT", 5432))
+    }
+
+    print(f"Connecting to database: {db_params['database']}")
+    conn = psycopg2.connect(**db_params)
+
+    version = get_embedding_versions().active(table, conn)
+    print(f"✓ Active embedding version: v{version.version} ({version.model_name}, column {version.column})")
+
+    start = time.perf_counter()
+    path = export_table_snapshot(
+        conn, table, directory, with_norms=with_norms, column=version.column, model_name=version.model_name
+    )
+    conn.close()
+
+    snapshot = EmbeddingSnapshot(path)
+    print(f"✓ {table} v{snapshot.version}: {len(snapshot)} rows x {snapshot.header['dim']} dims "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"  • {path} ({os.path.getsize(path):,} bytes)")
+    print("\n✅ Snapshot is live")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an embedding snapshot")
+    parser.add_argument("--table", choices=["food_menu", "documents"], required=True)
+    parser.add_argument("--dir", required=True, help="Snapshot directory shared by the workers")
+    parser.add_argument("--no-norms", action="store_true", help="Skip precomputed norms")
+    args = parser.parse_args()
+
+    export_snapshot(args.table, args.dir, not args.no_norms)
@@ -0,0 +1,90 @@
+"""
+Script 6: Table version counters for cache invalidation
+Run with: python scripts/6_table_versions.py
+
+Creates `table_versions` and a statement-level trigger that bumps the version of
+food_menu / documents on every INSERT, UPDATE, DELETE or TRUNCATE and sends
+`NOTIFY table_changed, '<table>'`. Tool-result memos (agent_core/memo.py) compare the
+version to decide whether cached results are still valid; in-memory caches
+(core/nutrient_cache.py) LISTEN on the channel and reload. Without this script
+memos fall back to pg_stat_user_tables counters, which the stats collector
+updates with a short delay, and in-memory caches only refresh on their TTL.
+"""
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+VERSIONED_TABLES = ["food_menu", "documents"]
+
+
+def create_table_versions():
+    """Create the version table, the bump function and one trigger per table"""
+    db_params = {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "boilerplate"),
+        "password": os.getenv("DB_PASSWORD", "boilerplate"),
+        "database": os.getenv("DB_NAME", "boilerplate_db"),
+        "port": int(os.getenv("DB_PORT", 5432))
+    }
+
+    print(f"Connecting to database: {db_params['database']} at {db_params['host']}:{db_params['port']}")
+    conn = psycopg2.connect(**db_params)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.table_versions (
+            table_name text PRIMARY KEY,
+            version bigint NOT NULL DEFAULT 0,
+            updated_at timestamp DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION public.bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            -- Embedding backfills (scripts/14_reembed.py) fill a column no reader
+            -- uses yet, so they must not invalidate memos or reload caches
+            IF current_setting('rag.embedding_backfill', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            INSERT INTO public.table_versions (table_name, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (table_name) DO UPDATE
+                SET version = table_versions.version + 1,
+                    updated_at = CURRENT_TIMESTAMP;
+            -- Delivered on commit, so listeners never reload before the change is visible
+            PERFORM pg_notify('table_changed', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    print("✓ table_versions + bump_table_version() ready (NOTIFY table_changed)")
+
+    for table in VERSIONED_TABLES:
+        cursor.execute("SELECT to_regclass(%s)", (f"public.{table}",))
+        if cursor.fetchone()[0] is None:
+            print(f"  ⚠️ {table} does not exist yet, skipping")
+            continue
+        cursor.execute(f"DROP TRIGGER IF EXISTS {table}_version_bump ON public.{table};")
+        cursor.execute(f"""
+            CREATE TRIGGER {table}_version_bump
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.{table}
+            FOR EACH STATEMENT EXECUTE FUNCTION public.bump_table_version();
+        """)
+        cursor.execute("""
+            INSERT INTO public.table_versions (table_name) VALUES (%s)
+            ON CONFLICT (table_name) DO NOTHING;
+        """, (table,))
+        print(f"  • {table}_version_bump trigger installed")
+
+    cursor.close()
+    conn.close()
+    print("\n✅ Table versioning is ready!")
+
+
+if __name__ == "__main__":
+    create_table_versions()
@@ -0,0 +1,131 @@
+"""
+Script 7: Benchmark the meal-plan optimizer on synthetic menus
+Run with:
+    python scripts/7_benchmark_meal_plan.py --menus 10000 --runs 50
+    python scripts/7_benchmark_meal_plan.py --menus 10000 --json meal_plan_bench.json
+
+Builds a synthetic NutrientMatrix (no database needed), times MealPlanner.plan()
+over random targets and budgets, and compares the beam search against an
+exhaustive search on a small instance to report the optimality gap.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from food_analyst_agent_adk.core.meal_planner import DEFAULT_SLOTS, MealPlanner
+from food_analyst_agent_adk.core.nutrient_cache import NutrientMatrix
+
+TAGS = ["Sarapan", "Makan Siang", "Makan Malam", "Snack", "Diet Sehat", "High Protein", "Vegetarian"]
+
+
+def synthetic_matrix(n: int, seed: int = 42) -> NutrientMatrix:
+    """n menus with plausible nutrients, 'Rp 12.500'-style prices and random slot tags"""
+    rng = np.random.default_rng(seed)
+    kalori = rng.integers(150, 900, n)
+    rows = []
+    for i in range(n):
+        tags = [t for t in TAGS if rng.random() < 0.35] or ["Makan Siang"]
+        price = int(rng.integers(16, 160)) * 500
+        rows.append((
+            i + 1,
+            f"Menu Sintetis {i + 1:05d}",
+            "Sintetis",
+            "Indonesia",
+            "Baik",
+            f"Rp {price:,}".replace(",", "."),
+            tags,
+            int(kalori[i]),
+            int(rng.integers(3, 45)),
+            int(rng.integers(2, 40)),
+            int(rng.integers(10, 110)),
+            int(rng.integers(0, 12)),
+            round(float(rng.uniform(0.2, 3.0)), 1)
+        ))
+    return NutrientMatrix(rows)
+
+
+def random_scenarios(runs: int, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "kalori": int(rng.integers(1500, 2600)),
+            "protein": int(rng.integers(50, 110)),
+            "budget": int(rng.integers(60, 200)) * 1000,
+        }
+        for _ in range(runs)
+    ]
+
+
+def benchmark(menus: int, runs: int, exact_menus: int, exact_runs: int) -> dict:
+    print(f"🧪 Building {menus:,} synthetic menus...")
+    start = time.perf_counter()
+    matrix = synthetic_matrix(menus)
+    print(f"✓ Matrix ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    planner = MealPlanner(matrix)
+    planner.plan(DEFAULT_SLOTS, 2000, 60, 100000)  # Warm slot masks
+
+    timings, feasible = [], 0
+    for scenario in random_scenarios(runs):
+        result = planner.plan(DEFAULT_SLOTS, **scenario)
+        timings.append(result["timing_ms"])
+        feasible += result["feasible"]
+    timings = np.array(timings)
+    report = {
+        "menus": menus,
+        "runs": runs,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "max_ms": float(timings.max()),
+        "feasible_rate": feasible / runs,
+    }
+    print(f"⏱️  plan(): p50 {report['p50_ms']:.2f} ms, p95 {report['p95_ms']:.2f} ms, "
+          f"max {report['max_ms']:.2f} ms, feasible {report['feasible_rate']:.0%}")
+
+    # Optimality gap against exhaustive search (no pruning, unbounded beam)
+    print(f"\n🔍 Comparing with exhaustive search on {exact_menus} menus...")
+    small = synthetic_matrix(exact_menus, seed=1)
+    beam = MealPlanner(small)
+    exact = MealPlanner(small, candidates_per_slot=10 ** 9, beam_width=10 ** 9)
+    gaps, exact_ms = [], []
+    for scenario in random_scenarios(exact_runs, seed=11):
+        approx_result = beam.plan(DEFAULT_SLOTS, **scenario)
+        exact_result = exact.plan(DEFAULT_SLOTS, **scenario)
+        exact_ms.append(exact_result["timing_ms"])
+        if exact_result["feasible"] and approx_result["feasible"]:
+            gaps.append(approx_result["score"] - exact_result["score"])
+    report["exact"] = {
+        "menus": exact_menus,
+        "runs": exact_runs,
+        "mean_score_gap": float(np.mean(gaps)) if gaps else None,
+        "max_score_gap": float(np.max(gaps)) if gaps else None,
+        "optimal_rate": float(np.mean(np.array(gaps) <= 1e-9)) if gaps else None,
+        "exhaustive_p50_ms": float(np.percentile(exact_ms, 50)) if exact_ms else None,
+    }
+    if gaps:
+        print(f"✓ Beam matched the optimum in {report['exact']['optimal_rate']:.0%} of runs "
+              f"(mean gap {report['exact']['mean_score_gap']:.4f}, max {report['exact']['max_score_gap']:.4f}); "
+              f"exhaustive p50 {report['exact']['exhaustive_p50_ms']:.0f} ms")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the meal-plan optimizer")
+    parser.add_argument("--menus", type=int, default=10000, help="Synthetic menus for the timing run")
+    parser.add_argument("--runs", type=int, default=50, help="Random target/budget scenarios")
+    parser.add_argument("--exact-menus", type=int, default=200, help="Menus for the exhaustive comparison")
+    parser.add_argument("--exact-runs", type=int, default=10)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = benchmark(args.menus, args.runs, args.exact_menus, args.exact_runs)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Report written to {args.json}")
+    print("\n✅ Benchmark complete")
@@ -0,0 +1,169 @@
+r"""
+Script 8: Numeric price column for food_menu
+Run with: python scripts/8_price_column.py
+
+`harga` is free text ('Rp 45.000', 'Rp45rb', '1,5 jt', 'Rp 30.000 - 40.000'),
+so budget filters used to mean parsing strings in Python. This migration:
+
+1. Creates `parse_harga_rp(text)`, a SQL port of core/prices.py:parse_harga
+   (ranges resolve to their upper bound)
+2. Adds `harga_rp bigint`
+3. Keeps it in sync with a BEFORE INSERT OR UPDATE OF harga trigger, installed
+   before the backfill so writes landing during it are parsed too
+4. Backfills existing rows in batches
+5. Indexes it (CONCURRENTLY, so writes aren't blocked)
+6. Cross-checks every row against the Python parser
+
+Safe to re-run.
+"""
+import os
+import sys
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from food_analyst_agent_adk.core.prices import parse_harga
+
+BATCH_SIZE = 5000
+
+PARSE_FUNCTION_SQL = r"""
+    CREATE OR REPLACE FUNCTION public.parse_harga_rp(raw text) RETURNS bigint AS $$
+    DECLARE
+        s text;
+        part text;
+        m text[];
+        digits text;
+        groups text[];
+        amount numeric;
+        best numeric;
+    BEGIN
+        IF raw IS NULL THEN
+            RETURN NULL;
+        END IF;
+        s := btrim(replace(replace(replace(lower(raw), 'rp.', ''), 'rp', ''), 'idr', ''));
+        IF s IN ('gratis', 'free') THEN
+            RETURN 0;
+        END IF;
+        s := regexp_replace(s, '[.,]-$', '');
+
+        FOREACH part IN ARRAY regexp_split_to_array(s, '\s*(–|—|-|s/d|sampai|hingga)\s*') LOOP
+            m := regexp_match(part, '(\d[\d.,]*)\s*(ribu|rb|k|juta|jt)?\y');
+            CONTINUE WHEN m IS NULL;
+            digits := rtrim(m[1], '.,');
+
+            IF strpos(digits, '.') > 0 AND strpos(digits, ',') > 0 THEN
+                -- The later separator is the decimal one
+                IF strpos(reverse(digits), ',') < strpos(reverse(digits), '.') THEN
+                    amount := replace(replace(digits, '.', ''), ',', '.')::numeric;
+                ELSE
+                    amount := replace(digits, ',', '')::numeric;
+                END IF;
+            ELSIF digits ~ '[.,]' THEN
+                groups := regexp_split_to_array(digits, '[.,]');
+                IF m[2] IS NULL AND (SELECT bool_and(length(g) = 3) FROM unnest(groups[2:]) AS g) THEN
+                    amount := array_to_string(groups, '')::numeric;
+                ELSIF array_length(groups, 1) = 2 THEN
+                    amount := (groups[1] || '.' || groups[2])::numeric;
+                ELSE
+                    amount := array_to_string(groups, '')::numeric;
+                END IF;
+            ELSE
+                amount := digits::numeric;
+            END IF;
+
+            amount := amount * CASE m[2]
+                WHEN 'rb' THEN 1000 WHEN 'ribu' THEN 1000 WHEN 'k' THEN 1000
+                WHEN 'jt' THEN 1000000 WHEN 'juta' THEN 1000000
+                ELSE 1 END;
+            best := greatest(best, amount);
+        END LOOP;
+
+        RETURN round(best)::bigint;
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE;
+"""
+
+
+def add_price_column():
+    """Add, backfill, sync and index food_menu.harga_rp"""
+    db_params = {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "boilerplate"),
+        "password": os.getenv("DB_PASSWORD", "boilerplate"),
+        "database": os.getenv("DB_NAME", "boilerplate_db"),
+        "port": int(os.getenv("DB_PORT", 5432))
+    }
+
+    print(f"Connecting to database: {db_params['database']} at {db_params['host']}:{db_params['port']}")
+    conn = psycopg2.connect(**db_params)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+
+    cursor.execute(PARSE_FUNCTION_SQL)
+    print("✓ parse_harga_rp() ready")
+
+    cursor.execute("ALTER TABLE public.food_menu ADD COLUMN IF NOT EXISTS harga_rp bigint;")
+    print("✓ harga_rp column ready")
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION public.food_menu_set_harga_rp() RETURNS trigger AS $$
+        BEGIN
+            NEW.harga_rp := public.parse_harga_rp(NEW.harga);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    # CREATE OR REPLACE, so a re-run never leaves writes without the trigger
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER food_menu_harga_rp
+        BEFORE INSERT OR UPDATE OF harga ON public.food_menu
+        FOR EACH ROW EXECUTE FUNCTION public.food_menu_set_harga_rp();
+    """)
+    print("✓ food_menu_harga_rp trigger installed")
+
+    # Backfill in id ranges so no single statement holds row locks for long
+    cursor.execute("SELECT coalesce(min(id), 0), coalesce(max(id), 0) FROM public.food_menu;")
+    min_id, max_id = cursor.fetchone()
+    updated = 0
+    for lower in range(min_id, max_id + 1, BATCH_SIZE):
+        cursor.execute("""
+            UPDATE public.food_menu
+            SET harga_rp = public.parse_harga_rp(harga)
+            WHERE id >= %s AND id < %s
+              AND harga_rp IS DISTINCT FROM public.parse_harga_rp(harga);
+        """, (lower, lower + BATCH_SIZE))
+        updated += cursor.rowcount
+    print(f"✓ Backfilled {updated} rows")
+
+    cursor.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_food_menu_harga_rp ON public.food_menu (harga_rp);")
+    print("✓ idx_food_menu_harga_rp ready")
+
+    # The SQL and Python parsers must agree, or budget filters and the meal planner diverge
+    cursor.execute("SELECT id, harga, harga_rp FROM public.food_menu ORDER BY id;")
+    mismatches, unparsed = [], 0
+    for menu_id, harga, harga_rp in cursor.fetchall():
+        expected = parse_harga(harga)
+        if expected is None:
+            unparsed += harga is not None
+        if (None if expected is None else round(expected)) != harga_rp:
+            mismatches.append((menu_id, harga, harga_rp, expected))
+    if unparsed:
+        print(f"  ⚠️ {unparsed} prices could not be parsed (harga_rp is NULL)")
+    for menu_id, harga, harga_rp, expected in mismatches[:10]:
+        print(f"  ⚠️ id={menu_id} {harga!r}: SQL={harga_rp} Python={expected}")
+
+    cursor.close()
+    conn.close()
+    if mismatches:
+        print(f"\n❌ {len(mismatches)} rows differ between the SQL and Python parsers")
+        sys.exit(1)
+    print("\n✅ Numeric prices are ready!")
+
+
+if __name__ == "__main__":
+    add_price_column()
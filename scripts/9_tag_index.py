@@ -0,0 +1,141 @@
+"""
+Script 9: GIN index and tag facets for food_menu.cocok_untuk
+Run with: python scripts/9_tag_index.py
+
+1. GIN index on cocok_untuk, so `cocok_untuk @> ARRAY[...]` (all tags) and
+   `cocok_untuk && ARRAY[...]` (any tag) filters in the vector query use an
+   index instead of a sequential scan
+2. `food_menu_tag_counts` (tag -> menu_count), kept up to date by a row-level
+   trigger that only touches the tags of the changed row, so the tag-facet
+   endpoint (GET /food/tags) never scans food_menu
+3. Backfill plus a consistency check against a full unnest() scan
+
+Safe to re-run.
+"""
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, ISOLATION_LEVEL_READ_COMMITTED
+import os
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'food_analyst_agent_adk', '.env'))
+
+FULL_SCAN_COUNTS_SQL = """
+    SELECT tag, count(*) AS menu_count
+    FROM food_menu, LATERAL (SELECT DISTINCT unnest(cocok_untuk) AS tag) t
+    WHERE tag IS NOT NULL
+    GROUP BY tag
+"""
+
+
+def create_tag_index():
+    """Create the GIN index, the facet summary table and its trigger"""
+    db_params = {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "boilerplate"),
+        "password": os.getenv("DB_PASSWORD", "boilerplate"),
+        "database": os.getenv("DB_NAME", "boilerplate_db"),
+        "port": int(os.getenv("DB_PORT", 5432))
+    }
+
+    print(f"Connecting to database: {db_params['database']} at {db_params['host']}:{db_params['port']}")
+    conn = psycopg2.connect(**db_params)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_food_menu_cocok_untuk
+        ON public.food_menu USING GIN (cocok_untuk);
+    """)
+    print("✓ idx_food_menu_cocok_untuk (GIN) ready")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.food_menu_tag_counts (
+            tag text PRIMARY KEY,
+            menu_count bigint NOT NULL DEFAULT 0
+        );
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION public.food_menu_tag_counts_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM public.food_menu_tag_counts;
+                RETURN NULL;
+            END IF;
+
+            -- Only the tags that actually changed move the counters
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE public.food_menu_tag_counts c
+                SET menu_count = c.menu_count - 1
+                WHERE c.tag IN (
+                    SELECT unnest(OLD.cocok_untuk)
+                    EXCEPT
+                    SELECT unnest(CASE WHEN TG_OP = 'UPDATE' THEN NEW.cocok_untuk END)
+                );
+                DELETE FROM public.food_menu_tag_counts WHERE menu_count <= 0;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO public.food_menu_tag_counts AS c (tag, menu_count)
+                SELECT tag, 1 FROM (
+                    SELECT unnest(NEW.cocok_untuk) AS tag
+                    EXCEPT
+                    SELECT unnest(CASE WHEN TG_OP = 'UPDATE' THEN OLD.cocok_untuk END)
+                ) added
+                WHERE tag IS NOT NULL
+                ON CONFLICT (tag) DO UPDATE SET menu_count = c.menu_count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS food_menu_tag_counts_row ON public.food_menu;")
+    cursor.execute("""
+        CREATE TRIGGER food_menu_tag_counts_row
+        AFTER INSERT OR UPDATE OF cocok_untuk OR DELETE ON public.food_menu
+        FOR EACH ROW EXECUTE FUNCTION public.food_menu_tag_counts_sync();
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS food_menu_tag_counts_truncate ON public.food_menu;")
+    cursor.execute("""
+        CREATE TRIGGER food_menu_tag_counts_truncate
+        AFTER TRUNCATE ON public.food_menu
+        FOR EACH STATEMENT EXECUTE FUNCTION public.food_menu_tag_counts_sync();
+    """)
+    print("✓ food_menu_tag_counts + sync triggers installed")
+
+    # Backfill once; from here on the trigger keeps the counts current
+    conn.set_isolation_level(ISOLATION_LEVEL_READ_COMMITTED)
+    cursor.execute("LOCK TABLE public.food_menu IN SHARE MODE;")
+    cursor.execute("DELETE FROM public.food_menu_tag_counts;")
+    cursor.execute(f"INSERT INTO public.food_menu_tag_counts (tag, menu_count) {FULL_SCAN_COUNTS_SQL};")
+    conn.commit()
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+
+    cursor.execute("SELECT tag, menu_count FROM public.food_menu_tag_counts;")
+    summary = dict(cursor.fetchall())
+    cursor.execute(FULL_SCAN_COUNTS_SQL)
+    scanned = dict(cursor.fetchall())
+    print(f"✓ {len(summary)} tags summarized")
+    for tag, count in sorted(summary.items(), key=lambda item: -item[1])[:10]:
+        print(f"  • {tag}: {count}")
+
+    # Show whether the planner picks the GIN index for a tag filter
+    if summary:
+        top_tag = max(summary, key=summary.get)
+        cursor.execute("SET enable_seqscan = off;")
+        cursor.execute("EXPLAIN SELECT id FROM public.food_menu WHERE cocok_untuk @> %s::text[];", ([top_tag],))
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        cursor.execute("RESET enable_seqscan;")
+        print(f"  • GIN usable for @> filters: {'idx_food_menu_cocok_untuk' in plan}")
+
+    cursor.close()
+    conn.close()
+    if summary != scanned:
+        print("\n❌ Tag summary differs from a full scan")
+        sys.exit(1)
+    print("\n✅ Tag filtering and facets are ready!")
+
+
+if __name__ == "__main__":
+    create_tag_index()
@@ -12,36 +12,49 @@ echo ""
 
 echo "=== Asking: Rekomendasi menu tinggi protein untuk muscle building ==="
 echo ""
+echo "=== Agent's Response (streaming) ==="
+echo ""
 
-curl -s -X POST http://localhost:8000/run \
+# /run_sse with "streaming": true emits partial model events as tokens arrive,
+# so there is no need to wait and poll the session afterwards.
+curl -s -N -X POST http://localhost:8000/run_sse \
   -H "Content-Type: application/json" \
   -d "{
     \"appName\": \"food_analyst_agent_adk\",
     \"userId\": \"demo_user\",
     \"sessionId\": \"$SESSION_ID\",
+    \"streaming\": true,
     \"newMessage\": {
       \"role\": \"user\",
       \"parts\": [{\"text\": \"Rekomendasi menu tinggi protein untuk muscle building\"}]
     }
-  }" > /tmp/agent_response.json
-
-echo "⏳ Waiting for agent response..."
-sleep 3
-
-echo ""
-echo "=== Agent's Response ==="
-echo ""
-
-curl -s -X GET "http://localhost:8000/apps/food_analyst_agent_adk/users/demo_user/sessions/$SESSION_ID" | \
-  python3 -c "
-import sys, json
-data = json.load(sys.stdin)
-for event in data['events']:
-    if 'content' in event and 'parts' in event['content']:
-        for part in event['content']['parts']:
-            if 'text' in part and event['content'].get('role') == 'model':
-                print(part['text'])
-                print()
+  }" | python3 -u -c "
+import sys, json, time
+start = time.perf_counter()
+first_token = None
+streamed = False
+for line in sys.stdin:
+    if not line.startswith('data:'):
+        continue
+    event = json.loads(line[5:])
+    content = event.get('content') or {}
+    if content.get('role') != 'model':
+        continue
+    for part in content.get('parts', []):
+        if 'text' not in part:
+            continue
+        # Partial events carry the chunks; the final event repeats the full text
+        if event.get('partial'):
+            streamed = True
+        elif streamed:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        print(part['text'], end='', flush=True)
+print()
+print()
+if first_token is not None:
+    print(f'⏱️ Time to first token: {first_token * 1000:.0f} ms, total: {(time.perf_counter() - start) * 1000:.0f} ms')
 "
 
 echo ""
@@ -0,0 +1,8 @@
+"""Import paths for the tests: agent_core at the root, rag_agent and first-agent below it"""
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for path in (ROOT, os.path.join(ROOT, 'adk-first-agent'), os.path.join(ROOT, 'first-agent')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,54 @@
+"""Resuming batch_qa output files: partial lines and retried failures"""
+import json
+
+import pytest
+
+# batch_qa imports RAGPipelineMVP (sentence-transformers, psycopg2, google-genai)
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("psycopg2")
+pytest.importorskip("google.genai")
+
+from batch_qa import load_completed, repair_output
+
+
+def write_lines(path, records, tail=""):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + tail, encoding="utf-8")
+
+
+def test_partial_last_line_is_cut(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [{"id": 1, "answer": "a"}], tail='{"id": 2, "ans')
+
+    repair_output(str(path))
+
+    assert path.read_text(encoding="utf-8") == json.dumps({"id": 1, "answer": "a"}) + "\n"
+    assert load_completed(str(path)) == {1}
+
+
+def test_latest_record_per_id_wins(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [
+        {"id": 1, "error": "timeout"},
+        {"id": 2, "answer": "b"},
+        {"id": 1, "answer": "a"},
+        {"id": 3, "answer": "c"},
+        {"id": 3, "error": "quota"},
+    ])
+
+    assert load_completed(str(path)) == {1, 2}
+
+    repair_output(str(path))
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert records == [{"id": 2, "answer": "b"}, {"id": 1, "answer": "a"}, {"id": 3, "error": "quota"}]
+
+
+def test_missing_or_clean_file_is_left_alone(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    repair_output(str(path))
+    assert not path.exists()
+    assert load_completed(str(path)) == set()
+
+    write_lines(path, [{"id": 1, "answer": "a"}])
+    before = path.read_bytes()
+    repair_output(str(path))
+    assert path.read_bytes() == before
@@ -0,0 +1,81 @@
+"""ContextBuilder's budgeted trimming and sentence embedding cache, with a stub encoder"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent_core.context_builder import ContextBuilder, SentenceEmbeddingCache
+
+
+class StubEncoder:
+    """One-hot style embeddings: sentences mentioning the same keyword are identical"""
+
+    KEYWORDS = ["protein", "pasta", "price", "weather"]
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=True):
+        self.encoded.append(list(sentences))
+        rows = []
+        for sentence in sentences:
+            row = [1.0 if keyword in sentence.lower() else 0.0 for keyword in self.KEYWORDS] + [0.1]
+            rows.append(np.array(row) / np.linalg.norm(row))
+        return np.array(rows, dtype=np.float32)
+
+
+QUERY = [1.0, 0.0, 0.0, 0.0, 0.0]  # "protein"
+
+SECTIONS = [
+    ("Document: A", "Tofu is high in protein. The weather was nice today.", 1),
+    ("Document: B", "Pasta takes ten minutes. Eggs are rich in protein too.", 2),
+]
+
+
+def make_builder(model, budget=15, **kwargs):
+    return ContextBuilder(model, budget, cache=SentenceEmbeddingCache(16), **kwargs)
+
+
+def test_under_budget_returns_everything_without_encoding():
+    model = StubEncoder()
+    context, stats = make_builder(model, budget=0).build(QUERY, SECTIONS)
+
+    assert context.startswith("Document: A\nTofu is high in protein.")
+    assert stats["tokens_saved"] == 0
+    assert model.encoded == []
+
+
+def test_keeps_relevant_sentences_and_drops_repeats():
+    context, stats = make_builder(StubEncoder()).build(QUERY, SECTIONS)
+
+    # Both protein sentences embed identically: the second one is a repeat
+    assert context == "Document: A\nTofu is high in protein."
+    assert stats["sentences_dropped"] == 3
+    assert stats["tokens_used"] < stats["tokens_full"]
+
+
+def test_encodes_only_documents_missing_from_cache():
+    model = StubEncoder()
+    builder = make_builder(model)
+
+    first = builder.build(QUERY, SECTIONS)
+    assert len(model.encoded) == 1 and len(model.encoded[0]) == 4
+
+    # Same documents: nothing encoded; a new document: only its sentences
+    assert builder.build(QUERY, SECTIONS) == first
+    assert len(model.encoded) == 1
+    builder.build(QUERY, SECTIONS + [("Document: C", "The price is low.", 3)])
+    assert model.encoded[-1] == ["The price is low."]
+
+    # Changed content under the same id is encoded again
+    builder.build(QUERY, [("Document: A", "Protein bars are sweet. They cost a lot in shops.", 1)])
+    assert model.encoded[-1] == ["Protein bars are sweet.", "They cost a lot in shops."]
+
+
+def test_cache_is_per_model_and_bounded():
+    cache = SentenceEmbeddingCache(2)
+    model = StubEncoder()
+    ContextBuilder(model, 15, model_name="m1", cache=cache).build(QUERY, SECTIONS)
+    ContextBuilder(model, 15, model_name="m2", cache=cache).build(QUERY, SECTIONS)
+
+    assert len(model.encoded) == 2
+    assert len(cache) == 2
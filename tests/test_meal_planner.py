@@ -0,0 +1,63 @@
+"""MealPlanner on small hand-built menus: exactness flag and unknown prices"""
+import pytest
+
+# Importing food_analyst_agent_adk loads its LlmAgent and FoodPipeline modules
+pytest.importorskip("google.adk")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("psycopg2")
+np = pytest.importorskip("numpy")
+
+from food_analyst_agent_adk.core.meal_planner import MealPlanner
+from food_analyst_agent_adk.core.nutrient_cache import NutrientMatrix
+
+SLOTS = ("Sarapan", "Makan Siang")
+
+
+def menu(menu_id, slot, kalori, protein, harga):
+    # id, nama_menu, kategori, asal, tingkat_kesehatan, harga, cocok_untuk, nutrients
+    return (menu_id, f"Menu {menu_id}", "Test", "Indonesia", "Baik", harga, [slot],
+            kalori, protein, 10, 50, 2, 1.0)
+
+
+MENUS = NutrientMatrix([
+    menu(1, "Sarapan", 400, 20, "Rp 20.000"),
+    menu(2, "Sarapan", 600, 30, None),
+    menu(3, "Sarapan", 300, 10, "Rp 10.000"),
+    menu(4, "Makan Siang", 600, 30, "Rp 30.000"),
+    menu(5, "Makan Siang", 700, 35, "Rp 25.000"),
+])
+
+
+def test_full_search_is_exact():
+    result = MealPlanner(MENUS).plan(SLOTS, kalori=1200, protein=60)
+
+    assert result["feasible"]
+    assert result["approximate"] is False
+    assert [choice["menu"] for choice in result["plan"]] == ["Menu 2", "Menu 4"]
+
+
+def test_pruned_search_is_flagged_approximate():
+    result = MealPlanner(MENUS, candidates_per_slot=1, beam_width=1).plan(SLOTS, kalori=1200, protein=60)
+
+    assert result["feasible"]
+    assert result["approximate"] is True
+
+
+def test_unknown_price_is_not_counted_as_free():
+    # Without a budget the unpriced menu may be chosen, but the total says it is unknown
+    result = MealPlanner(MENUS).plan(SLOTS, kalori=1200, protein=60)
+    assert result["total_harga_rp"] == 30000
+    assert result["harga_unknown_slots"] == ["Sarapan"]
+
+    # With a budget an unpriced menu is never eligible
+    budgeted = MealPlanner(MENUS).plan(SLOTS, kalori=1200, protein=60, budget=100000)
+    assert "Menu 2" not in [choice["menu"] for choice in budgeted["plan"]]
+    assert budgeted["harga_unknown_slots"] == []
+
+    # Pruning keeps the best fit (unpriced Menu 2) plus the cheapest priced menu,
+    # where an unpriced menu used to count as the cheapest
+    rows, _, pruned = MealPlanner(MENUS, candidates_per_slot=1)._slot_candidates(
+        "Sarapan", np.ones(len(MENUS), dtype=bool), MENUS.harga_rp, (1200, 60, None, None), len(SLOTS)
+    )
+    assert pruned
+    assert [MENUS.names[row] for row in rows] == ["Menu 2", "Menu 3"]
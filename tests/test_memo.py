@@ -0,0 +1,86 @@
+"""Table version lookups behind the session memo, against a stub connection"""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from agent_core import memo
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.conn.statements.append(statement)
+        if "table_versions" in statement:
+            if not self.conn.has_version_table:
+                raise memo.psycopg2.errors.UndefinedTable("relation \"table_versions\" does not exist")
+            self.row = (self.conn.version,)
+        else:
+            self.row = (self.conn.write_count,)
+
+    def fetchone(self):
+        return self.row
+
+
+class StubConnection:
+    def __init__(self, has_version_table=True):
+        self.has_version_table = has_version_table
+        self.version = 7
+        self.write_count = 1234
+        self.statements = []
+        self.closed = False
+
+    def cursor(self):
+        return StubCursor(self)
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    stub = StubConnection()
+    monkeypatch.setattr(memo, "_version_connection", lambda: stub)
+    monkeypatch.setattr(memo, "_versions", {})
+    monkeypatch.setattr(memo, "_version_table_retry_at", 0.0)
+    return stub
+
+
+def test_version_is_reused_within_ttl(conn, monkeypatch):
+    monkeypatch.setenv("MEMO_VERSION_TTL_S", "60")
+
+    assert memo.get_table_version("documents") == 7
+    conn.version = 8
+    assert memo.get_table_version("documents") == 7
+    assert len(conn.statements) == 1
+
+    # Each table has its own entry
+    assert memo.get_table_version("food_menu") == 8
+
+
+def test_zero_ttl_checks_every_call(conn, monkeypatch):
+    monkeypatch.setenv("MEMO_VERSION_TTL_S", "0")
+
+    assert memo.get_table_version("documents") == 7
+    conn.version = 8
+    assert memo.get_table_version("documents") == 8
+
+
+def test_missing_version_table_is_retried_later(conn, monkeypatch):
+    monkeypatch.setenv("MEMO_VERSION_TTL_S", "0")
+    conn.has_version_table = False
+
+    assert memo.get_table_version("documents") == 1234
+    assert memo.get_table_version("documents") == 1234
+    # The second call went straight to the statistics fallback
+    assert sum("table_versions" in s for s in conn.statements) == 1
+
+    # Once the retry interval passes, table_versions is used again
+    conn.has_version_table = True
+    monkeypatch.setattr(memo, "_version_table_retry_at", 0.0)
+    assert memo.get_table_version("documents") == 7
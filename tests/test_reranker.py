@@ -0,0 +1,88 @@
+"""CrossEncoderReranker against a stub cross-encoder (no model download)"""
+import time
+
+import pytest
+
+# Importing rag_agent loads its LlmAgent and RAGPipeline modules
+pytest.importorskip("google.adk")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("psycopg2")
+
+from rag_agent.core.reranker import CrossEncoderReranker
+
+
+class StubCrossEncoder:
+    """Scores each pair from a table keyed on document content and records the batches"""
+
+    def __init__(self, scores, delay: float = 0.0):
+        self.scores = scores
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size: int = 32):
+        self.batches.append([content for _, content in pairs])
+        time.sleep(self.delay)
+        return [self.scores[content] for _, content in pairs]
+
+
+def make_documents(n: int):
+    return [{"id": i, "content": f"doc {i}", "similarity": 1 - i / 100} for i in range(n)]
+
+
+def make_reranker(model, **kwargs) -> CrossEncoderReranker:
+    return CrossEncoderReranker("stub", model=model, **kwargs)
+
+
+def test_scores_in_batches_and_orders_by_score():
+    documents = make_documents(5)
+    model = StubCrossEncoder({f"doc {i}": float(i) for i in range(5)})
+    reranker = make_reranker(model, batch_size=2)
+
+    ranked = reranker.rerank("query", documents, budget_ms=10_000)
+
+    assert model.batches == [["doc 0", "doc 1"], ["doc 2", "doc 3"], ["doc 4"]]
+    assert [doc["id"] for doc in ranked] == [4, 3, 2, 1, 0]
+    assert [doc["rerank_score"] for doc in ranked] == [4.0, 3.0, 2.0, 1.0, 0.0]
+
+
+def test_budget_expiry_keeps_vector_order_for_unscored():
+    documents = make_documents(6)
+    # Low scores for the first batch, so scored and unscored orders are distinguishable
+    model = StubCrossEncoder({f"doc {i}": float(i) for i in range(6)}, delay=0.05)
+    reranker = make_reranker(model, batch_size=2)
+
+    # The first batch always runs; after it, the slowest batch (50 ms) no longer fits
+    ranked = reranker.rerank("query", documents, budget_ms=60)
+
+    assert model.batches == [["doc 0", "doc 1"]]
+    assert [doc["id"] for doc in ranked] == [1, 0, 2, 3, 4, 5]
+    assert all("rerank_score" not in doc for doc in ranked[2:])
+
+
+def test_score_cache_per_query_and_document():
+    documents = make_documents(3)
+    model = StubCrossEncoder({f"doc {i}": float(i) for i in range(4)})
+    reranker = make_reranker(model, batch_size=8)
+
+    first = reranker.rerank("query", documents, budget_ms=10_000)
+    second = reranker.rerank("query", documents, budget_ms=10_000)
+    assert len(model.batches) == 1
+    assert second == first
+
+    # A new document is the only one scored; a new query scores everything again
+    reranker.rerank("query", make_documents(4), budget_ms=10_000)
+    assert model.batches[-1] == ["doc 3"]
+    reranker.rerank("another query", documents, budget_ms=10_000)
+    assert model.batches[-1] == ["doc 0", "doc 1", "doc 2"]
+
+
+def test_score_cache_evicts_least_recently_used():
+    model = StubCrossEncoder({f"doc {i}": float(i) for i in range(3)})
+    reranker = make_reranker(model, batch_size=8, cache_size=2)
+
+    reranker.rerank("query", make_documents(3), budget_ms=10_000)
+    assert len(reranker._cache) == 2
+
+    # doc 0 was scored first and evicted; docs 1 and 2 are still cached
+    reranker.rerank("query", make_documents(3), budget_ms=10_000)
+    assert model.batches[-1] == ["doc 0"]
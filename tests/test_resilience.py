@@ -0,0 +1,71 @@
+"""Circuit breaker transitions through call_with_breaker"""
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from agent_core.resilience import CircuitBreaker, call_with_breaker, get_breaker
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A fresh breaker (threshold 2, no reset wait) behind call_with_breaker"""
+    fresh = CircuitBreaker("test_table", failure_threshold=2, reset_timeout=0.0)
+    monkeypatch.setattr("agent_core.resilience._breakers", {"test_table": fresh})
+    return fresh
+
+
+def call(compute):
+    return call_with_breaker("test_table", "test_tool", {"q": "x"}, compute)
+
+
+def fail_db():
+    raise psycopg2.OperationalError("connection refused")
+
+
+def fail_other():
+    raise ValueError("bad argument")
+
+
+def test_database_failures_open_the_breaker(breaker):
+    breaker.reset_timeout = 60.0
+    for _ in range(2):
+        assert call(fail_db)["degraded"]
+    assert breaker.state == CircuitBreaker.OPEN
+
+    result = call(lambda: {"success": True})
+    assert "circuit for test_table is open" in result["error"]
+
+
+def test_other_errors_do_not_close_a_half_open_breaker(breaker):
+    breaker.reset_timeout = 60.0
+    for _ in range(2):
+        call(fail_db)
+    breaker._changed_at -= 60.0  # The reset timeout has passed
+
+    # The probe fails for a non-database reason: no verdict, still half open
+    with pytest.raises(ValueError):
+        call(fail_other)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # The next call probes right away (no new reset timeout); a database failure reopens
+    assert call(fail_db)["degraded"]
+    assert breaker.state == CircuitBreaker.OPEN
+    assert "is open" in call(lambda: {"success": True})["error"]
+
+
+def test_other_errors_keep_the_failure_count(breaker):
+    call(fail_db)
+    with pytest.raises(ValueError):
+        call(fail_other)
+    assert breaker.failures == 1
+
+    call(fail_db)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_successful_probe_closes(breaker):
+    for _ in range(2):
+        call(fail_db)
+    assert call(lambda: {"success": True}) == {"success": True}
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert get_breaker("test_table") is breaker
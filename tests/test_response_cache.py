@@ -0,0 +1,126 @@
+"""ResponseCache keys, size-bounded LRU eviction and the temperature bypass"""
+from response_cache import ResponseCache, cache_from_env, temperature_from_env
+
+
+class StubClient:
+    """Stands in for the Gemini client: a fixed answer per prompt, counting calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        return f"answer to {prompt}"
+
+
+def test_key_covers_model_prompt_temperature_and_tokens():
+    key = ResponseCache.make_key("gemini-2.5-flash-lite", "prompt", 0, 300)
+
+    assert key == ResponseCache.make_key("gemini-2.5-flash-lite", "prompt", 0.0, 300)
+    assert len(key) == 64
+    assert len({
+        key,
+        ResponseCache.make_key("models/text-bison-001", "prompt", 0, 300),
+        ResponseCache.make_key("gemini-2.5-flash-lite", "other prompt", 0, 300),
+        ResponseCache.make_key("gemini-2.5-flash-lite", "prompt", 0.7, 300),
+        ResponseCache.make_key("gemini-2.5-flash-lite", "prompt", 0, 200),
+    }) == 5
+
+
+def test_hit_skips_generation(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    client = StubClient()
+
+    first = cache.get_or_generate("m", "p", 0, 300, lambda: client.generate("p"))
+    second = cache.get_or_generate("m", "p", 0, 300, lambda: client.generate("p"))
+
+    assert first == second == "answer to p"
+    assert client.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_failures_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+
+    assert cache.get_or_generate("m", "p", 0, 300, lambda: None) is None
+    assert cache.get(cache.make_key("m", "p", 0, 300)) is None
+
+
+def test_empty_responses_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+
+    assert cache.get_or_generate("m", "p", 0, 300, lambda: "") == ""
+    assert cache.get(cache.make_key("m", "p", 0, 300)) is None
+    assert cache.get_or_generate("m", "p", 0, 300, lambda: "answer") == "answer"
+
+
+def test_fallback_answer_is_cached_under_the_model_that_answered(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    calls = []
+
+    def fallback_answer():
+        calls.append("generate")
+        return "fallback", "answer from fallback"
+
+    def cached_answer():
+        return cache.get_or_generate("primary", "p", 0, 300, fallback_answer, fallback_models=["fallback"])
+
+    assert cached_answer() == "answer from fallback"
+    assert cache.get(cache.make_key("fallback", "p", 0, 300)) == "answer from fallback"
+    assert cache.get(cache.make_key("primary", "p", 0, 300)) is None
+
+    # Later lookups find the fallback's answer without generating again
+    assert cached_answer() == "answer from fallback"
+    assert calls == ["generate"]
+
+    # The primary model's answer wins once it has one
+    cache.put(cache.make_key("primary", "p", 0, 300), "answer from primary")
+    assert cached_answer() == "answer from primary"
+
+
+def test_evicts_least_recently_used_at_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_bytes=25)
+    keys = [cache.make_key("m", str(i), 0, 300) for i in range(3)]
+
+    cache.put(keys[0], "a" * 10)
+    cache.put(keys[1], "b" * 10)
+    cache.get(keys[0])  # keys[1] is now the least recently used
+    cache.put(keys[2], "c" * 10)
+
+    assert cache.get(keys[0]) == "a" * 10
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == "c" * 10
+
+    # A response larger than the whole cache is never stored
+    cache.put(keys[1], "d" * 26)
+    assert cache.get(keys[1]) is None
+
+
+def test_nonzero_temperature_bypasses_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    client = StubClient()
+
+    for _ in range(2):
+        cache.get_or_generate("m", "p", 0.7, 300, lambda: client.generate("p"))
+
+    assert client.calls == 2
+    assert (cache.hits, cache.misses) == (0, 0)
+
+    sampled = ResponseCache(str(tmp_path / "sampled.db"), cache_nonzero_temperature=True)
+    for _ in range(2):
+        sampled.get_or_generate("m", "p", 0.7, 300, lambda: client.generate("p"))
+    assert client.calls == 3
+
+
+def test_settings_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+    monkeypatch.delenv("LLM_TEMPERATURE", raising=False)
+    assert cache_from_env() is None
+    assert temperature_from_env() == 0.7
+
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "env.db"))
+    monkeypatch.setenv("LLM_CACHE_MAX_MB", "1")
+    monkeypatch.setenv("LLM_TEMPERATURE", "0")
+    cache = cache_from_env()
+    assert cache.max_bytes == 1024 * 1024
+    assert cache.enabled_for(temperature_from_env())
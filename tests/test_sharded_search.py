@@ -0,0 +1,93 @@
+"""ShardedSearcher's merge of per-target top-k lists, against stub targets (no database)"""
+import pytest
+
+# Importing rag_agent loads its LlmAgent and RAGPipeline modules
+pytest.importorskip("google.adk")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("psycopg2")
+
+from rag_agent.core.sharded_search import ShardedSearcher
+
+
+class StubTarget:
+    """Returns fixed rows in descending similarity, or raises like a failed shard"""
+
+    def __init__(self, name, similarities=(), error=None):
+        self.name = name
+        self.pool_size = 1
+        self.rows = [{"id": f"{name}-{i}", "similarity": s} for i, s in enumerate(similarities)]
+        self.error = error
+        self.calls = []
+        self.closed = False
+
+    def search(self, embedding_str, top_k, ef_search=0, column="embedding"):
+        self.calls.append((top_k, ef_search, column))
+        if self.error is not None:
+            raise self.error
+        return [dict(row) for row in self.rows[:top_k]]
+
+    def close(self):
+        self.closed = True
+
+
+def make_searcher(*targets, ef_search=0) -> ShardedSearcher:
+    return ShardedSearcher(list(targets), expand_partitions=False, ef_search=ef_search)
+
+
+def test_merges_global_top_k_across_targets():
+    a = StubTarget("a", [0.95, 0.80, 0.40])
+    b = StubTarget("b", [0.90, 0.85, 0.10])
+    c = StubTarget("c", [0.50])
+    searcher = make_searcher(a, b, c, ef_search=40)
+
+    rows, info = searcher.search("[0.1,0.2]", top_k=4, column="embedding_v2")
+
+    assert [row["id"] for row in rows] == ["a-0", "b-0", "b-1", "a-1"]
+    assert [row["similarity"] for row in rows] == sorted((row["similarity"] for row in rows), reverse=True)
+    # Every target is asked for the full k, with the searcher's ef_search and the active column
+    assert a.calls == b.calls == c.calls == [(4, 40, "embedding_v2")]
+    assert info["missing"] == []
+    assert set(info["shard_ms"]) == {"a", "b", "c"}
+    searcher.close()
+
+
+def test_failed_target_is_reported_missing():
+    a = StubTarget("a", [0.95, 0.30])
+    down = StubTarget("down", error=RuntimeError("statement timeout"))
+    b = StubTarget("b", [0.60])
+    searcher = make_searcher(a, down, b)
+
+    rows, info = searcher.search("[0.1,0.2]", top_k=3)
+
+    assert [row["id"] for row in rows] == ["a-0", "b-0", "a-1"]
+    assert info["missing"] == ["down"]
+    assert set(info["shard_ms"]) == {"a", "b"}
+    searcher.close()
+
+
+def test_raises_only_when_every_target_fails():
+    first = RuntimeError("connection refused")
+    searcher = make_searcher(StubTarget("a", error=first), StubTarget("b", error=RuntimeError("timeout")))
+
+    with pytest.raises(RuntimeError) as excinfo:
+        searcher.search("[0.1,0.2]", top_k=3)
+    assert excinfo.value is first
+    searcher.close()
+
+    # Targets that answer with no rows are not failures
+    empty = make_searcher(StubTarget("a"), StubTarget("b", error=RuntimeError("timeout")))
+    rows, info = empty.search("[0.1,0.2]", top_k=3)
+    assert rows == []
+    assert info["missing"] == ["b"]
+    empty.close()
+
+
+def test_no_targets_is_a_configuration_error():
+    with pytest.raises(ValueError):
+        make_searcher()
+
+
+def test_close_closes_every_target():
+    a, b = StubTarget("a", [0.5]), StubTarget("b", [0.4])
+    make_searcher(a, b).close()
+    assert a.closed and b.closed
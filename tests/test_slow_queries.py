@@ -0,0 +1,92 @@
+"""SlowQueryLog re-runs EXPLAIN on the server that ran the search, against stub connections"""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from agent_core.slow_queries import SlowQueryLog
+
+PLAN = [{"Plan": {"Node Type": "Index Scan", "Index Name": "documents_embedding_idx"}, "Execution Time": 1.5}]
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mogrify(self, sql, params=None):
+        return sql.encode()
+
+    def execute(self, statement, params=None):
+        self.conn.statements.append(statement)
+        if statement.startswith("EXPLAIN"):
+            self.row = (PLAN,)
+        else:
+            self.row = ("public", "40", None)
+
+    def fetchone(self):
+        return self.row
+
+
+class StubConnection:
+    def __init__(self, server):
+        self.server = server
+        self.statements = []
+        self.closed = False
+        self.autocommit = True
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def rollback(self):
+        pass
+
+
+def make_log() -> SlowQueryLog:
+    """A log whose captures stay queued, so the test runs the EXPLAIN itself"""
+    log = SlowQueryLog(threshold_ms=10, sample_rate=1.0)
+    log._ensure_worker = lambda: None
+    return log
+
+
+class StubRouter:
+    def __init__(self):
+        self.connections = []
+
+    def connect_to(self, target):
+        conn = StubConnection(target)
+        self.connections.append(conn)
+        return conn
+
+
+def test_explain_runs_on_the_search_server():
+    log = make_log()
+    router = StubRouter()
+
+    log.observe(StubConnection("replica1:5432"), "documents_search", "SELECT 1", {}, 50.0,
+                router=router, target="replica1:5432")
+    entry = log._explain(log._queue.get_nowait())
+
+    assert [conn.server for conn in router.connections] == ["replica1:5432"]
+    explain_conn = router.connections[0]
+    assert not explain_conn.autocommit
+    assert explain_conn.statements[-1] == "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT 1"
+    assert entry["server"] == "replica1:5432"
+    assert entry["indexes_used"] == ["documents_embedding_idx"]
+    assert "router" not in entry
+
+
+def test_explain_connection_is_reused_per_server():
+    log = make_log()
+    router = StubRouter()
+
+    for target in ("primary", "replica1:5432", "primary"):
+        log.observe(StubConnection(target), "documents_search", "SELECT 1", {}, 50.0, router=router, target=target)
+        log._explain(log._queue.get_nowait())
+
+    assert [conn.server for conn in router.connections] == ["primary", "replica1:5432"]